@@ -0,0 +1,182 @@
+# Memory per channel and tick cost of multi channel targets: a FeedbackDevice per channel (how ChannelTarget
+# used to work) vs. the struct-of-arrays ChannelStore, at 10, 100 and 1000 channels.
+# Usage: python Benchmarks/bench_channels.py [--verify]
+#   --verify checks that both compute the same intensities on random input, settings and low batteries
+#   (the store ticks FeedbackDevices below ChannelStore.VECTOR_THRESHOLD channels and NumPy arrays from there on)
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "BridgeApp"))
+
+from app_channels import ChannelStore
+from app_config import AppConfig, PatternConfig, VRTracker
+from app_pattern import VibrationPattern
+from app_runner import FeedbackDevice
+from app_trace import DeviceTrace
+
+INTERVAL_MS = 20
+MODEL = "Bench Target"
+# Share of the channels receiving an update between two ticks
+UPDATE_RATIO = 0.25
+
+
+# The channels of a ChannelTarget before the ChannelStore: one FeedbackDevice each
+class DeviceChannels:
+    def __init__(self, config, serials):
+        self.intensities = [0.0] * len(serials)
+        self.devices = []
+        for index, serial in enumerate(serials):
+            device = FeedbackDevice(config, VRTracker(index, MODEL, serial), self.pulse, lambda channel_index: 1.0)
+            device.interval_ms = INTERVAL_MS
+            device.interval_s = INTERVAL_MS / 1000
+            device.hack_pulse_limit_ms = INTERVAL_MS
+            device.hack_pulse_mult_to_ms = 1 / 1000
+            # Carrying over is expected here, skip the warning
+            device.hack_pulse_limit_exceeded = True
+            self.devices.append(device)
+
+    def pulse(self, index, pulse_length_us):
+        self.intensities[index] = min(pulse_length_us / 1000 / INTERVAL_MS, 1.0)
+
+    def post(self, channel, strength):
+        self.devices[channel].set_strength(strength)
+
+    def tick(self, start_time):
+        for index, device in enumerate(self.devices):
+            self.intensities[index] = 0.0
+            device.tick(start_time)
+        return self.intensities
+
+
+class StoreChannels:
+    def __init__(self, config, serials):
+        self.store = ChannelStore(config, INTERVAL_MS, DeviceTrace("bench"))
+        for index, serial in enumerate(serials):
+            self.store.add(VRTracker(index, MODEL, serial))
+
+    def post(self, channel, strength):
+        self.store.post(channel, strength)
+
+    def tick(self, start_time):
+        return self.store.tick(start_time)
+
+
+def make_config(serials):
+    config = AppConfig()
+    config.check_integrity()
+    # Created up front, so the tracker settings don't count towards either side
+    for serial in serials:
+        config.get_tracker_config(serial)
+    return config
+
+
+def measure(kind, count, ticks):
+    serials = [f"CH-{i}" for i in range(count)]
+    config = make_config(serials)
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    channels = kind(config, serials)
+    memory = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    updates = max(int(count * UPDATE_RATIO), 1)
+    elapsed = 0
+    for _ in range(ticks):
+        for channel in random.sample(range(count), updates):
+            channels.post(channel, random.random())
+        start = time.perf_counter_ns()
+        channels.tick(start / 1e9)
+        elapsed += time.perf_counter_ns() - start
+    return memory / count, elapsed / ticks / 1000
+
+
+def verify(rounds, count, ticks):
+    # Both sides time carried over pulses with time.perf_counter(). It's frozen at the tick's time,
+    # so they see the same clock and the ticks come exactly one interval apart.
+    clock = [time.perf_counter()]
+    real_perf_counter = time.perf_counter
+    time.perf_counter = lambda: clock[0]
+    try:
+        return compare(rounds, count, ticks, clock)
+    finally:
+        time.perf_counter = real_perf_counter
+
+
+def compare(rounds, count, ticks, clock):
+    mismatches = 0
+    max_error = 0.0
+    patterns = VibrationPattern.VIB_PATTERN_LIST[:4]  # Throb depends on the wall clock
+    for _ in range(rounds):
+        serials = [f"CH-{i}" for i in range(count)]
+        config = make_config(serials)
+        config.pattern_config_list[VibrationPattern.PROXIMITY] = PatternConfig(
+            random.choice(patterns), random.randint(0, 50), random.randint(50, 100), 1)
+        config.pattern_config_list[VibrationPattern.VELOCITY] = PatternConfig(
+            random.choice(patterns), random.randint(0, 50), random.randint(50, 100), 1)
+        config.pattern_changed()
+        for serial in serials:
+            tracker_config = config.get_tracker_config(serial)
+            # Above 1 the pulses exceed the tick and carry over
+            tracker_config.set_vibration_multiplier(random.choice([0.5, 1.0, 1.5, 3.0]))
+            tracker_config.set_battery_threshold(random.choice([0, 20, 50]))
+
+        devices = DeviceChannels(config, serials)
+        store = StoreChannels(config, serials)
+        for channel in range(count):
+            level = random.choice([1.0, 0.3, 0.1])
+            devices.devices[channel].battery_level = level
+            store.store.set_battery(channel, level)
+
+        for tick in range(ticks):
+            for channel in random.sample(range(count), random.randint(0, count)):
+                value = random.choice([0.0, random.random(), 1.0])
+                devices.post(channel, value)
+                store.post(channel, value)
+            if random.random() < 0.1:
+                channel = random.randrange(count)
+                devices.devices[channel].force_pulse(35)
+                store.store.force_pulse(channel, 35)
+            start_time = clock[0]
+            expected = devices.tick(start_time)
+            actual = store.tick(start_time)
+            clock[0] += INTERVAL_MS / 1000
+            for channel in range(count):
+                error = abs(expected[channel] - actual[channel])
+                max_error = max(max_error, error)
+                if error > 1e-9:
+                    mismatches += 1
+    return mismatches, max_error
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verify", action="store_true", help="Compare the intensities of both implementations")
+    parser.add_argument("--ticks", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.verify:
+        # Below and at the store's VECTOR_THRESHOLD, so both of its tick paths are compared
+        failed = False
+        for count in (ChannelStore.VECTOR_THRESHOLD // 2, ChannelStore.VECTOR_THRESHOLD):
+            mismatches, max_error = verify(50, count, 200)
+            print(f"[Verify] 50 x {count} channels x 200 ticks  mismatches {mismatches}  max error {max_error:.2e}")
+            failed |= mismatches > 0
+        if failed:
+            sys.exit(1)
+        return
+
+    for count in (10, 100, 1000):
+        for name, kind in (("FeedbackDevice", DeviceChannels), ("ChannelStore", StoreChannels)):
+            memory, tick_us = measure(kind, count, args.ticks if count < 1000 else args.ticks // 5)
+            print(f"[Bench] {count:>5} channels  {name:<15}  {memory / 1024:8.2f} KiB/channel  "
+                  f"tick {tick_us:9.1f} us  ({tick_us / count * 1000:8.1f} ns/channel)")
+
+
+if __name__ == "__main__":
+    main()
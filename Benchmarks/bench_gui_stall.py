@@ -0,0 +1,86 @@
+# Tick jitter of the haptic output while the GUI thread stalls, with the engine in the GUI process vs. in its own.
+# The stalls are long calls into C code that hold the GIL, like Tk redraws or serializing a big config.
+# Usage: python Benchmarks/bench_gui_stall.py [--stall-ms 30] [--duration 5]
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "BridgeApp"))
+sys.path.insert(0, BENCH_DIR)
+
+# Runs again in the spawned engine process, which needs the fake runtime too
+import fake_openvr
+
+fake_openvr.install()
+
+from app_bridge import HapticBridge, EXTERNAL_TEXT_EMU
+from app_config import AppConfig
+from app_engine import EngineClient
+
+TARGET_COUNT = 4
+
+
+def make_stall(stall_ms):
+    # A sort of this many floats holds the GIL for about stall_ms
+    values = [random.random() for _ in range(100_000)]
+    start = time.perf_counter()
+    sorted(values)
+    size = int(len(values) * stall_ms / 1000 / (time.perf_counter() - start))
+    values = [random.random() for _ in range(size)]
+    return lambda: sorted(values)
+
+
+def run(engine_process, stall, stall_ms, duration):
+    config = AppConfig(server_port=9311, idle_suspend=False, engine_process=engine_process)
+    config.check_integrity()
+    bridge = EngineClient(config) if engine_process else HapticBridge(config)
+    bridge.start()
+    serials = [bridge.add_external_target(EXTERNAL_TEXT_EMU)[0] for _ in range(TARGET_COUNT)]
+    # Let the ticks settle before measuring
+    time.sleep(0.5)
+    baseline = bridge.stats()["targets"]
+
+    stalls = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        stall()
+        stalls += 1
+        # The GUI is idle as long as it stalls
+        time.sleep(stall_ms / 1000)
+
+    targets = bridge.stats()["targets"]
+    bridge.shutdown()
+    jitter = [targets[serial]["trace"]["jitter"] for serial in serials]
+    return {
+        "engine_process": engine_process,
+        "stalls": stalls,
+        "jitter_p50_ms": max(summary.get("p50_ms", 0) for summary in jitter),
+        "jitter_p99_ms": max(summary.get("p99_ms", 0) for summary in jitter),
+        "jitter_max_ms": max(summary.get("max_ms", 0) for summary in jitter),
+        "missed_ticks": sum(targets[serial]["trace"]["missed_ticks"] - baseline[serial]["trace"]["missed_ticks"]
+                            for serial in serials),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stall-ms", type=float, default=30.0, help="Length of each GUI stall")
+    parser.add_argument("--duration", type=float, default=5.0)
+    args = parser.parse_args()
+
+    # The bridge saves its config, keep it out of the repository
+    os.chdir(tempfile.mkdtemp(prefix="hpb_bench_"))
+    stall = make_stall(args.stall_ms)
+    for engine_process in (False, True):
+        result = run(engine_process, stall, args.stall_ms, args.duration)
+        print(f"[Bench] {'engine process' if engine_process else 'in-process':<14}  {result['stalls']} stalls of "
+              f"{args.stall_ms} ms  jitter p50 {result['jitter_p50_ms']} ms  p99 {result['jitter_p99_ms']} ms  "
+              f"max {result['jitter_max_ms']} ms  missed ticks {result['missed_ticks']}")
+
+
+if __name__ == "__main__":
+    main()
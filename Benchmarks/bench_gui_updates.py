@@ -0,0 +1,93 @@
+# Cost of the GUI update path: what posting a status update costs the server threads while the GUI drains
+# at GUI_FPS, how many updates get coalesced, and how long a frame of live meters takes per device count.
+# Each posting thread sends bursts of BURST updates, about BURST / BURST_PAUSE_S per second.
+# No window involved, the meters are sampled from fake device states.
+# Usage: python Benchmarks/bench_gui_updates.py [--threads 4] [--duration 2]
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "BridgeApp"))
+
+from app_engine import DeviceState
+from app_gui_updates import GUI_FPS, GUIUpdateQueue, LiveMeters
+
+BURST = 100
+BURST_PAUSE_S = 0.005
+
+
+def run_posting(thread_count, duration):
+    queue = GUIUpdateQueue()
+    stop = threading.Event()
+    costs = []
+
+    def poster(index):
+        count = 0
+        total = 0
+        while not stop.is_set():
+            messages = [f"source {index}: {count + i}" for i in range(BURST)]
+            start = time.perf_counter_ns()
+            for message in messages:
+                queue.post("status", message)
+            total += time.perf_counter_ns() - start
+            count += BURST
+            time.sleep(BURST_PAUSE_S)
+        costs.append((count, total))
+
+    threads = [threading.Thread(target=poster, args=(index,)) for index in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    frames = 0
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        time.sleep(1 / GUI_FPS)
+        queue.drain()
+        frames += 1
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    posts = sum(count for count, _ in costs)
+    return {
+        "posts": posts,
+        "frames": frames,
+        "post_ns": sum(total for _, total in costs) / posts,
+        "coalesced": queue.stats()["coalesced"] / posts,
+    }
+
+
+def run_meters(device_count, frames):
+    meters = LiveMeters()
+    rng = random.Random(0)
+    serials = [f"DEV-{i}" for i in range(device_count)]
+    elapsed = 0
+    changed = 0
+    for _ in range(frames):
+        states = {serial: DeviceState(rng.random(), rng.random(), 1.0, 1.0, 0, 0, 0) for serial in serials}
+        start = time.perf_counter_ns()
+        changed += len(meters.sample(states))
+        elapsed += time.perf_counter_ns() - start
+    return {"frame_us": elapsed / frames / 1000, "changed_per_frame": changed / frames}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=4, help="Threads posting status updates")
+    parser.add_argument("--duration", type=float, default=2.0)
+    args = parser.parse_args()
+
+    result = run_posting(args.threads, args.duration)
+    print(f"[Bench] {args.threads} threads posting  {result['posts']} updates in {result['frames']} frames  "
+          f"post {result['post_ns']:.0f} ns  coalesced {result['coalesced']:.2%}")
+    for device_count in (4, 16, 64, 256):
+        result = run_meters(device_count, 300)
+        print(f"[Bench] meters {device_count:>4} devices  {result['frame_us']:8.1f} us/frame  "
+              f"{result['changed_per_frame']:.1f} meters changed per frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Cost per datagram of both OSC receivers on a VRChat like stream, where most avatar parameters aren't mapped
+# to a tracker, with and without the AddressFilter dropping them before they are decoded.
+# Runs the receivers' packet handling directly, no sockets involved.
+# Usage: python Benchmarks/bench_osc_filter.py [--mapped 0.1] [--datagrams 200000]
+import argparse
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "BridgeApp"))
+
+from pythonosc.osc_message_builder import OscMessageBuilder
+
+from app_config import AppConfig
+from app_routing import AddressFilter, AddressRouter
+from load_generators import make_addresses
+from server_osc import VRChatOSCReceiver
+from server_osc_async import VRChatOSCAsyncReceiver
+
+ADDRESS_COUNT = 200
+
+
+def make_stream(addresses, count):
+    rng = random.Random(0)
+    datagrams = []
+    for address in addresses:
+        message = OscMessageBuilder(address)
+        message.add_arg(rng.random())
+        datagrams.append(message.build().dgram)
+    return [rng.choice(datagrams) for _ in range(count)]
+
+
+def make_config(addresses, mapped):
+    config = AppConfig()
+    config.check_integrity()
+    for i, address in enumerate(addresses[:max(int(len(addresses) * mapped), 1)]):
+        config.get_tracker_config(f"BENCH-{i}").set_address(address)
+    return config
+
+
+def run_sync(config, stream, address_filter):
+    # What OSCUDPServer does per datagram: verify_request(), then the dispatcher parses and calls the handler
+    received = []
+    receiver = VRChatOSCReceiver(config, lambda address, value, timestamp: received.append(value), None)
+    receiver.dispatcher.map("/avatar/parameters/*", receiver.event_received)
+    dispatch = receiver.dispatcher.call_handlers_for_packet
+    verify = (lambda datagram: address_filter.accepts_packet(datagram)) if address_filter else (lambda datagram: True)
+    start = time.perf_counter()
+    for datagram in stream:
+        if verify(datagram):
+            dispatch(datagram, None)
+    return time.perf_counter() - start, len(received)
+
+
+def run_async(config, stream, address_filter):
+    batch = []
+    receiver = VRChatOSCAsyncReceiver(config, None, None)
+    receiver.address_filter = address_filter
+    start = time.perf_counter()
+    for datagram in stream:
+        receiver.unpack(datagram, 0, batch)
+    return time.perf_counter() - start, len(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mapped", type=float, default=0.1, help="Share of the addresses mapped to a tracker")
+    parser.add_argument("--datagrams", type=int, default=200_000)
+    args = parser.parse_args()
+
+    addresses = make_addresses(ADDRESS_COUNT)
+    stream = make_stream(addresses, args.datagrams)
+    config = make_config(addresses, args.mapped)
+    router = AddressRouter(config)
+    routed = sum(1 for datagram in stream if router.matches(datagram[:datagram.find(b"\0")].decode()))
+
+    for name, run in (("osc", run_sync), ("osc_async", run_async)):
+        results = []
+        for address_filter in (None, AddressFilter(router)):
+            elapsed, delivered = run(config, stream, address_filter)
+            results.append(elapsed)
+            print(f"[Bench] {name:<9}  filter {'on ' if address_filter else 'off'}  "
+                  f"{elapsed / len(stream) * 1e6:6.2f} us/datagram  delivered {delivered} ({routed} mapped)")
+        print(f"[Bench] {name:<9}  speedup {results[0] / results[1]:.1f}x at {args.mapped:.0%} mapped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Microbenchmark: scalar VibrationPattern.apply_pattern() per device vs. apply_pattern_batch() for all devices,
+# plus the compiled scalar evaluator vs. the original (reference) one.
+# Usage: python Benchmarks/bench_pattern.py [--repeat N] [--verify [--cases N]]
+#
+# --verify checks that the compiled evaluator returns exactly what apply_pattern_reference() returns,
+# for random pattern settings and inputs, with the clock of the Throb pattern frozen.
+import argparse
+import os
+import random
+import sys
+import timeit
+import types
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BridgeApp"))
+
+import app_pattern
+from app_config import AppConfig, PatternConfig
+from app_pattern import VibrationPattern
+
+DEVICE_COUNTS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+
+
+def make_config(pattern):
+    config = AppConfig()
+    config.pattern_config_list.append(PatternConfig(pattern, 20, 80, 4))
+    config.pattern_config_list.append(PatternConfig(pattern, 40, 80, 16))
+    return config
+
+
+def bench(pattern, count, repeat):
+    vp = VibrationPattern(make_config(pattern))
+    strengths = [random.random() for _ in range(count)]
+    deltas = [random.random() for _ in range(count)]
+
+    def scalar():
+        return [vp.apply_pattern(strengths[i], deltas[i]) for i in range(count)]
+
+    def batch():
+        return vp.apply_pattern_batch(strengths, deltas).tolist()
+
+    scalar_time = min(timeit.repeat(scalar, number=repeat, repeat=3)) / repeat
+    batch_time = min(timeit.repeat(batch, number=repeat, repeat=3)) / repeat
+    return scalar_time, batch_time
+
+
+def bench_compiled(repeat):
+    print(f"{'proximity':<10}{'velocity':<10}{'reference ns':>14}{'compiled ns':>13}{'speedup':>10}")
+    for proximity, velocity in [("Linear", "None"), ("Sine", "None"), ("Throb", "None"), ("Linear", "Linear"),
+                                ("Sine", "Throb"), ("Constant", "Constant")]:
+        config = AppConfig()
+        config.pattern_config_list.append(PatternConfig(proximity, 20, 80, 4))
+        config.pattern_config_list.append(PatternConfig(velocity, 40, 80, 16))
+        vp = VibrationPattern(config)
+        reference_time = min(timeit.repeat(lambda: vp.apply_pattern_reference(0.6, 0.2), number=repeat * 10,
+                                           repeat=3)) / (repeat * 10)
+        compiled_time = min(timeit.repeat(lambda: vp.apply_pattern(0.6, 0.2), number=repeat * 10,
+                                          repeat=3)) / (repeat * 10)
+        print(f"{proximity:<10}{velocity:<10}{reference_time * 1e9:>14.1f}{compiled_time * 1e9:>13.1f}"
+              f"{reference_time / compiled_time:>9.2f}x")
+    print()
+
+
+def random_value():
+    # Mostly regular strengths, plus the edge cases: exact zeros, ones, negatives and overshoots
+    return random.choice([0.0, 0, 1.0, -0.0, random.random(), random.random(), random.uniform(-1, 3),
+                          random.random() * 1e-9])
+
+
+def verify(cases):
+    real_time = app_pattern.time
+    clock = types.SimpleNamespace(time=lambda: 0.0)
+    app_pattern.time = clock
+    failures = 0
+    try:
+        config = AppConfig()
+        config.pattern_config_list.append(PatternConfig("None", 0, 100, 1))
+        config.pattern_config_list.append(PatternConfig("None", 0, 100, 1))
+        vp = VibrationPattern(config)
+        for case in range(cases):
+            # Change the settings in place, like the GUI does, every few cases
+            if case % 16 == 0:
+                for pattern_config in config.pattern_config_list:
+                    pattern_config.pattern = random.choice(VibrationPattern.VIB_PATTERN_LIST)
+                    pattern_config.str_min = random.randint(0, 100)
+                    pattern_config.str_max = random.randint(0, 100)
+                    pattern_config.speed = random.randint(1, 32)
+                config.pattern_changed()
+            now = random.uniform(0, 2e9)
+            clock.time = lambda: now
+            strength, delta = random_value(), random_value()
+            expected = vp.apply_pattern_reference(strength, delta)
+            actual = vp.apply_pattern(strength, delta)
+            if actual != expected:
+                failures += 1
+                if failures <= 10:
+                    settings = [pattern_config.model_dump() for pattern_config in config.pattern_config_list]
+                    print(f"MISMATCH {settings} strength={strength!r} delta={delta!r} time={now!r}: "
+                          f"expected {expected!r}, got {actual!r}")
+    finally:
+        app_pattern.time = real_time
+    print(f"Verified {cases} cases, {failures} mismatches")
+    return failures == 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--verify", action="store_true", help="Check the compiled evaluator against the reference")
+    parser.add_argument("--cases", type=int, default=200000)
+    args = parser.parse_args()
+
+    random.seed(0)
+    if args.verify:
+        sys.exit(0 if verify(args.cases) else 1)
+
+    bench_compiled(args.repeat)
+    print(f"{'pattern':<10}{'devices':>8}{'scalar us':>12}{'batch us':>12}{'speedup':>10}")
+    for pattern in VibrationPattern.VIB_PATTERN_LIST:
+        crossover = None
+        for count in DEVICE_COUNTS:
+            scalar_time, batch_time = bench(pattern, count, args.repeat)
+            if crossover is None and batch_time < scalar_time:
+                crossover = count
+            print(f"{pattern:<10}{count:>8}{scalar_time * 1e6:>12.2f}{batch_time * 1e6:>12.2f}"
+                  f"{scalar_time / batch_time:>9.2f}x")
+        print(f"{pattern:<10} crossover at {crossover} devices\n")
+
+
+if __name__ == '__main__':
+    main()
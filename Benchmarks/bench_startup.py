@@ -0,0 +1,165 @@
+# Cold-start cost of the app, every measurement in a fresh interpreter: module imports of the GUI and the engine
+# process (lazy vs. everything up front, like main.py used to), loading the config (with and without the save that
+# used to follow every load), the bridge start phases (server bind, OpenVR init) and how long a spawned engine
+# process takes to answer. The GUI itself (FreeSimpleGUI) isn't part of it, use main.py --startup-profile for that.
+# Usage: python Benchmarks/bench_startup.py [--repeats 5]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "BridgeApp"))
+sys.path.insert(0, BENCH_DIR)
+
+# Runs again in the spawned engine process, which needs the fake runtime too
+import fake_openvr
+
+fake_openvr.install()
+
+# What main.py imported up front before the imports were made lazy, apart from the GUI
+EAGER_MODULES = ["app_bridge", "app_config", "app_engine", "server_osc", "server_osc_async", "server_replay",
+                 "server_websocket", "target_ovr", "target_emulated", "target_serial", "target_network"]
+SERVER_TYPES = {0: "osc", 1: "websocket", 2: "osc_async"}
+SERVER_PORT = 9321
+
+
+def import_ms(modules):
+    start = time.perf_counter()
+    for module in modules:
+        __import__(module)
+    return (time.perf_counter() - start) * 1000
+
+
+def child_imports():
+    return {
+        # The GUI process: main.py, plus the EngineClient it creates by default
+        "lazy": import_ms(["main", "app_engine"]),
+    }
+
+
+def child_imports_eager():
+    return {"eager": import_ms(EAGER_MODULES)}
+
+
+def child_engine_imports():
+    # The engine process: the bridge and one server type
+    return {"engine": import_ms(["app_bridge", "server_osc"])}
+
+
+def child_config():
+    from app_config import AppConfig
+
+    os.chdir(tempfile.mkdtemp(prefix="hpb_bench_"))
+    config = AppConfig()
+    config.check_integrity()
+    for i in range(16):
+        config.get_tracker_config(f"BENCH-{i}").set_address(f"/avatar/parameters/Haptic{i}")
+    config.save()
+
+    start = time.perf_counter()
+    config = AppConfig.load()
+    if config.check_integrity():
+        config.save()
+    load_ms = (time.perf_counter() - start) * 1000
+    # The unconditional save every startup used to do
+    start = time.perf_counter()
+    config._saved_json = ""
+    config.save()
+    save_ms = (time.perf_counter() - start) * 1000
+    return {"load": load_ms, "save": save_ms}
+
+
+def child_bridge(server_type):
+    from app_bridge import HapticBridge
+    from app_config import AppConfig
+
+    os.chdir(tempfile.mkdtemp(prefix="hpb_bench_"))
+    config = AppConfig(server_type=server_type, server_port=SERVER_PORT, engine_process=False)
+    config.check_integrity()
+    bridge = HapticBridge(config)
+    start = time.perf_counter()
+    bridge.start()
+    result = {"start": (time.perf_counter() - start) * 1000}
+    result.update(bridge.stats()["startup"])
+    bridge.shutdown()
+    return result
+
+
+def child_engine():
+    from app_config import AppConfig
+    from app_engine import EngineClient
+
+    os.chdir(tempfile.mkdtemp(prefix="hpb_bench_"))
+    config = AppConfig(server_port=SERVER_PORT)
+    config.check_integrity()
+    client = EngineClient(config)
+    start = time.perf_counter()
+    client.start()
+    # The first reply comes once the engine imported everything, bound the server and initialized OpenVR
+    stats = client.stats()
+    result = {"ready": (time.perf_counter() - start) * 1000}
+    result.update(stats["startup"])
+    client.shutdown()
+    return result
+
+
+CHILDREN = {
+    "imports": child_imports,
+    "imports_eager": child_imports_eager,
+    "engine_imports": child_engine_imports,
+    "config": child_config,
+    "bridge_osc": lambda: child_bridge(0),
+    "bridge_websocket": lambda: child_bridge(1),
+    "bridge_osc_async": lambda: child_bridge(2),
+    "engine": child_engine,
+}
+
+
+def measure(child, repeats):
+    # Median of every value over fresh interpreters
+    runs = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", child],
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, check=True).stdout
+        # The last line is the result, the others are the app's own logging
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: round(statistics.median(run[key] for run in runs), 2) for key in runs[0]}
+
+
+def run_startup(repeats):
+    results = {}
+    for child in CHILDREN:
+        results[child] = measure(child, repeats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--child", choices=CHILDREN, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(CHILDREN[args.child]()))
+        return
+
+    results = run_startup(args.repeats)
+    print(f"[Bench] imports (GUI process)  lazy {results['imports']['lazy']} ms  "
+          f"everything up front {results['imports_eager']['eager']} ms")
+    print(f"[Bench] imports (engine)       {results['engine_imports']['engine']} ms")
+    print(f"[Bench] config                 load {results['config']['load']} ms  "
+          f"(the save it skips {results['config']['save']} ms)")
+    for server_kind in SERVER_TYPES.values():
+        result = results[f"bridge_{server_kind}"]
+        print(f"[Bench] bridge start {server_kind:<10} {result['start']} ms  server bind {result['server bind']} ms  "
+              f"OpenVR init {result['OpenVR init']} ms")
+    print(f"[Bench] engine process ready   {results['engine']['ready']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Compares frames/sec of the JSON and the binary protocol of ResoniteWebSocketServer.
+# Usage: python Benchmarks/bench_websocket.py [--frames N] [--addresses N] [--port N]
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BridgeApp"))
+
+import websockets.sync.client
+
+from app_config import AppConfig
+from server_websocket import ResoniteWebSocketServer, BINARY_RECORD, KEY_REGISTER, KEY_IDS
+
+
+class Counter:
+    def __init__(self, expected):
+        self.expected = expected
+        self.count = 0
+        self.done = threading.Event()
+
+    def param_received(self, address, value, timestamp=None):
+        self.add(1)
+
+    def params_received(self, params):
+        self.add(len(params))
+
+    def add(self, count):
+        self.count += count
+        if self.count >= self.expected:
+            self.done.set()
+
+
+def run(mode, frames, address_count, port):
+    addresses = [f"/avatar/parameters/Haptic{i}" for i in range(address_count)]
+    counter = Counter(frames * address_count)
+    server = ResoniteWebSocketServer(AppConfig(server_ip="127.0.0.1", server_port=port),
+                                     counter.param_received, lambda text, is_error: None, counter.params_received)
+    server.start_server()
+    try:
+        with websockets.sync.client.connect(f"ws://127.0.0.1:{port}") as websocket:
+            if mode == "binary":
+                websocket.send(json.dumps({KEY_REGISTER: addresses}))
+                ids = json.loads(websocket.recv())[KEY_IDS]
+                messages = [b"".join(BINARY_RECORD.pack(ids[address], random.random()) for address in addresses)
+                            for _ in range(64)]
+            else:
+                messages = [json.dumps({address: random.random() for address in addresses}) for _ in range(64)]
+
+            start_time = time.perf_counter()
+            for i in range(frames):
+                websocket.send(messages[i % len(messages)])
+            counter.done.wait(60)
+            elapsed = time.perf_counter() - start_time
+    finally:
+        server.shutdown()
+    return frames / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--addresses", type=int, default=16)
+    parser.add_argument("--port", type=int, default=9871)
+    args = parser.parse_args()
+
+    random.seed(0)
+    results = {}
+    for mode in ("json", "binary"):
+        results[mode] = run(mode, args.frames, args.addresses, args.port)
+        print(f"{mode:<8}{results[mode]:>12.0f} frames/s  ({args.addresses} addresses per frame)")
+    print(f"binary speedup: {results['binary'] / results['json']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# Localhost stand-in for a Wi-Fi haptic node. It decodes NetworkTarget datagrams, drops stale
+# (out of order) frames like real firmware should, and answers ack requests, optionally losing some.
+# Usage: python Benchmarks/fake_haptic_node.py [--port N] [--loss 0.1]   (or run the self test with --self-test)
+import argparse
+import os
+import random
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BridgeApp"))
+
+from target_network import ACK, ACK_MAGIC, FLAG_ACK, DEFAULT_NODE_PORT, decode_datagram
+
+
+class FakeHapticNode(threading.Thread):
+    def __init__(self, host="127.0.0.1", port=DEFAULT_NODE_PORT, loss=0.0, seed=0):
+        super().__init__(daemon=True)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.2)
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.running = True
+
+        # Last applied sequence per first channel
+        self.last_sequences = {}
+        self.intensities = []
+        self.frames = 0
+        self.stale = 0
+        self.invalid = 0
+        self.acks = 0
+
+    def run(self):
+        while self.running:
+            try:
+                datagram, address = self.sock.recvfrom(2048)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            frame = decode_datagram(datagram)
+            if frame is None:
+                self.invalid += 1
+                continue
+            sequence, flags, first_channel, intensities = frame
+            # Sequence numbers wrap at 2^32, "newer" means within half the range ahead
+            last_sequence = self.last_sequences.get(first_channel)
+            if last_sequence is not None and not 0 < (sequence - last_sequence) % (1 << 32) < (1 << 31):
+                self.stale += 1
+                continue
+            if self.random.random() < self.loss:
+                continue
+            self.last_sequences[first_channel] = sequence
+            if len(self.intensities) < first_channel + len(intensities):
+                self.intensities.extend([0.0] * (first_channel + len(intensities) - len(self.intensities)))
+            self.intensities[first_channel:first_channel + len(intensities)] = intensities
+            self.frames += 1
+            if flags & FLAG_ACK:
+                self.sock.sendto(ACK.pack(ACK_MAGIC, first_channel, sequence), address)
+                self.acks += 1
+
+    def stop(self):
+        self.running = False
+        self.join()
+        self.sock.close()
+
+    def stats(self):
+        return {"frames": self.frames, "stale": self.stale, "invalid": self.invalid, "acks": self.acks,
+                "intensities": [round(value, 3) for value in self.intensities]}
+
+
+def self_test(port, loss, seconds):
+    from app_config import AppConfig
+    from app_scheduler import FeedbackScheduler
+    from target_network import NetworkTarget, links
+
+    node = FakeHapticNode(port=port, loss=loss)
+    node.start()
+
+    config = AppConfig()
+    config.check_integrity()
+    proximity = config.pattern_config_list[0]
+    proximity.pattern, proximity.str_min, proximity.str_max = "Linear", 0, 100
+    config.pattern_config_list[1].pattern = "None"
+    config.pattern_changed()
+    scheduler = FeedbackScheduler()
+    scheduler.start()
+
+    # Two targets sharing the node: channels 0-2 and 3-4
+    target = NetworkTarget(config, scheduler, "NODE")
+    config.get_tracker_config("NODE").set_target_host(f"127.0.0.1:{port}")
+    for i in range(3):
+        target.add_channel(f"NODE-{i}")
+        target.set_strength(f"NODE-{i}", (i + 1) / 3)
+    other_target = NetworkTarget(config, scheduler, "NODE-B")
+    config.get_tracker_config("NODE-B").set_target_host(f"127.0.0.1:{port}#3")
+    for i in range(2):
+        other_target.add_channel(f"NODE-B-{i}")
+        other_target.set_strength(f"NODE-B-{i}", 0.5)
+    time.sleep(seconds)
+
+    link_stats = target.link.stats() if target.link is not None else None
+    target.shutdown()
+    other_target.shutdown()
+    scheduler.stop()
+    time.sleep(0.05)
+    print(f"[Node] {node.stats()}")
+    print(f"[Target] {link_stats}")
+    print(f"[Target] Links still open after shutdown: {len(links)}")
+    node.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=DEFAULT_NODE_PORT)
+    parser.add_argument("--loss", type=float, default=0.0, help="Fraction of frames to ignore (simulated loss)")
+    parser.add_argument("--self-test", action="store_true", help="Drive the node with a NetworkTarget")
+    parser.add_argument("--seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    if args.self_test:
+        self_test(args.port, args.loss, args.seconds)
+        return
+
+    node = FakeHapticNode(port=args.port, loss=args.loss)
+    node.start()
+    print(f"[Node] Listening on 127.0.0.1:{args.port}, Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+            print(f"[Node] {node.stats()}")
+    except KeyboardInterrupt:
+        node.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+# Drop-in stand-in for the parts of the openvr module used by target_ovr.OpenVRTracker.
+# install() registers it as "openvr" in sys.modules, so it must run before target_ovr is imported.
+import sys
+import threading
+import time
+import types
+
+VRApplication_Background = 3
+TrackingUniverseStanding = 1
+k_unMaxTrackedDeviceCount = 64
+
+TrackedDeviceClass_Invalid = 0
+TrackedDeviceClass_HMD = 1
+TrackedDeviceClass_Controller = 2
+TrackedDeviceClass_GenericTracker = 3
+
+Prop_SerialNumber_String = 1002
+Prop_ModelNumber_String = 1001
+Prop_DeviceBatteryPercentage_Float = 1012
+
+VREvent_TrackedDeviceActivated = 100
+VREvent_TrackedDeviceDeactivated = 101
+VREvent_TrackedDeviceUpdated = 102
+VREvent_TrackedDeviceRoleChanged = 108
+
+
+class TrackedPropUnknownProperty(Exception):
+    pass
+
+
+error_code = types.SimpleNamespace(TrackedProp_UnknownProperty=TrackedPropUnknownProperty)
+
+
+class FakePose:
+    __slots__ = ("bPoseIsValid",)
+
+    def __init__(self, valid):
+        self.bPoseIsValid = valid
+
+
+class VREvent_t:
+    def __init__(self):
+        self.eventType = 0
+        self.trackedDeviceIndex = 0
+
+
+class FakeDevice:
+    def __init__(self, device_class, serial, model, battery=1.0):
+        self.device_class = device_class
+        self.serial = serial
+        self.model = model
+        self.battery = battery
+
+
+class FakeVRSystem:
+    def __init__(self):
+        self.devices = {0: FakeDevice(TrackedDeviceClass_HMD, "HMD-0", "Fake HMD")}
+        self.lock = threading.Lock()
+        # (perf_counter_ns, index, length) of every triggerHapticPulse() call
+        self.pulses = []
+        self.events = []
+        self.property_reads = 0
+        self.class_reads = 0
+
+    def reset(self):
+        # Back to just the HMD, without telling anyone
+        with self.lock:
+            self.devices = {0: self.devices[0]}
+            self.events.clear()
+
+    def add_tracker(self, serial, model="VIVE Tracker 3.0", battery=1.0):
+        index = next(i for i in range(k_unMaxTrackedDeviceCount) if i not in self.devices)
+        self.devices[index] = FakeDevice(TrackedDeviceClass_GenericTracker, serial, model, battery)
+        self.post_event(VREvent_TrackedDeviceActivated, index)
+        return index
+
+    def remove_device(self, index):
+        if self.devices.pop(index, None) is not None:
+            self.post_event(VREvent_TrackedDeviceDeactivated, index)
+
+    def post_event(self, event_type, index):
+        with self.lock:
+            self.events.append((event_type, index))
+
+    def pollNextEvent(self, event):
+        with self.lock:
+            if not self.events:
+                return False
+            event.eventType, event.trackedDeviceIndex = self.events.pop(0)
+        return True
+
+    def isTrackedDeviceConnected(self, index):
+        return index in self.devices
+
+    def getDeviceToAbsoluteTrackingPose(self, universe, seconds_to_photon, count):
+        return [FakePose(i in self.devices) for i in range(count)]
+
+    def getTrackedDeviceClass(self, index):
+        self.class_reads += 1
+        device = self.devices.get(index)
+        return device.device_class if device is not None else TrackedDeviceClass_Invalid
+
+    def getStringTrackedDeviceProperty(self, index, prop):
+        self.property_reads += 1
+        device = self.devices.get(index)
+        if device is None:
+            raise TrackedPropUnknownProperty()
+        if prop == Prop_SerialNumber_String:
+            return device.serial
+        if prop == Prop_ModelNumber_String:
+            if device.model is None:
+                raise TrackedPropUnknownProperty()
+            return device.model
+        raise TrackedPropUnknownProperty()
+
+    def getFloatTrackedDeviceProperty(self, index, prop):
+        self.property_reads += 1
+        device = self.devices.get(index)
+        if device is None or prop != Prop_DeviceBatteryPercentage_Float or device.battery is None:
+            raise TrackedPropUnknownProperty()
+        return device.battery
+
+    def triggerHapticPulse(self, index, axis_id, duration):
+        with self.lock:
+            self.pulses.append((time.perf_counter_ns(), index, duration))
+
+    def take_pulses(self):
+        with self.lock:
+            pulses = self.pulses
+            self.pulses = []
+        return pulses
+
+
+system = FakeVRSystem()
+
+
+def init(application_type):
+    return system
+
+
+def shutdown():
+    pass
+
+
+def install():
+    # Returns the shared FakeVRSystem after registering this module as "openvr"
+    sys.modules["openvr"] = sys.modules[__name__]
+    return system
@@ -0,0 +1,81 @@
+# Synthetic VRChat (OSC) and Resonite (WebSocket) parameter streams at a fixed rate.
+import json
+import random
+import threading
+import time
+
+from pythonosc.udp_client import SimpleUDPClient
+
+
+def make_addresses(count, prefix="/avatar/parameters/Haptic"):
+    return [f"{prefix}{i}" for i in range(count)]
+
+
+class LoadGenerator(threading.Thread):
+    def __init__(self, rate, addresses, duration, seed=0):
+        super().__init__(daemon=True)
+        self.rate = rate  # messages per second
+        self.addresses = addresses
+        self.duration = duration
+        self.random = random.Random(seed)
+        self.sent = 0
+        self.running = True
+
+    def send(self, address, value):
+        raise NotImplementedError("Subclass must implement abstract method: send")
+
+    def run(self):
+        # Sends in small bursts every millisecond to keep the rate stable without spinning
+        interval = 1 / self.rate
+        start_time = time.perf_counter()
+        end_time = start_time + self.duration
+        next_time = start_time
+        while self.running:
+            now = time.perf_counter()
+            if now >= end_time:
+                break
+            while next_time <= now:
+                address = self.addresses[self.sent % len(self.addresses)]
+                self.send(address, self.random.random())
+                self.sent += 1
+                next_time += interval
+            time.sleep(min(0.001, max(next_time - time.perf_counter(), 0)))
+        self.close()
+
+    def stop(self):
+        self.running = False
+
+    def close(self):
+        pass
+
+
+class OSCLoadGenerator(LoadGenerator):
+    def __init__(self, host, port, rate, addresses, duration, seed=0):
+        super().__init__(rate, addresses, duration, seed)
+        self.client = SimpleUDPClient(host, port)
+
+    def send(self, address, value):
+        self.client.send_message(address, value)
+
+
+class WebSocketLoadGenerator(LoadGenerator):
+    def __init__(self, host, port, rate, addresses, duration, seed=0, binary=False):
+        super().__init__(rate, addresses, duration, seed)
+        import websockets.sync.client
+        self.websocket = websockets.sync.client.connect(f"ws://{host}:{port}")
+        self.binary = binary
+        self.ids = {}
+        if binary:
+            from server_websocket import KEY_REGISTER, KEY_IDS
+            self.websocket.send(json.dumps({KEY_REGISTER: addresses}))
+            self.ids = json.loads(self.websocket.recv())[KEY_IDS]
+
+    def send(self, address, value):
+        if self.binary:
+            from server_websocket import BINARY_RECORD
+            self.websocket.send(BINARY_RECORD.pack(self.ids[address], value))
+        else:
+            self.websocket.send(json.dumps({address: value}))
+
+    def close(self):
+        self.websocket.close()
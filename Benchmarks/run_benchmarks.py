@@ -0,0 +1,348 @@
+# Headless end-to-end benchmarks of the bridge, using a fake OpenVR runtime and synthetic load.
+# Usage: python Benchmarks/run_benchmarks.py [--quick] [--output results.json]
+#
+# Every run records the git commit, so result files of different commits can be compared directly.
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "BridgeApp"))
+sys.path.insert(0, BENCH_DIR)
+
+import fake_openvr
+
+vr_system = fake_openvr.install()
+
+from app_config import AppConfig
+from app_recorder import ParamRecorder
+from app_routing import AddressRouter
+from app_scheduler import FeedbackScheduler
+from bench_startup import run_startup
+from load_generators import make_addresses, OSCLoadGenerator, WebSocketLoadGenerator
+from server_osc import VRChatOSCReceiver
+from server_osc_async import VRChatOSCAsyncReceiver
+from server_replay import ParamReplayServer
+from server_websocket import ResoniteWebSocketServer
+from target_ovr import OpenVRTracker
+
+HOST = "127.0.0.1"
+PORT = 9301
+
+
+class Pipeline:
+    def __init__(self, tracker_count, model, address_count, legacy_threads=False, idle_suspend=True):
+        self.config = AppConfig(server_ip=HOST, server_port=PORT, legacy_feedback_threads=legacy_threads,
+                                idle_suspend=idle_suspend)
+        self.config.check_integrity()
+        self.addresses = make_addresses(address_count)
+        vr_system.reset()
+        self.serials = []
+        for i in range(tracker_count):
+            serial = f"BENCH-{i}"
+            vr_system.add_tracker(serial, model)
+            self.config.get_tracker_config(serial).set_address(self.addresses[i % address_count])
+            self.serials.append(serial)
+
+        self.router = AddressRouter(self.config)
+        self.scheduler = FeedbackScheduler(self.config)
+        self.scheduler.start()
+        self.vr = OpenVRTracker(self.config, self.scheduler)
+        self.vr.query_devices()
+        self.server = None
+
+    def param_received(self, address, value, timestamp=None):
+        for serial in self.router.route(address):
+            self.vr.set_strength(serial, value, timestamp)
+
+    def param_batch_received(self, params):
+        for address, value, timestamp in params:
+            self.param_received(address, value, timestamp)
+
+    def start_server(self, server_kind):
+        status = lambda text, is_error=False: None
+        if server_kind == "osc":
+            self.server = VRChatOSCReceiver(self.config, self.param_received, status)
+        elif server_kind == "osc_async":
+            self.server = VRChatOSCAsyncReceiver(self.config, self.param_received, status, self.param_batch_received)
+        elif server_kind == "replay":
+            self.server = ParamReplayServer(self.config, self.param_received, status, self.param_batch_received)
+        else:
+            self.server = ResoniteWebSocketServer(self.config, self.param_received, status, self.param_batch_received)
+        self.server.start_server()
+        time.sleep(0.2)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+        self.vr.shutdown()
+        self.scheduler.stop()
+        self.scheduler.join()
+        # Let legacy threads finish their last sleep
+        time.sleep(0.06)
+
+
+def merge_summaries(summaries):
+    values = [summary for summary in summaries if summary.get("count")]
+    if not values:
+        return {"count": 0}
+    return {
+        "count": sum(summary["count"] for summary in values),
+        "p50_ms": round(sum(summary["p50_ms"] for summary in values) / len(values), 3),
+        "p99_ms": max(summary["p99_ms"] for summary in values),
+        "max_ms": max(summary["max_ms"] for summary in values),
+    }
+
+
+def pulse_interval_error(pulses, expected_interval_ms):
+    # Mean absolute deviation of the time between pulses of the same device from the tick interval
+    by_index = {}
+    for timestamp, index, length in pulses:
+        by_index.setdefault(index, []).append(timestamp)
+    errors = []
+    for timestamps in by_index.values():
+        for previous, current in zip(timestamps, timestamps[1:]):
+            errors.append(abs((current - previous) / 1e6 - expected_interval_ms))
+    return round(sum(errors) / len(errors), 4) if errors else None
+
+
+def run_ingest(server_kind, tracker_count, model, rate, address_count, duration, legacy_threads=False):
+    pipeline = Pipeline(tracker_count, model, address_count, legacy_threads)
+    pipeline.start_server(server_kind)
+    if server_kind.startswith("websocket"):
+        generator = WebSocketLoadGenerator(HOST, PORT, rate, pipeline.addresses, duration,
+                                           binary=server_kind == "websocket_binary")
+    else:
+        generator = OSCLoadGenerator(HOST, PORT, rate, pipeline.addresses, duration)
+
+    vr_system.take_pulses()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    generator.start()
+    generator.join()
+    time.sleep(0.1)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    pulses = vr_system.take_pulses()
+
+    stats = pipeline.router.stats()
+    traces = [device.trace.summary() for device in pipeline.vr.vibration_managers.values()]
+    interval_ms = next(iter(pipeline.vr.vibration_managers.values())).interval_ms
+    pipeline.stop()
+    wall = min(wall, duration)
+
+    routed = stats["hits"] + stats["misses"]
+    return {
+        "server": server_kind,
+        "trackers": tracker_count,
+        "model": model,
+        "rate": rate,
+        "addresses": address_count,
+        "legacy_threads": legacy_threads,
+        "sent": generator.sent,
+        "received": routed,
+        "loss": round(1 - routed / generator.sent, 4) if generator.sent else 0,
+        "throughput_per_s": round(routed / wall, 1),
+        "cpu_percent": round(cpu / wall * 100, 2),
+        "cpu_ms_per_tracker_per_s": round(cpu / wall * 1000 / tracker_count, 3),
+        "pulses": len(pulses),
+        "pulse_interval_error_ms": pulse_interval_error(pulses, interval_ms),
+        "latency": merge_summaries([trace["latency"] for trace in traces]),
+        "tick_jitter": merge_summaries([trace["jitter"] for trace in traces]),
+    }
+
+
+def run_pulse_accuracy(tracker_count, model, duration, legacy_threads=False):
+    # Constant input through a Linear pattern with a 0..100% range must produce
+    # pulses of exactly strength * interval, in the device's time unit.
+    pipeline = Pipeline(tracker_count, model, tracker_count, legacy_threads)
+    for pattern_config in pipeline.config.pattern_config_list:
+        pattern_config.pattern = "None"
+    proximity = pipeline.config.pattern_config_list[0]
+    proximity.pattern, proximity.str_min, proximity.str_max = "Linear", 0, 100
+    pipeline.config.pattern_changed()
+
+    strength = 0.5
+    for serial in pipeline.serials:
+        pipeline.vr.set_strength(serial, strength)
+    time.sleep(0.1)
+    vr_system.take_pulses()
+    time.sleep(duration)
+    pulses = vr_system.take_pulses()
+
+    device = next(iter(pipeline.vr.vibration_managers.values()))
+    traces = [device.trace.summary() for device in pipeline.vr.vibration_managers.values()]
+    expected_length = strength * device.interval_ms
+    if device.hack_pulse_mult_to_ms:
+        expected_length /= device.hack_pulse_mult_to_ms
+    expected_length = int(expected_length)
+    expected_pulses = tracker_count * duration / device.interval_s
+    pipeline.stop()
+
+    return {
+        "trackers": tracker_count,
+        "model": model,
+        "legacy_threads": legacy_threads,
+        "expected_length": expected_length,
+        "length_errors": sum(1 for _, _, length in pulses if length != expected_length),
+        "pulses": len(pulses),
+        "pulse_ratio": round(len(pulses) / expected_pulses, 4),
+        "pulse_interval_error_ms": pulse_interval_error(pulses, device.interval_ms),
+        "tick_jitter": merge_summaries([trace["jitter"] for trace in traces]),
+        "missed_ticks": sum(trace["missed_ticks"] for trace in traces),
+    }
+
+
+def run_replay(tracker_count, model, address_count, count):
+    # Records a synthetic parameter stream, then replays it through the whole pipeline as fast as possible
+    with tempfile.TemporaryDirectory() as directory:
+        pipeline = Pipeline(tracker_count, model, address_count)
+        pipeline.config.replay_file = os.path.join(directory, "bench.hplog")
+        pipeline.config.replay_speed = 0
+        recorder = ParamRecorder(pipeline.config.replay_file)
+        rng = random.Random(0)
+        for i in range(count):
+            recorder.record(pipeline.addresses[i % address_count], rng.random(), i * 1000)
+        recorder.close()
+
+        pipeline.server = ParamReplayServer(pipeline.config, pipeline.param_received, lambda text, is_error=False: None,
+                                            pipeline.param_batch_received)
+        cpu_start = time.process_time()
+        wall_start = time.perf_counter()
+        pipeline.server.start_server()
+        pipeline.server.thread.join()
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        stats = pipeline.router.stats()
+        pipeline.stop()
+
+    routed = stats["hits"] + stats["misses"]
+    return {
+        "trackers": tracker_count,
+        "model": model,
+        "addresses": address_count,
+        "replayed": routed,
+        "throughput_per_s": round(routed / wall, 1),
+        "cpu_percent": round(cpu / wall * 100, 2),
+    }
+
+
+def run_idle_cpu(tracker_count, model, duration, legacy_threads=False, idle_suspend=True):
+    # CPU used by the feedback loops while nothing is received at all, after a short burst of input
+    pipeline = Pipeline(tracker_count, model, tracker_count, legacy_threads, idle_suspend)
+    for serial in pipeline.serials:
+        pipeline.vr.set_strength(serial, 0.5)
+    time.sleep(0.1)
+    for serial in pipeline.serials:
+        pipeline.vr.set_strength(serial, 0.0)
+    # Let the velocity drain
+    time.sleep(0.5)
+    vr_system.take_pulses()
+
+    cpu_start = time.process_time()
+    time.sleep(duration)
+    cpu = time.process_time() - cpu_start
+    pulses = vr_system.take_pulses()
+
+    # A suspended device must still react right away
+    wake_start = time.perf_counter_ns()
+    pipeline.vr.set_strength(pipeline.serials[0], 1.0)
+    while not vr_system.pulses and time.perf_counter_ns() - wake_start < 1e9:
+        time.sleep(0.0002)
+    wake_ms = (time.perf_counter_ns() - wake_start) / 1e6
+    pipeline.stop()
+
+    return {
+        "trackers": tracker_count,
+        "model": model,
+        "legacy_threads": legacy_threads,
+        "idle_suspend": idle_suspend,
+        "idle_pulses": len(pulses),
+        "cpu_percent": round(cpu / duration * 100, 3),
+        "cpu_ms_per_tracker_per_s": round(cpu / duration * 1000 / tracker_count, 4),
+        "wake_to_pulse_ms": round(wake_ms, 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--quick", action="store_true", help="Shorter runs with fewer combinations")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    duration = 1.0 if args.quick else 3.0
+    tracker_counts = [1, 8] if args.quick else [1, 4, 12]
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "ingest": [],
+        "pulse_accuracy": [],
+        "idle": [],
+        "replay": [],
+        "startup": {},
+    }
+
+    for server_kind in ("osc", "osc_async", "websocket", "websocket_binary"):
+        for rate in ([500] if args.quick else [500, 2000]):
+            result = run_ingest(server_kind, 8, "Tundra Tracker", rate, 64, duration)
+            results["ingest"].append(result)
+            print(f"[Bench] ingest {server_kind:<17} {rate:>5}/s  {result['throughput_per_s']:>8}/s  "
+                  f"loss {result['loss']:<6}  cpu {result['cpu_percent']}%  "
+                  f"latency p50 {result['latency'].get('p50_ms')} ms  jitter p99 {result['tick_jitter'].get('p99_ms')} ms")
+
+    for model in ("VIVE Tracker 3.0", "Tundra Tracker"):
+        for tracker_count in tracker_counts:
+            for legacy_threads in (False, True):
+                result = run_pulse_accuracy(tracker_count, model, duration, legacy_threads)
+                results["pulse_accuracy"].append(result)
+                print(f"[Bench] pulses {model:<17} x{tracker_count:<3} {'threads' if legacy_threads else 'scheduler':<9}  "
+                      f"ratio {result['pulse_ratio']}  length errors {result['length_errors']}  "
+                      f"interval error {result['pulse_interval_error_ms']} ms  "
+                      f"jitter p99 {result['tick_jitter'].get('p99_ms')} ms  missed {result['missed_ticks']}")
+
+    for model in ("VIVE Tracker 3.0", "Tundra Tracker"):
+        for legacy_threads in (False, True):
+            for idle_suspend in (False, True):
+                result = run_idle_cpu(8, model, duration, legacy_threads, idle_suspend)
+                results["idle"].append(result)
+                print(f"[Bench] idle {model:<17} x8   {'threads' if legacy_threads else 'scheduler':<9}  "
+                      f"{'suspend' if idle_suspend else 'no suspend':<10}  cpu {result['cpu_percent']}%  "
+                      f"({result['cpu_ms_per_tracker_per_s']} ms/tracker/s)  idle pulses {result['idle_pulses']}  "
+                      f"wake to pulse {result['wake_to_pulse_ms']} ms")
+
+    result = run_replay(8, "Tundra Tracker", 64, 50000 if args.quick else 200000)
+    results["replay"].append(result)
+    print(f"[Bench] replay {result['replayed']} parameters  {result['throughput_per_s']}/s  cpu {result['cpu_percent']}%")
+
+    # Cold start, in fresh interpreters
+    results["startup"] = run_startup(1 if args.quick else 5)
+    print(f"[Bench] startup imports {results['startup']['imports']['lazy']} ms  "
+          f"config {results['startup']['config']['load']} ms  "
+          f"bridge start {results['startup']['bridge_osc']['start']} ms  "
+          f"engine ready {results['startup']['engine']['ready']} ms")
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, fp=output_file, indent=2)
+        print(f"[Bench] Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
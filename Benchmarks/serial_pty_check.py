@@ -0,0 +1,66 @@
+# Runs a SerialTarget against a pseudo terminal pair (Linux/macOS) and decodes what arrives on the other end.
+# Usage: python Benchmarks/serial_pty_check.py [--seconds N] [--interval-ms N]
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "BridgeApp"))
+
+from app_config import AppConfig
+from app_scheduler import FeedbackScheduler
+from target_serial import SerialTarget, decode_frames
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=2.0)
+    parser.add_argument("--interval-ms", type=float, default=20)
+    parser.add_argument("--channels", type=int, default=4)
+    args = parser.parse_args()
+
+    master, slave = os.openpty()
+    os.set_blocking(master, False)
+
+    config = AppConfig()
+    config.check_integrity()
+    proximity = config.pattern_config_list[0]
+    proximity.pattern, proximity.str_min, proximity.str_max = "Linear", 0, 100
+    config.pattern_config_list[1].pattern = "None"
+    config.pattern_changed()
+
+    scheduler = FeedbackScheduler()
+    scheduler.start()
+    target = SerialTarget(config, scheduler, "PTY", args.interval_ms)
+    config.get_tracker_config("PTY").set_target_port(os.ttyname(slave))
+    channels = [f"PTY-{i}" for i in range(args.channels)]
+    for channel in channels:
+        target.add_channel(channel)
+
+    received = []
+    pending = b""
+    end_time = time.time() + args.seconds
+    while time.time() < end_time:
+        for i, channel in enumerate(channels):
+            target.set_strength(channel, (i + 1) / len(channels))
+        time.sleep(0.005)
+        try:
+            pending += os.read(master, 65536)
+        except BlockingIOError:
+            continue
+        frames, pending = decode_frames(pending)
+        received.extend(frames)
+
+    target.shutdown()
+    scheduler.stop()
+
+    expected = args.seconds * 1000 / args.interval_ms
+    gaps = sum(1 for a, b in zip(received, received[1:]) if (a[0] + 1) & 0xFF != b[0])
+    print(f"[PTY] {len(received)} frames received, ~{expected:.0f} expected, {gaps} sequence gaps")
+    if received:
+        print(f"[PTY] Last frame: {[round(value, 3) for value in received[-1][1]]}")
+    print(f"[PTY] Writer: {target.writer.stats()}")
+
+
+if __name__ == '__main__':
+    main()
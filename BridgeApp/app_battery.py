@@ -0,0 +1,81 @@
+import threading
+import time
+from typing import Callable, Dict, List
+
+from app_config import AppConfig
+
+
+# Keeps the battery level of every watched device in memory.
+# A low rate background thread refreshes the values once they are older than the configured TTL,
+# so the feedback loop only ever reads a cached float.
+class BatteryMonitor(threading.Thread):
+    # Changes smaller than this are not reported to the listeners
+    CHANGE_EPSILON = 0.005
+
+    def __init__(self, config: AppConfig, read_function: Callable[[int], float]):
+        super().__init__(name="BatteryMonitor", daemon=True)
+        self.config = config
+        self.read_function = read_function
+        self.levels: Dict[int, float] = {}
+        self.read_times: Dict[int, float] = {}
+        self.listeners: List[Callable[[int, float], None]] = []
+        self.wake_event = threading.Event()
+        self.running = False
+
+    def watch(self, index):
+        if index in self.read_times:
+            return
+        self.read_times[index] = 0
+        self.wake_event.set()
+
+    def unwatch(self, index):
+        self.read_times.pop(index, None)
+        self.levels.pop(index, None)
+
+    def get_level(self, index):
+        # Unknown devices are treated as fully charged until the first read
+        return self.levels.get(index, 1.0)
+
+    def add_listener(self, listener: Callable[[int, float], None]):
+        # The listener receives (index, level) whenever a level changes
+        self.listeners.append(listener)
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+
+    def run(self):
+        print(f"[BatteryMonitor] Thread started, refreshing every {self.config.battery_cache_ttl} s")
+        while self.running:
+            ttl = max(self.config.battery_cache_ttl, 1.0)
+            now = time.time()
+            next_refresh = now + ttl
+            for index, read_time in list(self.read_times.items()):
+                if now - read_time >= ttl:
+                    self.refresh(index, now)
+                    read_time = now
+                next_refresh = min(next_refresh, read_time + ttl)
+
+            self.wake_event.wait(max(next_refresh - time.time(), 0))
+            self.wake_event.clear()
+
+    def refresh(self, index, now):
+        try:
+            level = float(self.read_function(index))
+        except Exception as e:
+            print(f"[BatteryMonitor][ERROR] Failed to read battery of device {index}: {e}")
+            return
+
+        if index not in self.read_times:
+            # Unwatched while reading
+            return
+        self.read_times[index] = now
+        old_level = self.levels.get(index)
+        self.levels[index] = level
+        if old_level is None or abs(level - old_level) >= self.CHANGE_EPSILON:
+            for listener in self.listeners:
+                listener(index, level)
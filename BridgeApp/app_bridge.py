@@ -0,0 +1,218 @@
+import os.path
+import time
+
+import app_trace
+from app_config import AppConfig
+from app_engine import DeviceState
+from app_ingest import IngestManager, MAIN_SOURCE
+from app_persistence import ConfigWriter
+from app_recorder import ParamRecorder
+from app_routing import AddressFilter, AddressRouter
+from app_scheduler import FeedbackScheduler
+
+EXTERNAL_SOUND_EMU = "EMUSND"
+EXTERNAL_TEXT_EMU = "EMUTXT"
+EXTERNAL_SERIAL_COM = "SERIALCOM"
+EXTERNAL_NETWORK = "NETWORK"
+
+
+# The UI independent core of the app: bridge servers (sources) -> router -> targets.
+# Shared by the GUI (main.py) and the headless daemon (daemon.py).
+class HapticBridge:
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.status_update = lambda message, is_error=False: None
+        # Build the address routing table
+        self.router = AddressRouter(config)
+        self.address_filter = AddressFilter(self.router) if config.osc_address_filter else None
+        self.ingest = IngestManager(config, self.source_param_received, self.source_param_batch_received,
+                                    self.source_status_update, self.address_filter)
+        # OpenVRTracker, created in start(). Targets are imported when they're first used (openvr, pyserial).
+        self.vr = None
+        self.external_targets = {}
+        self.external_id = 0
+        self.recorder: ParamRecorder = None
+        # Router entry points, wrapped by the recorder while recording
+        self.deliver_param = self.param_received
+        self.deliver_param_batch = self.param_batch_received
+
+        # Save config changes in the background
+        self.config_writer = ConfigWriter(config)
+        self.scheduler = FeedbackScheduler(config)
+        # Milliseconds spent per startup phase, see main.py --startup-profile
+        self.startup = {}
+
+    def start(self, status_update=None):
+        if status_update is not None:
+            self.status_update = status_update
+        self.config_writer.start()
+
+        if self.config.record_file:
+            try:
+                self.recorder = ParamRecorder(self.config.record_file)
+            except OSError as e:
+                print(f"[Bridge][ERROR] Can't record to {self.config.record_file}: {e}")
+
+        # Start the Servers
+        phase_start = time.perf_counter()
+        self.start_server()
+        print(f"[Bridge] Bridge server started ({len(self.ingest.sources)} sources)")
+        self.startup["server bind"] = (time.perf_counter() - phase_start) * 1000
+
+        # Start the haptic scheduler
+        self.scheduler.start()
+
+        # Init OpenVR
+        phase_start = time.perf_counter()
+        from target_ovr import OpenVRTracker
+        self.vr = OpenVRTracker(self.config, self.scheduler)
+        self.startup["OpenVR init"] = (time.perf_counter() - phase_start) * 1000
+
+    def start_server(self):
+        if self.recorder is not None:
+            self.deliver_param = self.recorder.wrap(self.param_received)
+            self.deliver_param_batch = self.recorder.wrap_batch(self.param_batch_received)
+            if self.address_filter is not None:
+                # The log keeps every parameter, so it can be replayed against other mappings
+                self.address_filter.enabled = False
+        self.ingest.start()
+
+    def restart_server(self, source=MAIN_SOURCE):
+        # The server settings of the GUI belong to the main source, the extra sources keep running
+        return self.ingest.restart(source)
+
+    # Every source feeds the same routing stage
+    def source_param_received(self, source, address, value, timestamp=None):
+        self.deliver_param(address, value, timestamp)
+
+    def source_param_batch_received(self, source, params):
+        self.deliver_param_batch(params)
+
+    def source_status_update(self, source, message, is_error=False):
+        # The status bar shows the main source, others only when something goes wrong
+        if source == MAIN_SOURCE:
+            self.status_update(message, is_error)
+        elif is_error:
+            self.status_update(f"[{source}] {message}", is_error)
+
+    def get_target(self, serial):
+        return self.external_targets.get(serial, self.vr)
+
+    def param_received(self, address, value, timestamp=None):
+        # value is the floating value (0..1) that determines how intense the feedback should be
+        # timestamp is the perf_counter_ns() arrival time, used for latency tracing
+        for serial in self.router.route(address):
+            self.get_target(serial).set_strength(serial, value, timestamp)
+
+    def param_batch_received(self, params):
+        route = self.router.route
+        for address, value, timestamp in params:
+            for serial in route(address):
+                self.get_target(serial).set_strength(serial, value, timestamp)
+
+    def pulse_test(self, serial, pulse_length=500):
+        print(f"[Bridge] Pulse test for {serial} executed.")
+        target = self.get_target(serial)
+        if target is not None:
+            target.pulse_by_serial(serial, pulse_length)
+
+    def query_trackers(self):
+        if self.vr is None:
+            return []
+        return self.vr.query_devices()
+
+    def add_device_listener(self, listener):
+        # The listener receives (added, removed) lists of VRTracker, see OpenVRTracker.add_device_listener
+        self.vr.add_device_listener(listener)
+
+    def config_changed(self):
+        self.config_writer.mark_dirty()
+
+    def channel_states(self):
+        # One row per haptic channel, see FeedbackDevice.state
+        states = []
+        for target in [self.vr] + list(self.external_targets.values()):
+            if target is not None:
+                states.extend(target.channel_states())
+        return states
+
+    def device_states(self):
+        # {serial: DeviceState}, like EngineClient.device_states reads it from the engine's table
+        return {state[0]: DeviceState(*state[1:]) for state in self.channel_states()}
+
+    def render_external_text(self, serial):
+        target = self.external_targets.get(serial)
+        if target is None or not serial.startswith(EXTERNAL_TEXT_EMU):
+            return None
+        return target.render_text()
+
+    def render_external_sound(self, serial, path):
+        target = self.external_targets.get(serial)
+        if target is None or not serial.startswith(EXTERNAL_SOUND_EMU):
+            return
+        target.render_wav(path)
+        target.save_trace(os.path.splitext(path)[0] + ".hptr")
+
+    def add_external_target(self, external_type):
+        # Returns (serial, model) of the new target, or None if the type is unknown
+        self.external_id += 1
+        print(external_type + '; ' + str(self.external_id))
+        suffix = "-" + str(self.external_id)
+
+        if external_type.endswith(EXTERNAL_SOUND_EMU):
+            from target_emulated import EmulatedTarget
+            serial, model = EXTERNAL_SOUND_EMU + suffix, "Sound Target"
+            self.external_targets[serial] = EmulatedTarget(self.config, self.scheduler, serial, model)
+        elif external_type.endswith(EXTERNAL_TEXT_EMU):
+            from target_emulated import EmulatedTarget
+            serial, model = EXTERNAL_TEXT_EMU + suffix, "Text Target"
+            self.external_targets[serial] = EmulatedTarget(self.config, self.scheduler, serial, model)
+        elif external_type.endswith(EXTERNAL_SERIAL_COM):
+            from target_serial import SerialTarget
+            serial, model = EXTERNAL_SERIAL_COM + suffix, "Serial Target"
+            target = SerialTarget(self.config, self.scheduler, serial)
+            target.add_channel(serial)
+            self.external_targets[serial] = target
+        elif external_type.endswith(EXTERNAL_NETWORK):
+            from target_network import NetworkTarget
+            serial, model = EXTERNAL_NETWORK + suffix, "Network Target"
+            target = NetworkTarget(self.config, self.scheduler, serial)
+            target.add_channel(serial)
+            self.external_targets[serial] = target
+        else:
+            return None
+        return serial, model
+
+    def stats(self):
+        targets = {}
+        for target in [self.vr] + list(self.external_targets.values()):
+            if target is not None:
+                targets.update(target.stats())
+        return {"sources": self.ingest.stats(), "router": self.router.stats(),
+                "address_filter": self.address_filter.stats() if self.address_filter is not None else None,
+                "config_writer": self.config_writer.stats(),
+                "scheduler": self.scheduler.stats(), "targets": targets,
+                "startup": {phase: round(ms, 2) for phase, ms in self.startup.items()}}
+
+    def save_config(self):
+        # Final synchronous save, only after a clean exit
+        self.config_writer.stop()
+        print(f"[ConfigWriter] {self.config_writer.stats()}")
+
+    def shutdown(self):
+        self.ingest.stop()
+        print(f"[Ingest] {self.ingest.stats()}")
+        if self.recorder is not None:
+            self.recorder.close()
+        self.scheduler.stop()
+        print(f"[Router] {self.router.stats()}")
+        if self.address_filter is not None:
+            print(f"[AddressFilter] {self.address_filter.stats()}")
+        traces = {}
+        for target in [self.vr] + list(self.external_targets.values()):
+            if target is not None:
+                print(f"[Bridge] Target stats: {target.stats()}")
+                traces.update(target.traces())
+                target.shutdown()
+        if self.config.trace_export_file:
+            app_trace.export(traces, self.config.trace_export_file)
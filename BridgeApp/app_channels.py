@@ -0,0 +1,321 @@
+import collections
+import itertools
+import threading
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from app_config import AppConfig, TrackerConfig, VRTracker
+from app_pattern import VibrationPattern
+from app_runner import FeedbackDevice
+from app_trace import DeviceTrace
+
+
+# Feedback state of many channels that tick together, indexed by a dense channel id.
+# Small stores tick a FeedbackDevice per channel (see app_runner). From VECTOR_THRESHOLD channels on, where NumPy
+# pays off, the state moves into struct-of-arrays and the same pulses are computed for every channel at once.
+# That vectorized tick mirrors FeedbackDevice.tick, Benchmarks/bench_channels.py --verify checks both agree.
+# The settings of each channel (multiplier, battery threshold) are resolved into arrays once per change
+# instead of being looked up on every tick.
+# Like the FeedbackDevice of a channel, pulses longer than a tick carry over into the following ticks.
+class ChannelStore:
+    LOW_BATTERY_ALERT_COUNT = FeedbackDevice.LOW_BATTERY_ALERT_COUNT
+    # Updates posted between two ticks, for all channels together
+    QUEUE_CAPACITY = 65536
+    INITIAL_CAPACITY = 8
+    # Below this many channels, NumPy's per call overhead costs more than a FeedbackDevice per channel
+    VECTOR_THRESHOLD = 16
+    # Per channel arrays: name, type, initial value
+    FIELDS = (
+        ("strength", np.float64, 0.0),
+        ("delta", np.float64, 0.0),
+        ("battery", np.float64, 1.0),
+        # Battery threshold as a fraction
+        ("threshold", np.float64, 0.0),
+        # Pulse multiplier of the model times the multiplier override
+        ("multiplier", np.float64, 1.0),
+        # perf_counter() time until which a forced (or carried over) pulse lasts
+        ("force_stop", np.float64, 0.0),
+        # Share of the last tick spent pulsing, before and after rounding to whole microseconds
+        ("output", np.float64, 0.0),
+        ("intensity", np.float64, 0.0),
+        # Highest output since states() was last read
+        ("peak", np.float64, 0.0),
+        # Low battery pulses left to play
+        ("alert", np.int32, LOW_BATTERY_ALERT_COUNT),
+        ("received", np.int64, 0),
+        # Queue sequence of the latest update applied, older ones arriving late are stale
+        ("applied", np.int64, -1),
+    )
+
+    def __init__(self, config: AppConfig, interval_ms, trace: DeviceTrace):
+        self.config = config
+        self.interval_ms = interval_ms
+        self.trace = trace
+        self.vp = VibrationPattern(config)
+        self.settings_revision = config.tracker_revision()
+        self.resolved_revision = -1
+        # Serializes ticks with adding channels, which may reallocate the arrays
+        self.lock = threading.Lock()
+
+        self.count = 0
+        self.ids: Dict[str, int] = {}
+        self.trackers: List[VRTracker] = []
+        self.tracker_configs: List[TrackerConfig] = []
+
+        # Receiver threads append (sequence, channel id, strength, arrival timestamp) without a lock,
+        # the tick drains it. Gaps in the sequence are updates the full queue discarded, and updates may
+        # arrive out of order (see StrengthMailbox).
+        self.queue = collections.deque(maxlen=self.QUEUE_CAPACITY)
+        self.sequence = itertools.count()
+        self.last_sequence = -1
+        self.coalesced = 0
+        self.dropped = 0
+
+        # One FeedbackDevice per channel until the store is vectorized, None after that
+        self.devices: List[FeedbackDevice] = []
+
+        self.capacity = 0
+        self.__allocate(self.INITIAL_CAPACITY)
+
+    def __allocate(self, capacity):
+        for name, dtype, initial in self.FIELDS:
+            array = np.full(capacity, initial, dtype=dtype)
+            if self.capacity:
+                array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def add(self, tracker: VRTracker, battery_level=1.0):
+        # Returns the channel id
+        with self.lock:
+            if tracker.serial in self.ids:
+                return self.ids[tracker.serial]
+            if self.count == self.capacity:
+                self.__allocate(self.capacity * 2)
+            channel = self.count
+            self.trackers.append(tracker)
+            self.tracker_configs.append(self.config.get_tracker_config(tracker.serial))
+            self.battery[channel] = battery_level
+            self.count += 1
+            self.ids[tracker.serial] = channel
+            self.resolve(channel)
+            if self.devices is not None:
+                self.devices.append(self.__make_device(tracker, battery_level))
+                if self.count >= self.VECTOR_THRESHOLD:
+                    self.__vectorize()
+            return channel
+
+    def __make_device(self, tracker: VRTracker, battery_level):
+        device = FeedbackDevice(self.config, tracker, self.__pulse, lambda index: battery_level)
+        # Ticks at the store's interval and reports whole microseconds, like the vectorized tick rounds to
+        device.interval_ms = self.interval_ms
+        device.interval_s = self.interval_ms / 1000
+        device.hack_pulse_limit_ms = self.interval_ms
+        device.hack_pulse_mult_to_ms = 1 / 1000
+        # Carrying over is how channels play long pulses, not worth a warning
+        device.hack_pulse_limit_exceeded = True
+        device.trace = self.trace
+        return device
+
+    def __pulse(self, channel, pulse_length_us):
+        self.intensity[channel] = min(pulse_length_us / 1000 / self.interval_ms, 1.0)
+
+    def __vectorize(self):
+        # Moves the state of the per channel devices into the arrays, called with the lock held between ticks
+        for channel, device in enumerate(self.devices):
+            self.strength[channel] = device.strength
+            self.delta[channel] = device.strength_delta
+            self.battery[channel] = device.battery_level
+            self.force_stop[channel] = device.hack_pulse_force_stop_time
+            self.alert[channel] = device.battery_low_notif
+            self.output[channel] = device.output
+            self.peak[channel] = device.output_peak
+            self.received[channel] = device.mailbox.received
+            self.coalesced += device.mailbox.coalesced
+        self.devices = None
+
+    def resolve(self, channel):
+        tracker_config = self.tracker_configs[channel]
+        self.multiplier[channel] = self.trackers[channel].pulse_multiplier * tracker_config.multiplier_override
+        self.threshold[channel] = tracker_config.battery_threshold / 100
+
+    # Called from any thread
+    def post(self, channel, strength, timestamp=None):
+        self.queue.append((next(self.sequence), channel, strength, timestamp))
+
+    def force_pulse(self, channel, length_ms):
+        # Channels pulse at most one tick at a time, the rest carries over
+        devices = self.devices
+        if devices is not None:
+            devices[channel].force_pulse(length_ms)
+        else:
+            self.force_stop[channel] = time.perf_counter() + length_ms / 1000
+
+    def set_battery(self, channel, level):
+        devices = self.devices
+        if devices is not None:
+            devices[channel].battery_level = level
+        else:
+            self.battery[channel] = level
+
+    def receive_sequence(self, sequence):
+        # Accounts for updates the full queue discarded, see StrengthMailbox
+        if sequence > self.last_sequence:
+            self.dropped += sequence - self.last_sequence - 1
+            self.last_sequence = sequence
+        else:
+            self.dropped -= 1
+
+    def receive(self):
+        # Folds every update posted since the last tick into strength and delta.
+        # Returns {channel id: earliest arrival timestamp} of the channels that got a timestamped update.
+        strength, delta, received, applied = self.strength, self.delta, self.received, self.applied
+        pending = {}
+        updated = set()
+        count = 0
+        while True:
+            try:
+                sequence, channel, value, timestamp = self.queue.popleft()
+            except IndexError:
+                break
+
+            self.receive_sequence(sequence)
+            received[channel] += 1
+            count += 1
+            if sequence < applied[channel]:
+                continue
+            applied[channel] = sequence
+
+            delta[channel] += abs(value - strength[channel])
+            strength[channel] = value
+            updated.add(channel)
+            if timestamp is not None and (channel not in pending or timestamp < pending[channel]):
+                pending[channel] = timestamp
+        self.coalesced += count - len(updated)
+        return pending
+
+    # start_time is the tick's time in perf_counter() seconds.
+    # Returns the intensity (0..1 of the tick) of every channel, a view that's valid until the next tick.
+    def tick(self, start_time):
+        with self.lock:
+            if self.devices is not None:
+                return self.tick_devices(start_time)
+            if self.resolved_revision != self.settings_revision.value:
+                self.resolved_revision = self.settings_revision.value
+                for channel in range(self.count):
+                    self.resolve(channel)
+            pending = self.receive()
+
+            n = self.count
+            strength, delta, alert, force_stop = self.strength[:n], self.delta[:n], self.alert[:n], self.force_stop[:n]
+
+            # Low battery: play the alert pulses, then nothing. Otherwise the pattern.
+            low = self.battery[:n] < self.threshold[:n]
+            if low.any():
+                alerting = low & (alert > 0)
+                alert[alerting] -= 1
+                alert_values = np.where(alerting, np.mod(alert, 0.9), 0.0)
+                alert[~low] = self.LOW_BATTERY_ALERT_COUNT
+            else:
+                alert_values = None
+                alert[:] = self.LOW_BATTERY_ALERT_COUNT
+
+            patterned = self.vp.apply_pattern_batch(strength, delta)
+            if alert_values is None:
+                delta -= patterned
+            else:
+                delta -= np.where(low, 0.0, patterned)
+            np.maximum(delta, 0.0, out=delta)
+
+            values = np.where(patterned > 0, patterned * self.multiplier[:n], 0.0)
+            if alert_values is not None:
+                values = np.where(low, alert_values, values)
+            pulse = np.where(values > 0, values * self.interval_ms, 0.0)
+
+            # Forced pulses and carry-over from previous ticks
+            forced = start_time < force_stop
+            if forced.any():
+                pulse = np.where(forced, np.maximum(pulse, (force_stop - start_time) * 1000), pulse)
+            exceeded = pulse > self.interval_ms
+            if exceeded.any():
+                force_stop[exceeded] = time.perf_counter() + pulse[exceeded] / 1000
+                np.minimum(pulse, self.interval_ms, out=pulse)
+            self.output[:n] = pulse / self.interval_ms
+            np.maximum(self.peak[:n], self.output[:n], out=self.peak[:n])
+
+            # Whole microseconds, like the pulse lengths a channel's FeedbackDevice reports
+            intensity = self.intensity[:n]
+            np.floor(pulse / (1 / 1000), out=intensity)
+            intensity /= 1000
+            intensity /= self.interval_ms
+            np.minimum(intensity, 1.0, out=intensity)
+
+            # Updates that didn't result in a pulse are not traced
+            for channel, timestamp in pending.items():
+                if intensity[channel] > 0:
+                    self.trace.record_latency(timestamp)
+            return intensity
+
+    def tick_devices(self, start_time):
+        # The updates go to the mailbox of their channel's device, which picks them up in its tick
+        while True:
+            try:
+                sequence, channel, value, timestamp = self.queue.popleft()
+            except IndexError:
+                break
+            self.receive_sequence(sequence)
+            # The mailbox numbers updates in the order they're posted here, so stale ones are dropped first
+            if sequence < self.applied[channel]:
+                continue
+            self.applied[channel] = sequence
+            self.devices[channel].mailbox.post(value, timestamp)
+        n = self.count
+        self.intensity[:n] = 0.0
+        for device in self.devices:
+            device.tick(start_time)
+        return self.intensity[:n]
+
+    def is_idle(self, start_time):
+        # Nothing to play on any channel: see FeedbackDevice.is_idle
+        devices = self.devices
+        if devices is not None:
+            return not self.queue and all(device.is_idle(start_time) for device in devices)
+        n = self.count
+        if self.queue or self.strength[:n].any():
+            return False
+        if self.vp.uses_velocity() and self.delta[:n].any():
+            return False
+        if (start_time < self.force_stop[:n]).any():
+            return False
+        return not ((self.battery[:n] < self.threshold[:n]) & (self.alert[:n] > 0)).any()
+
+    def states(self):
+        # (serial, strength, output, battery, multiplier, battery threshold, received, missed ticks) per channel.
+        # output is the peak since the previous call, see FeedbackDevice.state
+        with self.lock:
+            if self.devices is not None:
+                return [device.state() for device in self.devices]
+            peak = self.peak[:self.count].tolist()
+            self.peak[:self.count] = 0.0
+        return [(tracker.serial, float(self.strength[channel]), peak[channel],
+                 float(self.battery[channel]), tracker_config.multiplier_override, tracker_config.battery_threshold,
+                 int(self.received[channel]), self.trace.missed_ticks)
+                for channel, (tracker, tracker_config) in enumerate(zip(self.trackers, self.tracker_configs))]
+
+    def channel_received(self, channel):
+        devices = self.devices
+        if devices is not None:
+            return devices[channel].mailbox.received
+        return int(self.received[channel])
+
+    def stats(self):
+        devices = self.devices
+        return {
+            "channels": self.count,
+            "vectorized": devices is None,
+            "received": sum(self.channel_received(channel) for channel in range(self.count)),
+            "coalesced": self.coalesced + (sum(device.mailbox.coalesced for device in devices) if devices else 0),
+            "dropped": self.dropped,
+        }
@@ -1,13 +1,16 @@
+import os
 import os.path
 import json
+import tempfile
 from pydantic import BaseModel
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Callable, Optional
 
 CONFIG_FILE_NAME: str = "config.json"
 
 
 # This is a runtime class for storing OVR trackers
 class VRTracker:
+    __slots__ = ("index", "model", "serial", "pulse_multiplier")
     index: int
     model: str
     serial: str
@@ -28,6 +31,14 @@ class VRTracker:
         return 1.0
 
 
+# A counter shared by reference, so readers don't have to go through the model
+class Revision:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+
 # This is a definition class for storing user settings per tracker
 class TrackerConfig(BaseModel):
     # serial: str
@@ -37,6 +48,15 @@ class TrackerConfig(BaseModel):
     multiplier_override: float = 1.0
     pattern_override: str = "None"
     battery_threshold: int = 20
+    # External targets only
+    target_port: str = ""
+    target_baud_rate: int = 115200
+    target_host: str = ""
+
+    # Called whenever the address list changes, bound by AppConfig
+    _address_changed: Optional[Callable[[], None]] = None
+    # Called whenever the multiplier or the battery threshold changes, bound by AppConfig
+    _settings_changed: Optional[Callable[[], None]] = None
     
     def get_address_str(self):
         if len(self.address_list) == 0:
@@ -46,23 +66,56 @@ class TrackerConfig(BaseModel):
         return result
     
     def set_address(self, value):
-        self.address_list = value.split(';')
+        address_list = value.split(';')
+        if address_list == self.address_list:
+            return
+        self.address_list = address_list
+        if self._address_changed is not None:
+            self._address_changed()
 
     def set_vibration_multiplier(self, value):
         if value is None:
             return
+        previous = self.multiplier_override
         try:
             self.multiplier_override = float(value)
         except ValueError:
             self.multiplier_override = 1.0
+        if self.multiplier_override != previous:
+            self.__notify_settings_changed()
+
+    def set_target_port(self, value):
+        if value is None:
+            return
+        self.target_port = str(value).strip()
+
+    def set_target_baud_rate(self, value):
+        if value is None:
+            return
+        try:
+            self.target_baud_rate = int(value)
+        except ValueError:
+            self.target_baud_rate = 115200
+
+    def set_target_host(self, value):
+        if value is None:
+            return
+        self.target_host = str(value).strip()
 
     def set_battery_threshold(self, value):
         if value is None:
             return
+        previous = self.battery_threshold
         try:
             self.battery_threshold = int(value)
         except ValueError:
             self.battery_threshold = 20
+        if self.battery_threshold != previous:
+            self.__notify_settings_changed()
+
+    def __notify_settings_changed(self):
+        if self._settings_changed is not None:
+            self._settings_changed()
 
 
 class PatternConfig(BaseModel):
@@ -79,37 +132,149 @@ class PatternConfig(BaseModel):
         self.speed = int(speed)
 
 
+# An extra bridge server running next to the main one, see app_ingest.
+# Uses the same server types and settings as the main server in AppConfig.
+class SourceConfig(BaseModel):
+    name: str = ""
+    enabled: bool = True
+    server_type: int = 0
+    server_ip: str = "127.0.0.1"
+    server_port: int = 9002
+    replay_file: str = ""
+    replay_speed: float = 1.0
+
+
 class AppConfig(BaseModel):
     version: int = 2
     server_type: int = 0
     server_ip: str = "127.0.0.1"
     server_port: int = 9001
+    # OSC receivers drop the addresses no tracker is mapped to before decoding them
+    osc_address_filter: bool = True
+    # Run one FeedbackThread per tracker instead of the shared scheduler
+    legacy_feedback_threads: bool = False
+    # Stop ticking devices that have nothing to play until they receive something
+    idle_suspend: bool = True
+    # Seconds a cached battery level stays valid before it's read from the device again
+    battery_cache_ttl: float = 30.0
+    # Latency/jitter traces are written here on exit (.csv or .json), if set
+    trace_export_file: str = ""
+    # Incoming parameters are recorded to this log, if set (see app_recorder)
+    record_file: str = ""
+    # Log played back by the "Replay" server type, and its speed (1.0 is real time, 0 is as fast as possible)
+    replay_file: str = ""
+    replay_speed: float = 1.0
+    # Linux only: pin the haptic output thread to these CPUs and give it real-time priority
+    realtime_output: bool = False
+    realtime_cpus: List[int] = []
+    realtime_priority: int = 10
+    # Additional sources feeding the same trackers, e.g. a second game or a replay running alongside
+    extra_sources: List[SourceConfig] = []
+    # Run the haptic engine (servers, routing, patterns, output) in its own process, see app_engine
+    engine_process: bool = True
+    # Localhost port of the control API of the headless daemon (daemon.py)
+    control_port: int = 9080
     pattern_config_list: List[PatternConfig] = []
     tracker_config_dict: Dict[str, TrackerConfig] = {}
 
     # OBSOLETE - Will delete these in the next version
     tracker_to_osc: Dict[str, str] = {}
 
+    _address_listeners: List[Callable[[str, List[str]], None]] = []
+    # The last content written to disk, used to skip redundant saves
+    _saved_json: str = ""
+    # Bumped on every change of the pattern settings, so compiled patterns know when to rebuild
+    _pattern_revision: Optional[Revision] = None
+    # Bumped whenever a tracker's multiplier or battery threshold changes, see ChannelStore
+    _tracker_revision: Optional[Revision] = None
+
+    def model_post_init(self, __context: Any):
+        self._pattern_revision = Revision()
+        self._tracker_revision = Revision()
+        for serial, tracker_config in self.tracker_config_dict.items():
+            self.__bind_tracker_config(serial, tracker_config)
+
     def get_tracker_config(self, device_serial):
         if device_serial in self.tracker_config_dict:
             return self.tracker_config_dict[device_serial]
         result = TrackerConfig()
         self.tracker_config_dict[device_serial] = result
+        self.__bind_tracker_config(device_serial, result)
+        self.__notify_address_changed(device_serial)
         return result
 
+    def add_address_listener(self, listener: Callable[[str, List[str]], None]):
+        # The listener receives (serial, address_list) every time a tracker's mapping changes
+        self._address_listeners.append(listener)
+
+    def __bind_tracker_config(self, serial, tracker_config: TrackerConfig):
+        tracker_config._address_changed = lambda: self.__notify_address_changed(serial)
+        tracker_config._settings_changed = self.tracker_changed
+
+    def __notify_address_changed(self, serial):
+        address_list = self.tracker_config_dict[serial].address_list
+        for listener in self._address_listeners:
+            listener(serial, address_list)
+
+    def pattern_revision(self):
+        # Hot loops keep the returned object, reading private attributes of a model is slow
+        return self._pattern_revision
+
+    def pattern_changed(self):
+        self._pattern_revision.value += 1
+
+    def tracker_revision(self):
+        return self._tracker_revision
+
+    def tracker_changed(self):
+        self._tracker_revision.value += 1
+
+    # Copies the settings the GUI edits from another config into this one. Done in place, so
+    # devices and the router holding on to parts of this config pick the changes up.
+    def apply_settings(self, other: "AppConfig"):
+        self.server_type = other.server_type
+        self.server_ip = other.server_ip
+        self.server_port = other.server_port
+
+        pattern_changed = False
+        for pattern_config, other_pattern in zip(self.pattern_config_list, other.pattern_config_list):
+            if pattern_config != other_pattern:
+                pattern_config.pattern, pattern_config.str_min, pattern_config.str_max, pattern_config.speed = \
+                    other_pattern.pattern, other_pattern.str_min, other_pattern.str_max, other_pattern.speed
+                pattern_changed = True
+        if pattern_changed:
+            self.pattern_changed()
+
+        for serial, other_tracker in other.tracker_config_dict.items():
+            tracker_config = self.get_tracker_config(serial)
+            if other_tracker.address_list != tracker_config.address_list:
+                tracker_config.set_address(";".join(other_tracker.address_list))
+            tracker_config.set_vibration_multiplier(other_tracker.multiplier_override)
+            tracker_config.set_battery_threshold(other_tracker.battery_threshold)
+            tracker_config.set_target_port(other_tracker.target_port)
+            tracker_config.set_target_baud_rate(other_tracker.target_baud_rate)
+            tracker_config.set_target_host(other_tracker.target_host)
+
+    # Returns True if anything had to be fixed or migrated, so the config needs saving
     def check_integrity(self):
+        changed = False
         if len(self.pattern_config_list) != 2:
             self.init_pattern_config()
+            changed = True
         for key in self.tracker_to_osc:
             new_config = TrackerConfig()
             new_config.address = self.tracker_to_osc[key]
             self.tracker_config_dict[key] = new_config
+            self.__bind_tracker_config(key, new_config)
+            changed = True
         self.tracker_to_osc.clear()
         
         for serial, tracker_config in self.tracker_config_dict.items():
             if tracker_config.address:
                 tracker_config.set_address(tracker_config.address)
                 tracker_config.address = ''
+                changed = True
+        return changed
 
     def init_pattern_config(self):
         self.pattern_config_list.clear()
@@ -118,6 +283,7 @@ class AppConfig(BaseModel):
         self.pattern_config_list.append(PatternConfig(VibrationPattern.VIB_PATTERN_LIST[4], 0, 80, 4))
         # VELOCITY Defaults: (None, 80, 32)
         self.pattern_config_list.append(PatternConfig(VibrationPattern.VIB_PATTERN_LIST[0], 40, 80, 16))
+        self.pattern_changed()
 
     @staticmethod
     def load():
@@ -127,12 +293,39 @@ class AppConfig(BaseModel):
             return AppConfig()
         with open(CONFIG_FILE_NAME, "r") as settings_file:
             print(f"[Config] Opened {os.path.abspath(CONFIG_FILE_NAME)}")
-            try:
-                return AppConfig(**json.load(settings_file))
-            except json.JSONDecodeError:
-                print(f"[Config][ERROR] Corrupted file. Loading default config...")
-                return AppConfig()
-
-    def save(self):
-        with open(CONFIG_FILE_NAME, "w+") as settings_file:
-            json.dump(self.model_dump(), fp=settings_file)
+            content = settings_file.read()
+        try:
+            config = AppConfig(**json.loads(content))
+        except json.JSONDecodeError:
+            print(f"[Config][ERROR] Corrupted file. Loading default config...")
+            return AppConfig()
+        # Saving a config that hasn't changed since it was loaded is skipped
+        config._saved_json = content
+        return config
+
+    def serialize(self):
+        return json.dumps(self.model_dump())
+
+    # Returns True if the file was written, False if nothing changed since the last save
+    def save(self, serialized: str = None):
+        if serialized is None:
+            serialized = self.serialize()
+        if serialized == self._saved_json:
+            return False
+
+        # Write to a temporary file first and swap it in, so a crash never leaves a half written config
+        directory = os.path.dirname(os.path.abspath(CONFIG_FILE_NAME))
+        file_descriptor, temp_path = tempfile.mkstemp(prefix=CONFIG_FILE_NAME, suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(file_descriptor, "w") as settings_file:
+                settings_file.write(serialized)
+                settings_file.flush()
+                os.fsync(settings_file.fileno())
+            os.replace(temp_path, CONFIG_FILE_NAME)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        self._saved_json = serialized
+        return True
@@ -0,0 +1,532 @@
+import itertools
+import json
+import multiprocessing
+import signal
+import struct
+import threading
+import time
+import traceback
+from collections import namedtuple
+from multiprocessing import shared_memory
+from typing import Dict
+
+from app_config import AppConfig, VRTracker
+
+# The haptic engine (bridge servers -> router -> patterns -> targets) runs in a worker process, so the GUI
+# (Tk redraws, layout rebuilds) never holds the GIL the feedback loop needs. The GUI process talks to it through:
+#   - a command channel (multiprocessing Pipe) carrying (request id or None, command, args) tuples one way,
+#     and ("reply", id, result), ("status", message, is_error), ("devices", added, removed) back
+#   - a shared-memory table the engine refreshes with the state of every feedback device, read without a round trip
+# If the GUI goes away without shutting the engine down (a crash), the engine keeps running headless
+# and opens the control API of the daemon (see daemon.py), so it can still be controlled and stopped.
+
+# Table: a fixed header followed by fixed size slots, one per feedback device.
+#   header: magic "HPET" | version (u16) | slot size (u16) | capacity (u32) | count (u32) | heartbeat (monotonic ns, i64)
+#   slot: sequence (u32) | serial (48 bytes, UTF-8) | strength | output | battery | multiplier (f64)
+#         | battery threshold (i32) | received (u64) | missed ticks (u64)
+# Every slot is a seqlock: the engine makes the sequence odd while it writes, so readers retry torn reads.
+# The GUI process creates the table, sized for the trackers in the config. When the engine has more devices
+# than fit, it posts ("table_full", capacity), the GUI creates a bigger table and sends "attach_table",
+# and the engine answers ("table_attached", name) once it switched, so the GUI can drop the old one.
+TABLE_MAGIC = b"HPET"
+TABLE_VERSION = 1
+TABLE_HEADER = struct.Struct("<4sHHIIq")
+TABLE_SLOT = struct.Struct("<I48sddddiQQ")
+TABLE_SEQUENCE = struct.Struct("<I")
+# Smallest table, it grows in powers of two from here
+TABLE_CAPACITY = 128
+SERIAL_SIZE = 48
+
+
+def table_capacity(rows):
+    capacity = TABLE_CAPACITY
+    while capacity < rows:
+        capacity *= 2
+    return capacity
+
+DeviceState = namedtuple("DeviceState", ["strength", "output", "battery", "multiplier", "battery_threshold",
+                                         "received", "missed_ticks"])
+
+
+class EngineTable:
+    # Creates a new table if name is None, attaches to an existing one otherwise
+    def __init__(self, name=None, capacity=TABLE_CAPACITY):
+        if name is None:
+            self.memory = shared_memory.SharedMemory(create=True,
+                                                     size=TABLE_HEADER.size + capacity * TABLE_SLOT.size)
+            TABLE_HEADER.pack_into(self.memory.buf, 0, TABLE_MAGIC, TABLE_VERSION, TABLE_SLOT.size, capacity, 0, 0)
+            self.owner = True
+        else:
+            self.memory = shared_memory.SharedMemory(name=name)
+            magic, version, slot_size, capacity, count, heartbeat = TABLE_HEADER.unpack_from(self.memory.buf, 0)
+            if magic != TABLE_MAGIC or version != TABLE_VERSION or slot_size != TABLE_SLOT.size:
+                self.memory.close()
+                raise ValueError(f"{name} is not an engine table (or of an unsupported version)")
+            self.owner = False
+        self.name = self.memory.name
+        self.capacity = capacity
+        # Writer side only
+        self.sequences = [0] * capacity
+
+    def publish(self, rows):
+        # rows: (serial, strength, output, battery, multiplier, battery threshold, received, missed ticks)
+        buffer = self.memory.buf
+        count = min(len(rows), self.capacity)
+        for index in range(count):
+            offset = TABLE_HEADER.size + index * TABLE_SLOT.size
+            sequence = self.sequences[index] + 1
+            serial, *values = rows[index]
+            TABLE_SLOT.pack_into(buffer, offset, sequence, serial.encode()[:SERIAL_SIZE], *values)
+            self.sequences[index] = sequence + 1
+            TABLE_SEQUENCE.pack_into(buffer, offset, sequence + 1)
+        TABLE_HEADER.pack_into(buffer, 0, TABLE_MAGIC, TABLE_VERSION, TABLE_SLOT.size, self.capacity, count,
+                               time.monotonic_ns())
+
+    def read(self) -> Dict[str, DeviceState]:
+        buffer = self.memory.buf
+        count = min(TABLE_HEADER.unpack_from(buffer, 0)[4], self.capacity)
+        result = {}
+        for index in range(count):
+            offset = TABLE_HEADER.size + index * TABLE_SLOT.size
+            for attempt in range(4):
+                sequence, serial, *values = TABLE_SLOT.unpack_from(buffer, offset)
+                if sequence % 2 == 0 and TABLE_SEQUENCE.unpack_from(buffer, offset)[0] == sequence:
+                    result[serial.rstrip(b"\0").decode(errors="replace")] = DeviceState(*values)
+                    break
+        return result
+
+    def age_s(self):
+        # Seconds since the engine last refreshed the table
+        heartbeat = TABLE_HEADER.unpack_from(self.memory.buf, 0)[5]
+        return (time.monotonic_ns() - heartbeat) / 1e9 if heartbeat else None
+
+    def close(self):
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+
+# Hands config changes from the GUI over to the engine, like ConfigWriter does for saving.
+# The GUI only marks the config dirty. Changes within the debounce window (a dragged slider) are coalesced
+# and serialized on this thread, and only a config that differs from the last one sent goes to the engine.
+# The window is kept short, the engine applies settings live.
+class ConfigSender(threading.Thread):
+    DEBOUNCE_S = 0.05
+
+    def __init__(self, config: AppConfig, send_function, sent_config):
+        super().__init__(name="ConfigSender", daemon=True)
+        self.config = config
+        self.send_function = send_function
+        self.sent_config = sent_config
+        self.condition = threading.Condition()
+        # Keeps a flush from the GUI thread (before a save or shutdown) from racing this thread's
+        self.flush_lock = threading.Lock()
+        self.dirty_since = None
+        self.running = False
+
+        self.requests = 0
+        self.sends = 0
+        self.skipped = 0
+
+    def mark_dirty(self):
+        with self.condition:
+            self.requests += 1
+            if self.dirty_since is None:
+                self.dirty_since = time.time()
+                self.condition.notify()
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.is_alive():
+            self.join()
+
+    # With only_pending, nothing is serialized unless a change is waiting for the debounce.
+    # Either way a send already in progress on this thread has completed when it returns.
+    def flush(self, only_pending=False):
+        with self.flush_lock:
+            with self.condition:
+                if only_pending and self.dirty_since is None:
+                    return
+                self.dirty_since = None
+            serialized = self.config.serialize()
+            if serialized == self.sent_config:
+                self.skipped += 1
+                return
+            if self.send_function("apply_config", serialized):
+                self.sent_config = serialized
+                self.sends += 1
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.dirty_since is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                remaining = self.dirty_since + self.DEBOUNCE_S - time.time()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+            self.flush()
+
+    def stats(self):
+        return {"requests": self.requests, "sends": self.sends, "skipped": self.skipped}
+
+
+# GUI side of the engine. Offers the interface of HapticBridge that main.py uses,
+# and forwards every call to the engine process.
+class EngineClient:
+    # Replies to calls are waited for this long, the first ones wait for the engine to start up
+    CALL_TIMEOUT_S = 10.0
+    SHUTDOWN_TIMEOUT_S = 10.0
+
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.status_update = lambda message, is_error=False: None
+        self.process = None
+        self.connection = None
+        self.table: EngineTable = None
+        # A bigger table the engine hasn't switched to yet, see "table_full"
+        self.next_table: EngineTable = None
+        self.table_lock = threading.Lock()
+        self.receiver = None
+        self.send_lock = threading.Lock()
+        self.reply_condition = threading.Condition()
+        self.replies = {}
+        self.request_ids = itertools.count()
+        self.connected = False
+        self.stopping = False
+        self.device_listeners = []
+        self.config_sender: ConfigSender = None
+
+    def start(self, status_update=None):
+        if status_update is not None:
+            self.status_update = status_update
+        self.table = EngineTable(capacity=table_capacity(len(self.config.tracker_config_dict)))
+        # Spawn on every platform: forking a process that already runs threads isn't safe
+        context = multiprocessing.get_context("spawn")
+        self.connection, engine_connection = context.Pipe()
+        config_json = self.config.serialize()
+        self.process = context.Process(target=run_engine, name="HapticEngine",
+                                       args=(engine_connection, config_json, self.table.name))
+        self.process.start()
+        engine_connection.close()
+        self.connected = True
+        self.receiver = threading.Thread(target=self.__receive, name="EngineReceiver", daemon=True)
+        self.receiver.start()
+        self.config_sender = ConfigSender(self.config, self.send, config_json)
+        self.config_sender.start()
+        print(f"[Engine] Haptic engine started in process {self.process.pid}")
+
+    def __receive(self):
+        while True:
+            try:
+                message = self.connection.recv()
+            except (EOFError, OSError):
+                break
+            kind = message[0]
+            if kind == "reply":
+                with self.reply_condition:
+                    self.replies[message[1]] = message[2]
+                    self.reply_condition.notify_all()
+            elif kind == "status":
+                self.status_update(message[1], message[2])
+            elif kind == "devices":
+                added = [VRTracker(*device) for device in message[1]]
+                removed = [VRTracker(*device) for device in message[2]]
+                for listener in self.device_listeners:
+                    listener(added, removed)
+            elif kind == "table_full":
+                self.grow_table(message[1])
+            elif kind == "table_attached":
+                self.table_attached(message[1])
+
+        with self.reply_condition:
+            self.connected = False
+            self.reply_condition.notify_all()
+        if not self.stopping:
+            print("[Engine][ERROR] Lost the connection to the haptic engine")
+            self.status_update("Haptic engine stopped", True)
+
+    def send(self, command, *args, request_id=None):
+        with self.send_lock:
+            if not self.connected:
+                return False
+            try:
+                self.connection.send((request_id, command, args))
+                return True
+            except OSError as e:
+                print(f"[Engine][ERROR] Can't send {command}: {e}")
+                return False
+
+    def call(self, command, *args, timeout=CALL_TIMEOUT_S):
+        request_id = next(self.request_ids)
+        if not self.send(command, *args, request_id=request_id):
+            return None
+        deadline = time.monotonic() + timeout
+        with self.reply_condition:
+            while request_id not in self.replies:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self.connected:
+                    print(f"[Engine][ERROR] No answer to {command}")
+                    return None
+                self.reply_condition.wait(remaining)
+            return self.replies.pop(request_id)
+
+    def pulse_test(self, serial, pulse_length=500):
+        self.send_pending_config()
+        self.send("pulse_test", serial, pulse_length)
+
+    def restart_server(self):
+        # Apply comes right after the new address was typed, the engine must restart with it
+        self.send_pending_config()
+        self.send("restart_server")
+
+    def query_trackers(self):
+        devices = self.call("query_trackers") or []
+        return [VRTracker(*device) for device in devices]
+
+    def add_device_listener(self, listener):
+        self.device_listeners.append(listener)
+
+    def add_external_target(self, external_type):
+        self.send_pending_config()
+        result = self.call("add_external_target", external_type)
+        return tuple(result) if result is not None else None
+
+    def render_external_text(self, serial):
+        return self.call("render_external_text", serial)
+
+    def render_external_sound(self, serial, path):
+        self.call("render_external_sound", serial, path)
+
+    def config_changed(self):
+        # The engine owns the config file, it gets every change (see ConfigSender) and saves it
+        if self.config_sender is not None:
+            self.config_sender.mark_dirty()
+
+    def send_pending_config(self):
+        # Commands that depend on the config go out after the changes still waiting for the debounce
+        if self.config_sender is not None:
+            self.config_sender.flush(only_pending=True)
+
+    def flush_config(self):
+        # Last send before saving or stopping, the sender thread isn't needed after that
+        if self.config_sender is not None:
+            self.config_sender.stop()
+            self.config_sender.flush()
+            self.config_sender = None
+
+    def grow_table(self, capacity):
+        with self.table_lock:
+            if self.table is None or self.next_table is not None or capacity <= self.table.capacity:
+                return
+            self.next_table = EngineTable(capacity=capacity)
+        print(f"[Engine] Growing the device table to {capacity} rows")
+        self.send("attach_table", self.next_table.name)
+
+    def table_attached(self, name):
+        # The engine writes to the new table only, the old one can go
+        with self.table_lock:
+            if self.next_table is None or self.next_table.name != name:
+                return
+            old_table, self.table, self.next_table = self.table, self.next_table, None
+        old_table.close()
+
+    def device_states(self) -> Dict[str, DeviceState]:
+        with self.table_lock:
+            return self.table.read() if self.table is not None else {}
+
+    def stats(self):
+        result = self.call("stats")
+        if result is not None and self.config_sender is not None:
+            result["config_sender"] = self.config_sender.stats()
+        return result
+
+    def save_config(self):
+        self.flush_config()
+        self.call("save_config")
+
+    def detach(self):
+        # Leaves the engine running on its own (it goes headless once the connection is gone)
+        if self.process is None:
+            return
+        self.flush_config()
+        self.stopping = True
+        with self.send_lock:
+            self.connected = False
+            self.connection.close()
+        with self.table_lock:
+            # The engine keeps writing to it, it must outlive this process
+            if self.table is not None:
+                self.table.memory.close()
+                self.table = None
+            if self.next_table is not None:
+                self.next_table.close()
+                self.next_table = None
+
+    def shutdown(self):
+        if self.process is None:
+            return
+        self.flush_config()
+        self.stopping = True
+        self.call("shutdown")
+        self.process.join(self.SHUTDOWN_TIMEOUT_S)
+        if self.process.is_alive():
+            print("[Engine][ERROR] The haptic engine didn't stop in time, terminating it")
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+        with self.table_lock:
+            for table in (self.table, self.next_table):
+                if table is not None:
+                    table.close()
+            self.table = self.next_table = None
+        self.process = None
+
+
+def run_engine(connection, config_json, table_name):
+    # Entry point of the engine process
+    EngineWorker(connection, config_json, table_name).run()
+
+
+# Engine side: runs a HapticBridge and serves the commands of the EngineClient
+class EngineWorker:
+    TABLE_INTERVAL_S = 1 / 30
+
+    def __init__(self, connection, config_json, table_name):
+        # Imported here, so only the engine process loads the servers, OpenVR and the targets
+        from app_bridge import HapticBridge
+
+        self.connection = connection
+        self.send_lock = threading.Lock()
+        self.config = AppConfig(**json.loads(config_json))
+        self.config.check_integrity()
+        # The GUI process loaded (or saved) this content, an unchanged config isn't written again
+        self.config._saved_json = config_json
+        self.bridge = HapticBridge(self.config)
+        self.table = EngineTable(table_name)
+        # Swapped by attach_table while the publisher writes
+        self.table_lock = threading.Lock()
+        # Capacity asked of the GUI and not attached yet
+        self.requested_capacity = 0
+        self.running = True
+        self.publisher = threading.Thread(target=self.publish, name="EngineTable", daemon=True)
+        self.commands = {
+            "pulse_test": self.bridge.pulse_test,
+            "restart_server": self.bridge.restart_server,
+            "query_trackers": self.query_trackers,
+            "add_external_target": self.bridge.add_external_target,
+            "render_external_text": self.bridge.render_external_text,
+            "render_external_sound": self.bridge.render_external_sound,
+            "apply_config": self.apply_config,
+            "attach_table": self.attach_table,
+            "stats": self.bridge.stats,
+            "save_config": self.bridge.save_config,
+            "shutdown": self.stop,
+        }
+
+    def run(self):
+        print("[Engine] Haptic engine process running")
+        try:
+            self.bridge.start(self.status_update)
+            self.bridge.add_device_listener(self.devices_changed)
+            self.publisher.start()
+            self.serve()
+        finally:
+            self.running = False
+            print("[Engine] Halting...")
+            self.bridge.shutdown()
+            if self.publisher.is_alive():
+                self.publisher.join()
+            self.table.close()
+
+    def serve(self):
+        while self.running:
+            try:
+                request_id, command, args = self.connection.recv()
+            except (EOFError, OSError):
+                self.serve_headless()
+                return
+            try:
+                result = self.commands[command](*args)
+            except Exception as e:
+                print(f"[Engine][ERROR] {command} failed: {e}\n{traceback.format_exc()}")
+                result = None
+            if request_id is not None:
+                self.post("reply", request_id, result)
+
+    def serve_headless(self):
+        from daemon import CONTROL_HOST, ControlServer
+
+        print("[Engine] Lost the GUI, continuing without it")
+        try:
+            control_server = ControlServer(self.config.control_port, self.bridge)
+        except OSError as e:
+            print(f"[Engine][ERROR] Can't open the control API on port {self.config.control_port}: {e}")
+            self.bridge.save_config()
+            return
+        self.bridge.status_update = control_server.status_update
+        signal.signal(signal.SIGTERM, lambda signum, frame: control_server.stop())
+        print(f"[Engine] Control API listening on http://{CONTROL_HOST}:{control_server.server_port}")
+        try:
+            control_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        control_server.server_close()
+        self.bridge.save_config()
+
+    def post(self, *message):
+        with self.send_lock:
+            try:
+                self.connection.send(message)
+            except OSError:
+                # The GUI is gone, serve() notices it too
+                pass
+
+    def status_update(self, message, is_error=False):
+        self.post("status", message, is_error)
+
+    def devices_changed(self, added, removed):
+        self.post("devices", [(device.index, device.model, device.serial) for device in added],
+                  [(device.index, device.model, device.serial) for device in removed])
+
+    def query_trackers(self):
+        return [(device.index, device.model, device.serial) for device in self.bridge.query_trackers()]
+
+    def apply_config(self, config_json):
+        self.config.apply_settings(AppConfig(**json.loads(config_json)))
+        self.bridge.config_changed()
+
+    def stop(self):
+        self.bridge.save_config()
+        self.running = False
+
+    def attach_table(self, name):
+        table = EngineTable(name)
+        with self.table_lock:
+            old_table, self.table = self.table, table
+            self.requested_capacity = 0
+        # The GUI process owns the table and removes it
+        old_table.memory.close()
+        self.post("table_attached", name)
+
+    def publish(self):
+        # Refreshes the table on its own thread, at a fraction of the tick rate
+        while self.running:
+            rows = self.bridge.channel_states()
+            with self.table_lock:
+                if len(rows) > self.table.capacity and not self.requested_capacity:
+                    # Until the bigger table is attached, the rows past the capacity aren't shown
+                    self.requested_capacity = table_capacity(len(rows))
+                    print(f"[Engine] {len(rows)} devices don't fit the device table of {self.table.capacity}, "
+                          f"asking for {self.requested_capacity}")
+                    self.post("table_full", self.requested_capacity)
+                self.table.publish(rows)
+            time.sleep(self.TABLE_INTERVAL_S)
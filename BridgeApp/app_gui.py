@@ -1,12 +1,15 @@
 import FreeSimpleGUI as sg
+import collections
+import time
 import webbrowser
 
 from app_config import AppConfig, PatternConfig
+from app_gui_updates import GUI_FPS, GUIUpdateQueue, LiveMeters
 from app_pattern import VibrationPattern
 
 WINDOW_NAME = "Haptic Pancake Bridge v0.7.0a"
 
-LIST_SERVER_TYPE = ["OSC (VRChat)", "WebSocket (Resonite)"]
+LIST_SERVER_TYPE = ["OSC (VRChat)", "WebSocket (Resonite)", "OSC async (VRChat)", "Replay (recorded log)"]
 
 KEY_SERVER_TYPE = '-SERVER-TYPE-'
 KEY_REC_IP = '-REC-IP-'
@@ -22,6 +25,15 @@ KEY_BTN_TEST = '-BTN-TEST-'
 KEY_BTN_CALIBRATE = '-BTN-CALIBRATE-'
 KEY_BTN_ADD_EXTERNAL = '-BTN-ADD-EXTERNAL-'
 KEY_BATTERY_THRESHOLD = '-BATTERY-'
+KEY_BTN_OUTPUT = '-BTN-OUTPUT-'
+KEY_EXTERNAL_PATH = '-EXTERNAL-PATH-'
+KEY_EXTERNAL_PORT = '-EXTERNAL-PORT-'
+KEY_EXTERNAL_BAUD = '-EXTERNAL-BAUD-'
+KEY_EXTERNAL_HOST = '-EXTERNAL-HOST-'
+KEY_METER = '-METER-'
+KEY_METER_TEXT = '-METER-TEXT-'
+
+LIST_BAUD_RATES = [9600, 19200, 38400, 57600, 115200, 230400, 460800, 921600]
 
 # Pattern Config
 KEY_PROXIMITY = '-PROXY-'
@@ -35,18 +47,30 @@ KEY_VIB_SPEED = '-VIB-SPD-'
 
 class GUIRenderer:
     def __init__(self, app_config: AppConfig, tracker_test_event,
-                 restart_osc_event, refresh_trackers_event, add_external_event):
+                 restart_osc_event, refresh_trackers_event, add_external_event, save_config_event,
+                 external_output_event, device_states_event=None):
         sg.theme('DarkAmber')
         self.tracker_test_event = tracker_test_event
         self.restart_osc_event = restart_osc_event
         self.refresh_trackers_event = refresh_trackers_event
         self.add_external_event = add_external_event
+        self.save_config_event = save_config_event
+        self.external_output_event = external_output_event
+        # Returns {serial: DeviceState} for the live meters, see HapticBridge.device_states
+        self.device_states_event = device_states_event
 
         self.config = app_config
         self.shutting_down = False
         self.window = None
         self.layout_dirty = False
         self.trackers = []
+        self.hidden_trackers = set()
+        # (added, removed) tracker lists posted by other threads, applied on the GUI thread
+        self.device_changes = collections.deque()
+        # Status bar updates from the server threads, also applied on the GUI thread
+        self.updates = GUIUpdateQueue()
+        self.meters = LiveMeters()
+        self.next_frame = 0.0
         self.osc_status_bar = sg.Text('', key=KEY_OSC_STATUS_BAR)
         self.tracker_frame = sg.Column([], key=KEY_LAYOUT_TRACKERS, scrollable=True, vertical_scroll_only=True, expand_y=True, size=(406,270))
         self.layout = []
@@ -127,6 +151,11 @@ class GUIRenderer:
                           tooltip="OSC Address or Resonite Address"),
              sg.Button("Identify", k=(KEY_BTN_TEST, tracker_serial),
                        tooltip="Send a 500ms pulse to the tracker")],
+            [sg.Text(" "), sg.Text("Output:", size=7),
+             sg.ProgressBar(100, orientation='h', size=(22, 10), key=(KEY_METER, tracker_serial),
+                            tooltip="Share of the time the device is vibrating"),
+             sg.Text("In:", pad=0), sg.Text("  0%", key=(KEY_METER_TEXT, tracker_serial), size=4,
+                                            tooltip="Strength received for this device")],
             additional_layout]
 
         row = [sg.pin(sg.Col(layout, key=('-ROW-', tracker_serial)))]
@@ -162,29 +191,46 @@ class GUIRenderer:
         if device_serial.startswith("EMUSND"):
             layout.append(sg.Text(" "))
             layout.append(sg.Text("Sound:", size=6))
-            layout.append(sg.InputText("Default", size=35))
-            layout.append(sg.FileBrowse("Browse", key=(KEY_BTN_TEST, device_serial)))
+            layout.append(sg.InputText(f"{device_serial}.wav", key=(KEY_EXTERNAL_PATH, device_serial), size=26))
+            layout.append(sg.FileSaveAs("Browse", target=(KEY_EXTERNAL_PATH, device_serial),
+                                        file_types=(("WAV", "*.wav"),)))
+            layout.append(sg.Button("Render", key=(KEY_BTN_OUTPUT, device_serial),
+                                    tooltip="Render the recorded pulses as a sound file"))
             icon = "🔊"
         if device_serial.startswith("EMUTXT"):
             layout.append(sg.Text(" "))
-            layout.append(sg.Button("Open Output Window"))
+            layout.append(sg.Button("Open Output Window", key=(KEY_BTN_OUTPUT, device_serial)))
             icon = "📝"
         if device_serial.startswith("SERIALCOM"):
+            dev_config = self.config.get_tracker_config(device_serial)
             layout.append(sg.Text(" "))
             layout.append(sg.Text("COM Port:", size=8))
-            layout.append(sg.InputText("COM6", size=33))
-            layout.append(sg.FileBrowse("Browse", key=(KEY_BTN_TEST, device_serial)))
+            layout.append(sg.InputText(dev_config.target_port, key=(KEY_EXTERNAL_PORT, device_serial),
+                                       enable_events=True, size=14, tooltip="e.g. COM6 or /dev/ttyUSB0"))
+            layout.append(sg.FileBrowse("Browse", target=(KEY_EXTERNAL_PORT, device_serial)))
+            layout.append(sg.Text("Baud:"))
+            layout.append(sg.Combo(LIST_BAUD_RATES, dev_config.target_baud_rate, key=(KEY_EXTERNAL_BAUD, device_serial),
+                                   enable_events=True, size=8))
             icon = "〰"
         if device_serial.startswith("NETWORK"):
             layout.append(sg.Text(" "))
             layout.append(sg.Text("Server IP:", size=8))
-            layout.append(sg.InputText("192.168.1.67", size=33))
+            layout.append(sg.InputText(self.config.get_tracker_config(device_serial).target_host,
+                                       key=(KEY_EXTERNAL_HOST, device_serial), enable_events=True, size=33,
+                                       tooltip="IP address of the node, e.g. 192.168.1.67 or 192.168.1.67:7777.\n"
+                                               "Add #N to start at channel N when several rows share a node."))
             icon = "📡"
 
         row = [self.device_row(device_serial, device_model, layout, icon=icon)]
         self.add_target(device_serial, device_model, row)
 
     def add_target(self, tracker_serial, tracker_model, layout):
+        if tracker_serial in self.hidden_trackers:
+            print(f"[GUI] Tracker {tracker_serial} is back. Showing it again...")
+            self.hidden_trackers.discard(tracker_serial)
+            self.window[('-ROW-', tracker_serial)].update(visible=True)
+            self.refresh()
+            return
         if tracker_serial in self.trackers:
             print(f"[GUI] Tracker {tracker_serial} is already on the list. Skipping...")
             return
@@ -198,6 +244,27 @@ class GUIRenderer:
 
         self.trackers.append(tracker_serial)
 
+    def remove_target(self, tracker_serial):
+        # Rows can't be taken out of a layout, so vanished trackers are only hidden
+        if tracker_serial not in self.trackers or tracker_serial in self.hidden_trackers:
+            return
+        print(f"[GUI] Hiding tracker: {tracker_serial}")
+        self.hidden_trackers.add(tracker_serial)
+        self.window[('-ROW-', tracker_serial)].update(visible=False)
+        self.refresh()
+
+    def devices_changed(self, added, removed):
+        # Safe to call from any thread. Applied with the next frame, or when the window opens.
+        self.device_changes.append((added, removed))
+
+    def apply_device_changes(self):
+        while self.device_changes:
+            added, removed = self.device_changes.popleft()
+            for device in removed:
+                self.remove_target(device.serial)
+            for device in added:
+                self.add_tracker(device.serial, device.model)
+
     def add_message(self, message):
         self.layout.append([sg.HSep()])
         self.layout.append([sg.Text(message, text_color='red')])
@@ -207,34 +274,58 @@ class GUIRenderer:
                                     'Serial (COM port)::SERIALCOM', 'Network (Server)::NETWORK']]
         self.layout.append([self.small_vertical_space()])
         self.layout.append([sg.Button("Refresh Tracker List", size=18, key=KEY_BTN_REFRESH),
-                            sg.ButtonMenu("Add External device", external_devices, key=KEY_BTN_ADD_EXTERNAL, disabled=True,
+                            sg.ButtonMenu("Add External device", external_devices, key=KEY_BTN_ADD_EXTERNAL,
                                           tooltip="Add an external feedback device"), ])
         self.layout.append([sg.HSep()])
         self.layout.append(
             [sg.Text("Made by Zelus (Z4urce)", enable_events=True, font='Default 8 underline', key=KEY_OPEN_URL), sg.Sizegrip()])
 
     def update_osc_status_bar(self, message, is_error=False):
-        text_color = 'red' if is_error else 'green'
-        if self.window is None:
-            self.osc_status_bar.DisplayText = message
-            self.osc_status_bar.TextColor = text_color
+        # Called from the server threads, only the latest message is shown with the next frame
+        self.updates.post(KEY_OSC_STATUS_BAR, (message, 'red' if is_error else 'green'))
+
+    def update_frame(self):
+        # Applies what other threads posted and refreshes the meters, at most GUI_FPS times a second
+        now = time.perf_counter()
+        if now < self.next_frame or self.shutting_down:
             return
-        if not self.shutting_down:
+        self.next_frame = now + 1 / GUI_FPS
+        self.apply_device_changes()
+
+        status = self.updates.drain().get(KEY_OSC_STATUS_BAR)
+        if status is not None:
             try:
-                self.osc_status_bar.update(message, text_color=text_color)
+                self.osc_status_bar.update(status[0], text_color=status[1])
             except Exception as e:
                 print("[GUI] Failed to update server status bar.")
 
+        if self.device_states_event is None:
+            return
+        for serial, (output, strength) in self.meters.sample(self.device_states_event()).items():
+            # Devices without a row, or hidden, aren't shown
+            if serial not in self.trackers or serial in self.hidden_trackers:
+                continue
+            self.window[(KEY_METER, serial)].update(current_count=output)
+            self.window[(KEY_METER_TEXT, serial)].update(f"{strength:3d}%")
+
+    @staticmethod
+    def show_output(title, text):
+        sg.popup_scrolled(text, title=title, font='Courier 10', size=(82, 4), non_blocking=True)
+
     def refresh(self):
         self.tracker_frame.contents_changed()
         self.tracker_frame.set_vscroll_position(1)
         self.window.refresh()
         self.layout_dirty = True
 
+    def open_window(self):
+        self.window = sg.Window(WINDOW_NAME, self.layout, keep_on_top=False, finalize=True, alpha_channel=0.9, icon=b'iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAYAAAAf8/9hAAABhWlDQ1BJQ0MgcHJvZmlsZQAAKJF9kT1Iw0AcxV9TpVIrDhYVcchQnezgB+JYqlgEC6Wt0KqDyaVf0KQhSXFxFFwLDn4sVh1cnHV1cBUEwQ8QZwcnRRcp8X9NoUWMB8f9eHfvcfcOEOplpppdEUDVLCMZi4qZ7Kroe0UvBjEEPyYlZurx1GIaruPrHh6+3oV5lvu5P0efkjMZ4BGJI0w3LOIN4tlNS+e8TxxkRUkhPieeMOiCxI9clx1+41xossAzg0Y6OU8cJBYLHSx3MCsaKvEMcUhRNcoXMg4rnLc4q+Uqa92TvzCQ01ZSXKc5ihiWEEcCImRUUUIZFsK0aqSYSNJ+1MU/0vQnyCWTqwRGjgVUoEJq+sH/4He3Zn56ykkKRIHuF9v+GAN8u0CjZtvfx7bdOAG8z8CV1vZX6sDcJ+m1thY6Avq3gYvrtibvAZc7wPCTLhlSU/LSFPJ54P2MvikLDNwC/jWnt9Y+Th+ANHW1fAMcHALjBcped3l3T2dv/55p9fcD3S9y0apk9h0AAAAGYktHRAD/AP8A/6C9p5MAAAAJcEhZcwAACxMAAAsTAQCanBgAAAAHdElNRQfoCxYXCzDoJVaPAAACuElEQVQ4y2WTTW8bdRDGfzO767f1xnGcJiSNVNoKqMoJgRBCwifuIHFFuSDRTwDi2CNfgC/gGxfElV6ockEISAJBiAJ5KVnqxk7idbx+ie39DwcngaqH0Wj0HJ756ZmRjz7940Ym0nCe1DMVnArZRbn/d+85bcMJ6744GqrUzYFimIAamMF5P8GCAC1GqAMDlFk3qItKQ9WsrmaoGd32LjYeMeg0edj4mOP9Hzj4/ku2v77PJO3MtPZj1GYmYlb31c1ch2ct5uZW6XZikpN9Rr02v377BenRNsuvvkfa2sUP5wlKFbJhDy1FmAm+GpiD6XkfRFGDfD7infc/p9XcobTwGbmoRpq2sKBI8VqNXjemUCijAr6YXa2kCL74RHOrEORYufkW5vk4haJlOAQFyDLUAAeqzhBn5IOQwMsxGfUo5MqMBwm++IjLmPQTovk1PFFGyVPCygpqhphdIBiUS4t0zg5ZWrqL84RcWL2KraTgVPEWb5KmLQIvT+bsWYThIKF1+BO9XpPDg+9YufU2raPfqCy/zOnJHvlyFcmVyMhYq65h/yGAOGA64cmjBxzHW/Tbf5Ec/c5Z6xFh+RphtESvfUAn3mFh+Q5yEbuYoZc3oAbVxZc4T2KiuRcYnP7N3dc/JCzVZjpGLiiyv/kVl6bqDPnk3o51ksc0n25SrFwn85TxdIRXiBi7Mc5Tpm5CYX6F5uGP5Mo1BoMON974AK8YzRCycUpn9yHd5i9M0xO6/2xzGm9ynsSEpRrZ8Ixee4+9b+5TrqzSP96buV8ieA5eefMeMh7Re/IzleqLyGSEOkcn3iKJt+i3/qR2612GpzGlcBFPfdSBL8bG/MLtulMhfO06mQoWBLMIRXCesnZn+sxnLtkUTzww2/AxWw+8fMOJ1NUv4Lzn39lXIVOu5kAFJ7rhnK3/C07bcJ2GHOyzAAAAAElFTkSuQmCC')
+        self.window.set_resizable(False, True)
+        self.update_frame()
+
     def run(self):
         if self.window is None:
-            self.window = sg.Window(WINDOW_NAME, self.layout, keep_on_top=False, finalize=True, alpha_channel=0.9, icon=b'iVBORw0KGgoAAAANSUhEUgAAABAAAAAQCAYAAAAf8/9hAAABhWlDQ1BJQ0MgcHJvZmlsZQAAKJF9kT1Iw0AcxV9TpVIrDhYVcchQnezgB+JYqlgEC6Wt0KqDyaVf0KQhSXFxFFwLDn4sVh1cnHV1cBUEwQ8QZwcnRRcp8X9NoUWMB8f9eHfvcfcOEOplpppdEUDVLCMZi4qZ7Kroe0UvBjEEPyYlZurx1GIaruPrHh6+3oV5lvu5P0efkjMZ4BGJI0w3LOIN4tlNS+e8TxxkRUkhPieeMOiCxI9clx1+41xossAzg0Y6OU8cJBYLHSx3MCsaKvEMcUhRNcoXMg4rnLc4q+Uqa92TvzCQ01ZSXKc5ihiWEEcCImRUUUIZFsK0aqSYSNJ+1MU/0vQnyCWTqwRGjgVUoEJq+sH/4He3Zn56ykkKRIHuF9v+GAN8u0CjZtvfx7bdOAG8z8CV1vZX6sDcJ+m1thY6Avq3gYvrtibvAZc7wPCTLhlSU/LSFPJ54P2MvikLDNwC/jWnt9Y+Th+ANHW1fAMcHALjBcped3l3T2dv/55p9fcD3S9y0apk9h0AAAAGYktHRAD/AP8A/6C9p5MAAAAJcEhZcwAACxMAAAsTAQCanBgAAAAHdElNRQfoCxYXCzDoJVaPAAACuElEQVQ4y2WTTW8bdRDGfzO767f1xnGcJiSNVNoKqMoJgRBCwifuIHFFuSDRTwDi2CNfgC/gGxfElV6ockEISAJBiAJ5KVnqxk7idbx+ie39DwcngaqH0Wj0HJ756ZmRjz7940Ym0nCe1DMVnArZRbn/d+85bcMJ6744GqrUzYFimIAamMF5P8GCAC1GqAMDlFk3qItKQ9WsrmaoGd32LjYeMeg0edj4mOP9Hzj4/ku2v77PJO3MtPZj1GYmYlb31c1ch2ct5uZW6XZikpN9Rr02v377BenRNsuvvkfa2sUP5wlKFbJhDy1FmAm+GpiD6XkfRFGDfD7infc/p9XcobTwGbmoRpq2sKBI8VqNXjemUCijAr6YXa2kCL74RHOrEORYufkW5vk4haJlOAQFyDLUAAeqzhBn5IOQwMsxGfUo5MqMBwm++IjLmPQTovk1PFFGyVPCygpqhphdIBiUS4t0zg5ZWrqL84RcWL2KraTgVPEWb5KmLQIvT+bsWYThIKF1+BO9XpPDg+9YufU2raPfqCy/zOnJHvlyFcmVyMhYq65h/yGAOGA64cmjBxzHW/Tbf5Ec/c5Z6xFh+RphtESvfUAn3mFh+Q5yEbuYoZc3oAbVxZc4T2KiuRcYnP7N3dc/JCzVZjpGLiiyv/kVl6bqDPnk3o51ksc0n25SrFwn85TxdIRXiBi7Mc5Tpm5CYX6F5uGP5Mo1BoMON974AK8YzRCycUpn9yHd5i9M0xO6/2xzGm9ynsSEpRrZ8Ixee4+9b+5TrqzSP96buV8ieA5eefMeMh7Re/IzleqLyGSEOkcn3iKJt+i3/qR2612GpzGlcBFPfdSBL8bG/MLtulMhfO06mQoWBLMIRXCesnZn+sxnLtkUTzww2/AxWw+8fMOJ1NUv4Lzn39lXIVOu5kAFJ7rhnK3/C07bcJ2GHOyzAAAAAElFTkSuQmCC')
-            self.window.set_resizable(False, True)
+            self.open_window()
 
         # Update Layout if it's changed.
         if self.layout_dirty:
@@ -244,8 +335,11 @@ class GUIRenderer:
         # We make sure the layout update is called only when it's changed.
         self.layout_dirty = False
 
-        # This is the main GUI loop. The code will halt here until the next event.
-        event, values = self.window.read()
+        # This is the main GUI loop. It waits for the next event, but no longer than a frame.
+        event, values = self.window.read(timeout=1000 // GUI_FPS)
+        if event == sg.TIMEOUT_KEY:
+            self.update_frame()
+            return True
 
         # Update Values
         self.update_values(values)
@@ -254,9 +348,12 @@ class GUIRenderer:
         if event == sg.WIN_CLOSED or event == 'Exit':  # if user closes window or clicks cancel
             self.shutting_down = True
             print("[GUI] Closing application.")
+            print(f"[GUI] Updates: {self.updates.stats()}")
             return False
         if event[0] == KEY_BTN_TEST:
             self.tracker_test_event(event[1])
+        if event[0] == KEY_BTN_OUTPUT:
+            self.external_output_event(event[1], values.get((KEY_EXTERNAL_PATH, event[1])))
         if event == KEY_BTN_ADD_EXTERNAL:
             self.add_external_event(values[KEY_BTN_ADD_EXTERNAL])
         if event == KEY_BTN_APPLY:
@@ -266,6 +363,8 @@ class GUIRenderer:
         if event == KEY_OPEN_URL:
             webbrowser.open("https://hapticpancake.com/")
 
+        # Keeps the frames coming while events arrive faster than the timeout
+        self.update_frame()
         return True
 
     def update_values(self, values):
@@ -284,7 +383,7 @@ class GUIRenderer:
         # Update vibration intensity and pattern
         self.update_pattern_config(values, VibrationPattern.PROXIMITY, KEY_PROXIMITY)
         self.update_pattern_config(values, VibrationPattern.VELOCITY, KEY_VELOCITY)
-        self.config.save()
+        self.save_config_event()
 
     def update_tracker_config(self, values, tracker: str):
         # Update Tracker OSC Addresses
@@ -302,8 +401,23 @@ class GUIRenderer:
         if key in values:
             self.config.get_tracker_config(tracker).set_battery_threshold((values[key]))
 
+        # Update external target connection
+        key = (KEY_EXTERNAL_PORT, tracker)
+        if key in values:
+            self.config.get_tracker_config(tracker).set_target_port(values[key])
+        key = (KEY_EXTERNAL_BAUD, tracker)
+        if key in values:
+            self.config.get_tracker_config(tracker).set_target_baud_rate(values[key])
+        key = (KEY_EXTERNAL_HOST, tracker)
+        if key in values:
+            self.config.get_tracker_config(tracker).set_target_host(values[key])
+
     def update_pattern_config(self, values, index: int, key: str):
-        self.config.pattern_config_list[index].pattern = values[key + KEY_VIB_PATTERN]
-        self.config.pattern_config_list[index].str_min = int(values[key + KEY_VIB_STR_MIN])
-        self.config.pattern_config_list[index].str_max = int(values[key + KEY_VIB_STR_MAX])
-        self.config.pattern_config_list[index].speed = int(values[key + KEY_VIB_SPEED])
+        pattern_config = self.config.pattern_config_list[index]
+        settings = (values[key + KEY_VIB_PATTERN], int(values[key + KEY_VIB_STR_MIN]),
+                    int(values[key + KEY_VIB_STR_MAX]), int(values[key + KEY_VIB_SPEED]))
+        if settings == (pattern_config.pattern, pattern_config.str_min, pattern_config.str_max, pattern_config.speed):
+            return
+        pattern_config.pattern, pattern_config.str_min, pattern_config.str_max, pattern_config.speed = settings
+        # Recompile the patterns of every device
+        self.config.pattern_changed()
@@ -0,0 +1,68 @@
+import collections
+import threading
+from typing import Dict
+
+# The GUI refreshes at most this often (frames per second)
+GUI_FPS = 30
+
+
+# Hand-off from the server and engine threads to the GUI thread, which is the only one allowed to touch Tk.
+# Posting stores the update under a key, a newer update of the same key replaces the one not shown yet.
+# The GUI drains everything once per frame, so updates arriving faster than it refreshes are coalesced
+# and a busy input never backs up into the threads that post.
+class GUIUpdateQueue:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = {}
+
+        self.posted = 0
+        self.coalesced = 0
+        self.drains = 0
+
+    # Called from any thread
+    def post(self, key, value):
+        with self.lock:
+            self.posted += 1
+            if key in self.pending:
+                self.coalesced += 1
+            self.pending[key] = value
+
+    # Called from the GUI thread. Returns {key: latest value} of everything posted since the last drain.
+    def drain(self):
+        with self.lock:
+            if not self.pending:
+                return {}
+            pending, self.pending = self.pending, {}
+        self.drains += 1
+        return pending
+
+    def stats(self):
+        return {"posted": self.posted, "coalesced": self.coalesced, "drains": self.drains}
+
+
+# Live intensity meters of the devices shown in the GUI. Every frame the device states of the bridge
+# (strength received, peak share of a tick spent pulsing since the last read) go into a small ring buffer
+# per device. The peak comes from the engine side (see FeedbackDevice.state), so pulses that start and end
+# between two frames still show up. The meter shows the highest of the buffer, which holds them for a few frames.
+class LiveMeters:
+    # About a quarter of a second at GUI_FPS
+    SAMPLES = 8
+
+    def __init__(self):
+        self.rings: Dict[str, collections.deque] = {}
+        self.shown: Dict[str, tuple] = {}
+
+    # states is {serial: DeviceState}, see app_engine.
+    # Returns {serial: (output %, strength %)} of the meters whose shown value changed.
+    def sample(self, states):
+        changed = {}
+        for serial, state in states.items():
+            ring = self.rings.get(serial)
+            if ring is None:
+                ring = self.rings[serial] = collections.deque(maxlen=self.SAMPLES)
+            ring.append((state.output, state.strength))
+            value = (min(round(max(sample[0] for sample in ring) * 100), 100), round(ring[-1][1] * 100))
+            if self.shown.get(serial) != value:
+                self.shown[serial] = value
+                changed[serial] = value
+        return changed
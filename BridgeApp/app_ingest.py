@@ -0,0 +1,154 @@
+import threading
+import time
+from typing import Dict
+
+from app_config import AppConfig, SourceConfig
+from server_base import ServerBase
+
+MAIN_SOURCE = "main"
+
+
+# One bridge server plus its counters. Everything it receives is handed on tagged with the source name.
+class IngestSource:
+    def __init__(self, name, config, param_received, param_batch_received, status_update, address_filter=None):
+        # config is the AppConfig for the main source, a SourceConfig for the others.
+        # Both have the server_* and replay_* settings the servers read.
+        self.name = name
+        self.config = config
+        self.param_received_event = param_received
+        self.param_batch_event = param_batch_received
+        self.status_update_event = status_update
+        self.address_filter = address_filter
+        self.server: ServerBase = None
+
+        self.received = 0
+        self.batches = 0
+        self.errors = 0
+        self.status = ""
+        self.rate = 0.0
+        self.rate_count = 0
+        self.rate_time = time.perf_counter()
+
+    def start(self):
+        # Server modules are imported on first use, a run only loads the backends it's configured for
+        server_type = self.config.server_type
+        if server_type == 1:
+            from server_websocket import ResoniteWebSocketServer
+            self.server = ResoniteWebSocketServer(self.config, self.param_received, self.status_update,
+                                                  self.param_batch_received)
+        elif server_type == 2:
+            from server_osc_async import VRChatOSCAsyncReceiver
+            self.server = VRChatOSCAsyncReceiver(self.config, self.param_received, self.status_update,
+                                                 self.param_batch_received)
+        elif server_type == 3:
+            from server_replay import ParamReplayServer
+            self.server = ParamReplayServer(self.config, self.param_received, self.status_update,
+                                            self.param_batch_received)
+        else:
+            from server_osc import VRChatOSCReceiver
+            self.server = VRChatOSCReceiver(self.config, self.param_received, self.status_update)
+        self.server.address_filter = self.address_filter
+        try:
+            self.server.start_server()
+        except OSError as e:
+            # A source that can't start must not take the others down with it
+            self.server = None
+            self.status_update(f"[ERROR] Can't start source {self.name}: {e}", True)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server = None
+
+    def restart(self):
+        self.stop()
+        self.start()
+
+    def param_received(self, address, value, timestamp=None):
+        self.received += 1
+        self.param_received_event(self.name, address, value, timestamp)
+
+    def param_batch_received(self, params):
+        self.received += len(params)
+        self.batches += 1
+        self.param_batch_event(self.name, params)
+
+    def status_update(self, message, is_error=False):
+        self.status = message
+        if is_error:
+            self.errors += 1
+        self.status_update_event(self.name, message, is_error)
+
+    def stats(self):
+        now = time.perf_counter()
+        if now - self.rate_time >= 1.0:
+            self.rate = (self.received - self.rate_count) / (now - self.rate_time)
+            self.rate_count = self.received
+            self.rate_time = now
+        return {
+            "type": self.config.server_type,
+            "address": f"{self.config.server_ip}:{self.config.server_port}",
+            "running": self.server is not None and self.server.is_alive(),
+            "received": self.received,
+            "batches": self.batches,
+            "rate_per_s": round(self.rate, 1),
+            "errors": self.errors,
+            "status": self.status,
+        }
+
+
+# Runs the main bridge server (configured in the GUI) and any number of extra sources
+# (config.extra_sources) side by side, all feeding the same routing stage.
+# Events are tagged with the source name: param_received(source, address, value, timestamp),
+# param_batch_received(source, params) and status_update(source, message, is_error).
+class IngestManager:
+    def __init__(self, config: AppConfig, param_received, param_batch_received, status_update, address_filter=None):
+        self.config = config
+        self.param_received = param_received
+        self.param_batch_received = param_batch_received
+        self.status_update = status_update
+        # Shared by the OSC sources
+        self.address_filter = address_filter
+        self.lock = threading.Lock()
+        self.sources: Dict[str, IngestSource] = {}
+
+    def start(self):
+        with self.lock:
+            self.__start_source(MAIN_SOURCE, self.config)
+            for index, source_config in enumerate(self.config.extra_sources):
+                if source_config.enabled:
+                    self.__start_source(source_config.name or f"source-{index + 1}", source_config)
+
+    def __start_source(self, name, config):
+        if name in self.sources:
+            print(f"[Ingest][ERROR] Duplicate source name: {name}, skipping it")
+            return
+        source = IngestSource(name, config, self.param_received, self.param_batch_received, self.status_update,
+                              self.address_filter)
+        self.sources[name] = source
+        source.start()
+
+    def restart(self, name=MAIN_SOURCE):
+        # Only the named source goes down, the others keep receiving
+        with self.lock:
+            source = self.sources.get(name)
+            if source is None:
+                return False
+            print(f"[Ingest] Restarting source {name}")
+            source.restart()
+            return True
+
+    def add_source(self, source_config: SourceConfig):
+        with self.lock:
+            name = source_config.name or f"source-{len(self.sources)}"
+            self.__start_source(name, source_config)
+        return name
+
+    def stop(self):
+        with self.lock:
+            for source in self.sources.values():
+                source.stop()
+
+    def stats(self):
+        with self.lock:
+            return {name: source.stats() for name, source in self.sources.items()}
@@ -0,0 +1,68 @@
+import collections
+import itertools
+
+
+# Latest-value-wins hand-off between the receiver threads and the feedback loop of one device.
+# Receivers only append to a bounded deque, which is atomic in CPython, so posting needs no lock.
+# Taking the sequence number and appending are two steps though, so two receivers posting at once may
+# append out of order. The feedback loop drains everything posted since the previous tick and folds it
+# into a single sample: the strength with the highest sequence plus the accumulated delta.
+class StrengthMailbox:
+    CAPACITY = 256
+
+    def __init__(self):
+        self.slots = collections.deque(maxlen=self.CAPACITY)
+        self.sequence = itertools.count()
+        self.last_sequence = -1
+
+        self.received = 0
+        self.coalesced = 0
+        self.dropped = 0
+
+    # Called from any thread. timestamp is the perf_counter_ns() arrival time of the update, if known.
+    def post(self, value, timestamp=None):
+        self.slots.append((next(self.sequence), value, timestamp))
+
+    def pending(self):
+        return len(self.slots) > 0
+
+    # Called from the feedback loop only.
+    # Returns (strength, delta, earliest arrival timestamp) or None if nothing was posted.
+    def take(self, strength):
+        delta = 0.0
+        count = 0
+        earliest = None
+        while True:
+            try:
+                sequence, value, timestamp = self.slots.popleft()
+            except IndexError:
+                break
+
+            count += 1
+            if sequence > self.last_sequence:
+                # A gap means the deque overflowed and discarded the oldest updates
+                self.dropped += sequence - self.last_sequence - 1
+                self.last_sequence = sequence
+            else:
+                # Posted by a racing thread out of order, it was counted as dropped before.
+                # A newer value is already applied, this one is stale.
+                self.dropped -= 1
+                continue
+
+            delta += abs(value - strength)
+            strength = value
+            if timestamp is not None and (earliest is None or timestamp < earliest):
+                earliest = timestamp
+
+        if count == 0:
+            return None
+        self.received += count
+        self.coalesced += count - 1
+        return strength, delta, earliest
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+        }
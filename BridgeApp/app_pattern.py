@@ -1,6 +1,8 @@
 import math
 import time
 
+import numpy as np
+
 from app_config import AppConfig, PatternConfig
 
 
@@ -18,11 +20,73 @@ class VibrationPattern:
 
     def __init__(self, app_config: AppConfig):
         self.config = app_config
+        # The pattern settings are compiled into a single function, rebuilt whenever they change
+        self.evaluator = None
+        self.velocity_enabled = False
+        self.revision = app_config.pattern_revision()
+        self.compiled_revision = -1
 
     def apply_pattern(self, str_value, str_delta_value):
-        return self.__apply_pattern(str_value, str_delta_value)
-
-    def __apply_pattern(self, str_value, str_value_delta):
+        if self.compiled_revision != self.revision.value:
+            self.compile()
+        return self.evaluator(str_value, str_delta_value)
+
+    def compile(self):
+        self.compiled_revision = self.revision.value
+        proximity = self.__compile_channel(self.config.pattern_config_list[self.PROXIMITY], False)
+        velocity = self.__compile_channel(self.config.pattern_config_list[self.VELOCITY], True)
+        self.velocity_enabled = velocity is not None
+
+        # A disabled channel contributes a 0, as before
+        if proximity is None and velocity is None:
+            self.evaluator = lambda str_value, str_value_delta: 0
+        elif velocity is None:
+            self.evaluator = lambda str_value, str_value_delta: max(proximity(str_value), 0)
+        elif proximity is None:
+            self.evaluator = lambda str_value, str_value_delta: max(0, velocity(str_value_delta))
+        else:
+            self.evaluator = lambda str_value, str_value_delta: max(proximity(str_value), velocity(str_value_delta))
+
+    def uses_velocity(self):
+        # Whether the strength delta can still produce a vibration
+        if self.compiled_revision != self.revision.value:
+            self.compile()
+        return self.velocity_enabled
+
+    @classmethod
+    def __compile_channel(cls, settings: PatternConfig, is_velocity):
+        # Returns value -> mapped value for one pattern setting, or None if it's disabled.
+        # Every float operation matches apply_pattern_reference() exactly.
+        right_min = settings.str_min / 100
+        span = settings.str_max / 100 - right_min
+        speed = settings.speed
+        cos = math.cos
+        pi = math.pi
+        get_linear_value = cls.__get_linear_value
+
+        match cls.VIB_PATTERN_LIST.index(settings.pattern):
+            case 1:  # Constant
+                on_value = right_min + span
+                if is_velocity:
+                    return lambda value: on_value if value != 0 else 0
+                return lambda value: on_value if value > 0 else 0
+            case 2:  # Linear
+                return lambda value: right_min + value * span if value != 0 else 0
+            case 3:  # Sine
+                def sine(value):
+                    value = -(cos(pi * value) - 1) / 2.0
+                    return right_min + value * span if value != 0 else 0
+                return sine
+            case 4:  # Throb
+                def throb(value):
+                    value = get_linear_value(speed) * value
+                    return right_min + value * span if value != 0 else 0
+                return throb
+        return None
+
+    # The original, uncompiled evaluation.
+    # Kept as the reference the compiled one is checked against (Benchmarks/bench_pattern.py --verify).
+    def apply_pattern_reference(self, str_value, str_value_delta):
         proximity_settings = self.config.pattern_config_list[self.PROXIMITY]
         velocity_settings = self.config.pattern_config_list[self.VELOCITY]
         proximity_pattern_index = self.VIB_PATTERN_LIST.index(proximity_settings.pattern)
@@ -58,6 +122,38 @@ class VibrationPattern:
 
         return max(proximity_value, velocity_value)
 
+    # Evaluates the pattern for many devices at once.
+    # strengths and deltas are equally sized arrays, returns the patterned strengths as an array.
+    def apply_pattern_batch(self, strengths, deltas):
+        strengths = np.asarray(strengths, dtype=np.float64)
+        deltas = np.asarray(deltas, dtype=np.float64)
+        proximity_settings = self.config.pattern_config_list[self.PROXIMITY]
+        velocity_settings = self.config.pattern_config_list[self.VELOCITY]
+
+        proximity_values = self.__apply_pattern_array(proximity_settings, strengths, strengths > 0)
+        velocity_values = self.__apply_pattern_array(velocity_settings, deltas, deltas != 0)
+
+        return np.maximum(proximity_values, velocity_values)
+
+    def __apply_pattern_array(self, settings: PatternConfig, values, constant_mask):
+        match self.VIB_PATTERN_LIST.index(settings.pattern):
+            case 0:  # None
+                return np.zeros_like(values)
+            case 1:  # Constant
+                result = constant_mask.astype(np.float64)
+            case 2:  # Linear
+                result = values
+            case 3:  # Sine
+                result = -(np.cos(np.pi * values) - 1) / 2.0
+            case 4:  # Throb
+                result = self.__get_linear_value(settings.speed) * values
+            case _:
+                return np.zeros_like(values)
+
+        right_min = settings.str_min / 100
+        span = settings.str_max / 100 - right_min
+        return np.where(result == 0, 0.0, right_min + result * span)
+
     @staticmethod
     def __map(value, right_min, right_max):
         if value == 0:
@@ -0,0 +1,107 @@
+import threading
+import time
+import traceback
+
+from app_config import AppConfig
+
+
+# Write-behind saving of the AppConfig.
+# The GUI only marks the config dirty. Changes arriving within the debounce window are coalesced
+# into a single save, which is serialized and written on this thread instead of the UI thread.
+class ConfigWriter(threading.Thread):
+    DEBOUNCE_S = 0.5
+    # A failed save (file locked by an antivirus or sync tool, disk full) is tried again after this long
+    RETRY_S = 2.0
+    # The last save on exit can't wait for the thread, it's tried this many times, FINAL_RETRY_S apart
+    FINAL_ATTEMPTS = 5
+    FINAL_RETRY_S = 0.2
+
+    def __init__(self, config: AppConfig):
+        super().__init__(name="ConfigWriter", daemon=True)
+        self.config = config
+        self.condition = threading.Condition()
+        self.dirty_since = None
+        self.running = False
+
+        self.requests = 0
+        self.saves = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_latency_ms = 0.0
+        self.total_latency_ms = 0.0
+
+    def mark_dirty(self):
+        with self.condition:
+            self.requests += 1
+            if self.dirty_since is None:
+                self.dirty_since = time.time()
+                self.condition.notify()
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.is_alive():
+            self.join()
+        # Persist anything left over
+        for attempt in range(self.FINAL_ATTEMPTS):
+            if attempt:
+                time.sleep(self.FINAL_RETRY_S)
+            if self.flush():
+                return
+        print(f"[ConfigWriter][ERROR] Gave up saving the config after {self.FINAL_ATTEMPTS} attempts, "
+              f"the last changes are lost")
+
+    # Returns False if the save failed
+    def flush(self):
+        with self.condition:
+            self.dirty_since = None
+        start_time = time.perf_counter()
+        try:
+            saved = self.config.save()
+        except Exception as e:
+            self.errors += 1
+            print(f"[ConfigWriter][ERROR] Failed to save config: {e}\n"
+                  f"{traceback.format_exc()}")
+            # Still dirty, unless a newer change already is. The debounce then runs out after RETRY_S.
+            with self.condition:
+                if self.dirty_since is None:
+                    self.dirty_since = time.time() - self.DEBOUNCE_S + self.RETRY_S
+                    self.condition.notify()
+            return False
+
+        latency_ms = (time.perf_counter() - start_time) * 1000
+        if saved:
+            self.saves += 1
+            self.last_latency_ms = latency_ms
+            self.total_latency_ms += latency_ms
+        else:
+            self.skipped += 1
+        return True
+
+    def run(self):
+        while True:
+            with self.condition:
+                while self.running and self.dirty_since is None:
+                    self.condition.wait()
+                if not self.running:
+                    return
+                remaining = self.dirty_since + self.DEBOUNCE_S - time.time()
+                if remaining > 0:
+                    self.condition.wait(remaining)
+                    continue
+            self.flush()
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "saves": self.saves,
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "last_latency_ms": round(self.last_latency_ms, 3),
+            "avg_latency_ms": round(self.total_latency_ms / self.saves, 3) if self.saves else 0.0,
+        }
@@ -0,0 +1,144 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Dict, List
+
+# Parameter log: a fixed header followed by fixed size records, so the file can be memory-mapped and indexed.
+#   header: magic "HPRL" | version (u16) | record size (u16) | start time (wall clock, ns, i64)
+#   record: time since the start (ns, i64) | address id (u32) | value (f64)
+# Address ids index a sidecar dictionary (<log>.addr), one address per line in order of first appearance,
+# each a JSON string: WebSocket keys may contain line breaks. Version 1 logs stored the addresses as they are.
+# Both files are append-only, a log cut short by a crash stays readable up to its last complete record.
+LOG_MAGIC = b"HPRL"
+LOG_VERSION = 2
+LOG_HEADER = struct.Struct("<4sHHq")
+LOG_RECORD = struct.Struct("<qId")
+ADDRESS_SUFFIX = ".addr"
+
+
+# Records what the bridge server delivers, at the boundary between ServerBase and the router.
+# Called from the receiver threads, so appending is serialized by a lock. Writes are buffered.
+class ParamRecorder:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.address_ids: Dict[str, int] = {}
+        self.log_file = open(path, "wb")
+        self.address_file = open(path + ADDRESS_SUFFIX, "w", encoding="utf-8", newline="\n")
+        self.log_file.write(LOG_HEADER.pack(LOG_MAGIC, LOG_VERSION, LOG_RECORD.size, time.time_ns()))
+        self.start_ns = time.perf_counter_ns()
+        self.records = 0
+        print(f"[Recorder] Recording parameters to {os.path.abspath(path)}")
+
+    def record(self, address, value, timestamp=None):
+        if timestamp is None:
+            timestamp = time.perf_counter_ns()
+        with self.lock:
+            if self.log_file is None:
+                return
+            self.__write(address, value, timestamp)
+
+    def record_batch(self, params):
+        with self.lock:
+            if self.log_file is None:
+                return
+            for address, value, timestamp in params:
+                self.__write(address, value, timestamp if timestamp is not None else time.perf_counter_ns())
+
+    def __write(self, address, value, timestamp):
+        address_id = self.address_ids.get(address)
+        if address_id is None:
+            address_id = len(self.address_ids)
+            self.address_ids[address] = address_id
+            # The dictionary entry has to be on disk before any record refers to it
+            self.address_file.write(json.dumps(address, ensure_ascii=False) + "\n")
+            self.address_file.flush()
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            return
+        self.log_file.write(LOG_RECORD.pack(timestamp - self.start_ns, address_id, value))
+        self.records += 1
+
+    # Wrappers for the server events, so the bridge only pays for recording while it's on
+    def wrap(self, param_received_event):
+        def param_received(address, value, timestamp=None):
+            self.record(address, value, timestamp)
+            param_received_event(address, value, timestamp)
+        return param_received
+
+    def wrap_batch(self, param_batch_event):
+        def param_batch_received(params):
+            self.record_batch(params)
+            param_batch_event(params)
+        return param_batch_received
+
+    def close(self):
+        with self.lock:
+            if self.log_file is None:
+                return
+            self.log_file.close()
+            self.address_file.close()
+            self.log_file = None
+        print(f"[Recorder] Recorded {self.records} parameters to {self.path}")
+
+
+# Read access to a parameter log. The records are memory-mapped, not read into memory.
+class ParamLog:
+    def __init__(self, path):
+        self.path = path
+        self.log_file = open(path, "rb")
+        header = self.log_file.read(LOG_HEADER.size)
+        if len(header) != LOG_HEADER.size:
+            self.log_file.close()
+            raise ValueError(f"{path} is not a parameter log")
+        magic, version, record_size, self.start_time_ns = LOG_HEADER.unpack(header)
+        if magic != LOG_MAGIC or version not in (1, LOG_VERSION) or record_size != LOG_RECORD.size:
+            self.log_file.close()
+            raise ValueError(f"{path} is not a parameter log (or of an unsupported version)")
+
+        with open(path + ADDRESS_SUFFIX, "r", encoding="utf-8", newline="\n") as address_file:
+            # The last line is empty, or incomplete after a crash
+            lines = address_file.read().split("\n")[:-1]
+        self.addresses: List[str] = [json.loads(line) for line in lines] if version > 1 else lines
+
+        size = os.fstat(self.log_file.fileno()).st_size
+        # An incomplete last record (e.g. after a crash) is ignored
+        self.count = (size - LOG_HEADER.size) // LOG_RECORD.size
+        self.map = mmap.mmap(self.log_file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        # Returns (time since the start in ns, address, value)
+        if not 0 <= index < self.count:
+            raise IndexError(index)
+        offset, address_id, value = LOG_RECORD.unpack_from(self.map, LOG_HEADER.size + index * LOG_RECORD.size)
+        return offset, self.addresses[address_id], value
+
+    def __iter__(self):
+        if self.count == 0:
+            return
+        addresses = self.addresses
+        view = memoryview(self.map)[LOG_HEADER.size:LOG_HEADER.size + self.count * LOG_RECORD.size]
+        records = LOG_RECORD.iter_unpack(view)
+        try:
+            for offset, address_id, value in records:
+                yield offset, addresses[address_id], value
+        finally:
+            # The map can only be closed once nothing refers to its buffer anymore
+            del records
+            view.release()
+
+    def duration_ns(self):
+        return self[self.count - 1][0] if self.count else 0
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.log_file.close()
@@ -0,0 +1,294 @@
+import re
+import threading
+from typing import Dict, List, Set, Tuple
+
+from app_config import AppConfig
+
+# Characters that turn an address segment into an OSC style pattern
+PATTERN_CHARS = "*?[{"
+# A segment that matches the rest of the address (prefix routing)
+PREFIX_SEGMENT = "**"
+
+
+class RouteNode:
+    __slots__ = ("literal", "wildcard", "serials", "prefix_serials")
+
+    def __init__(self):
+        self.literal: Dict[str, RouteNode] = {}
+        self.wildcard: Dict[str, Tuple[re.Pattern, RouteNode]] = {}
+        self.serials: Set[str] = set()
+        self.prefix_serials: Set[str] = set()
+
+    def is_empty(self):
+        return not (self.literal or self.wildcard or self.serials or self.prefix_serials)
+
+
+# Maps incoming addresses to the serials of the targets listening to them.
+# Plain addresses live in a dict, patterns are compiled into a trie of address segments.
+# Every resolved address (hit or miss) is cached, so the hot path is a single dict lookup.
+class AddressRouter:
+    CACHE_LIMIT = 4096
+
+    def __init__(self, config: AppConfig):
+        self.config = config
+        self.lock = threading.Lock()
+        self.addresses: Dict[str, List[str]] = {}
+        self.exact: Dict[str, Set[str]] = {}
+        self.trie = RouteNode()
+        self.cache: Dict[str, Tuple[str, ...]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+        for serial, tracker_config in config.tracker_config_dict.items():
+            self.update_tracker(serial, tracker_config.address_list)
+        config.add_address_listener(self.update_tracker)
+
+    def route(self, address) -> Tuple[str, ...]:
+        result = self.cache.get(address)
+        if result is None:
+            result = self.__resolve(address)
+        if result:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return result
+
+    def matches(self, address):
+        # Like route(), without counting towards the hit ratio
+        result = self.cache.get(address)
+        if result is None:
+            result = self.__resolve(address)
+        return bool(result)
+
+    def update_tracker(self, serial, address_list):
+        with self.lock:
+            old_addresses = set(self.addresses.get(serial, []))
+            new_addresses = set(address for address in address_list if address)
+            if old_addresses == new_addresses:
+                return
+
+            for address in old_addresses - new_addresses:
+                self.__remove(serial, address)
+            for address in new_addresses - old_addresses:
+                self.__add(serial, address)
+
+            self.addresses[serial] = list(new_addresses)
+            self.cache = {}
+            self.rebuilds += 1
+
+    def remove_tracker(self, serial):
+        self.update_tracker(serial, [])
+        self.addresses.pop(serial, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "cached_addresses": len(self.cache),
+            "rebuilds": self.rebuilds,
+        }
+
+    def __resolve(self, address):
+        with self.lock:
+            serials = set(self.exact.get(address, ()))
+            segments = address.split('/')
+            self.__match(self.trie, segments, 0, serials)
+
+            result = tuple(serials)
+            if len(self.cache) >= self.CACHE_LIMIT:
+                self.cache = {}
+            self.cache[address] = result
+            return result
+
+    def __match(self, node: RouteNode, segments, depth, serials: Set[str]):
+        serials.update(node.prefix_serials)
+        if depth == len(segments):
+            serials.update(node.serials)
+            return
+
+        segment = segments[depth]
+        child = node.literal.get(segment)
+        if child is not None:
+            self.__match(child, segments, depth + 1, serials)
+        for regex, child in node.wildcard.values():
+            if regex.fullmatch(segment):
+                self.__match(child, segments, depth + 1, serials)
+
+    def __add(self, serial, address):
+        if not self.is_pattern(address):
+            self.exact.setdefault(address, set()).add(serial)
+            return
+
+        node = self.trie
+        segments = address.split('/')
+        for segment in segments:
+            if segment == PREFIX_SEGMENT:
+                node.prefix_serials.add(serial)
+                return
+            node = self.__child(node, segment)
+        node.serials.add(serial)
+
+    def __remove(self, serial, address):
+        if not self.is_pattern(address):
+            serials = self.exact.get(address)
+            if serials is not None:
+                serials.discard(serial)
+                if not serials:
+                    del self.exact[address]
+            return
+
+        path = [self.trie]
+        for segment in address.split('/'):
+            if segment == PREFIX_SEGMENT:
+                path[-1].prefix_serials.discard(serial)
+                break
+            child = path[-1].literal.get(segment) or path[-1].wildcard.get(segment, (None, None))[1]
+            if child is None:
+                return
+            path.append(child)
+        else:
+            path[-1].serials.discard(serial)
+
+        # Prune the branches that no longer route anywhere
+        segments = address.split('/')
+        for depth in range(len(path) - 1, 0, -1):
+            if not path[depth].is_empty():
+                break
+            segment = segments[depth - 1]
+            path[depth - 1].literal.pop(segment, None)
+            path[depth - 1].wildcard.pop(segment, None)
+
+    @staticmethod
+    def __child(node: RouteNode, segment):
+        if not any(char in segment for char in PATTERN_CHARS):
+            return node.literal.setdefault(segment, RouteNode())
+        if segment not in node.wildcard:
+            node.wildcard[segment] = (AddressRouter.compile_segment(segment), RouteNode())
+        return node.wildcard[segment][1]
+
+    @staticmethod
+    def is_pattern(address):
+        return any(char in address for char in PATTERN_CHARS)
+
+    @staticmethod
+    def compile_segment(segment):
+        # Translates an OSC address pattern segment (*, ?, [abc], [!abc], {foo,bar}) to a regex
+        regex = ""
+        i = 0
+        while i < len(segment):
+            char = segment[i]
+            if char == '*':
+                regex += ".*"
+            elif char == '?':
+                regex += "."
+            elif char == '[':
+                end = segment.find(']', i)
+                if end < 0:
+                    regex += re.escape(char)
+                else:
+                    char_class = AddressRouter.compile_class(segment[i + 1:end])
+                    if char_class is None:
+                        # Nothing to match against, e.g. "[]" or "[!]": taken literally
+                        regex += re.escape(segment[i:end + 1])
+                    else:
+                        regex += char_class
+                    i = end
+            elif char == '{':
+                end = segment.find('}', i)
+                if end < 0:
+                    regex += re.escape(char)
+                else:
+                    options = segment[i + 1:end].split(',')
+                    regex += "(?:" + "|".join(re.escape(option) for option in options) + ")"
+                    i = end
+            else:
+                regex += re.escape(char)
+            i += 1
+        try:
+            return re.compile(regex)
+        except re.error:
+            # Shouldn't happen with everything escaped, but a half typed address must never raise
+            return re.compile(re.escape(segment))
+
+    @staticmethod
+    def compile_class(body):
+        # [abc], [a-z] or [!abc]. Every character is escaped, a range going backwards ("z-a") is taken
+        # as its three characters. Returns None for an empty class.
+        negate = body.startswith('!')
+        if negate:
+            body = body[1:]
+        if not body:
+            return None
+        items = ""
+        i = 0
+        while i < len(body):
+            if i + 2 < len(body) and body[i + 1] == '-' and body[i] <= body[i + 2]:
+                items += f"{re.escape(body[i])}-{re.escape(body[i + 2])}"
+                i += 3
+            else:
+                items += re.escape(body[i])
+                i += 1
+        return f"[{'^' if negate else ''}{items}]"
+
+
+# Drops OSC messages nobody listens to before they are decoded. Receivers pass the raw address bytes of a message
+# (everything before the first NUL); only addresses that route to a tracker are accepted, so avatar parameters
+# that aren't mapped never get their arguments parsed. Follows mapping changes through the router.
+class AddressFilter:
+    def __init__(self, router: AddressRouter):
+        self.router = router
+        self.enabled = True
+        self.revision = -1
+        self.cache: Dict[bytes, bool] = {}
+        self.accepted = 0
+        self.rejected = 0
+
+    def accepts(self, address: bytes):
+        if not self.enabled:
+            self.accepted += 1
+            return True
+        if self.revision != self.router.rebuilds:
+            # The mappings changed
+            self.revision = self.router.rebuilds
+            self.cache = {}
+        result = self.cache.get(address)
+        if result is None:
+            result = self.__resolve(address)
+        if result:
+            self.accepted += 1
+        else:
+            self.rejected += 1
+        return result
+
+    def accepts_packet(self, datagram: bytes):
+        # Bundles are let through, their messages are checked one by one (or routed) after unpacking
+        if datagram.startswith(b"#bundle"):
+            return True
+        end = datagram.find(b"\0")
+        if end < 0:
+            self.rejected += 1
+            return False
+        return self.accepts(datagram[:end])
+
+    def __resolve(self, address: bytes):
+        try:
+            result = self.router.matches(address.decode("ascii"))
+        except UnicodeDecodeError:
+            result = False
+        if len(self.cache) >= AddressRouter.CACHE_LIMIT:
+            self.cache = {}
+        self.cache[address] = result
+        return result
+
+    def stats(self):
+        total = self.accepted + self.rejected
+        return {
+            "enabled": self.enabled,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "rejected_ratio": self.rejected / total if total else 0.0,
+        }
@@ -1,14 +1,18 @@
 import threading
 import time
+import app_timing
+from app_mailbox import StrengthMailbox
 from app_pattern import VibrationPattern
+from app_trace import DeviceTrace
 from app_config import AppConfig, VRTracker
 
 
-class FeedbackThread(threading.Thread):
+# Holds the feedback state of a single device. tick() is driven either by the
+# shared FeedbackScheduler or by a dedicated (legacy) FeedbackThread.
+class FeedbackDevice:
     LOW_BATTERY_ALERT_COUNT = 8
 
     def __init__(self, config: AppConfig, tracker: VRTracker, pulse_function, battery_function):
-        super().__init__()
         self.config = config
         self.tracker = tracker
         self.pulse_function = pulse_function
@@ -17,10 +21,23 @@ class FeedbackThread(threading.Thread):
         self.tracker_config = config.get_tracker_config(tracker.serial)
 
         self.battery_low_notif = self.LOW_BATTERY_ALERT_COUNT
+        self.battery_level: float = battery_function(tracker.index)
 
         self.strength: float = 0.0  # Should be treated as a value between 0 and 1
         self.strength_delta: float = 0.0
-        self.last_str_set_time = time.time()
+        self.last_str_set_time = time.perf_counter()
+        # Receiver threads post here, the feedback loop picks the updates up once per tick
+        self.mailbox = StrengthMailbox()
+        # Arrival time of the oldest update not yet turned into a pulse
+        self.pending_timestamp = None
+        self.trace = DeviceTrace(tracker.serial)
+        # Share of the last tick spent pulsing (0..1), and the highest one since state() was last read
+        self.output: float = 0.0
+        self.output_peak: float = 0.0
+        # Set by the driver (scheduler or thread). While dormant the device isn't ticked,
+        # anything that may make it vibrate again calls wake_function(self).
+        self.dormant = False
+        self.wake_function = None
 
         # Some devices (e.g. Tundra Trackers) use microseconds instead of
         # milliseconds for the legacy triggerHapticPulse() function, but then
@@ -76,82 +93,127 @@ class FeedbackThread(threading.Thread):
 
         self.vp = VibrationPattern(self.config)
 
-    def set_strength(self, strength):
+    def set_strength(self, strength, timestamp=None):
         try:
             strength = float(strength)
         except ValueError:
             strength = 0.0
 
-        self.strength_delta += abs(strength - self.strength)
-        self.strength = strength
-        self.last_str_set_time = time.time()
-
-    def run(self):
-        print(f"[VibrationManager] Thread started for {self.tracker.serial}")
-
-        while True:
-            start_time = time.time()
-
-            pulse_length = 0
-
-            strength = self.calculate_strength(start_time)
-            if strength > 0:
-                # So we pulse every self.interval_ms (e.g. 50) ms.  That means a
-                # self.interval_ms (50/etc) ms pulse would be 100%.
-                pulse_length = strength * self.interval_ms
-                # Don't cap strength to 1.0 as velocity calculation can easily
-                # exceed 1.  Also, some may rely on overriding the multiplier
-                # to adjust for different timescales, etc.
-
-            # Check if there's a queued force pulse
-            if start_time < self.hack_pulse_force_stop_time:
-                # Convert to milliseconds
-                # (Don't cap this so if a pulse limit is specified, the
-                #  leftover pulse carries over.)
-                force_pulse_duration = (self.hack_pulse_force_stop_time - start_time) * 1000
-                # Pick the biggest number for pulse_length
-                pulse_length = max(pulse_length, force_pulse_duration)
-
-            # If a maximum pulse length is specified...
-            if self.hack_pulse_limit_ms > 0:
-                # ...and we exceed it...
-                if pulse_length > self.hack_pulse_limit_ms:
-                    if not self.hack_pulse_limit_exceeded:
-                        print(f"[VibrationManager] {round(pulse_length, 2)} ms pulse exceeds {self.interval_ms} ms limit for {self.tracker.serial}, extending next pulse [this warning won't repeat]")
-                        self.hack_pulse_limit_exceeded = True
-
-                    # Carry over any excess to the next loop iteration by
-                    # queuing it as a forced pulse.  Don't subtract anything as
-                    # this pulse's time.sleep() also reduces the next pulse.
-                    self.force_pulse(pulse_length)
-                    # Do a max length pulse now
-                    pulse_length = self.hack_pulse_limit_ms
-
-            # Convert to target unit of time if necessary
-            if self.hack_pulse_mult_to_ms:
-                pulse_length = pulse_length / self.hack_pulse_mult_to_ms
-
-            # Convert to integer (after all else for max precision)
-            pulse_length = int(pulse_length)
-
-            # Trigger pulse if nonzero length requested
-            if pulse_length > 0:
-                self.pulse_function(self.tracker.index, pulse_length)
-
-            sleep = max(self.interval_s - (time.time() - start_time), 0.0)
-            time.sleep(sleep)
-
-    def calculate_strength(self, start_time):
+        self.mailbox.post(strength, timestamp)
+        self.last_str_set_time = time.perf_counter()
+        # Checked after posting: if the driver suspends us in between, it sees the update (see try_suspend)
+        if self.dormant:
+            self.wake()
+
+    def wake(self):
+        if self.wake_function is not None:
+            self.wake_function(self)
+
+    def resume(self):
+        self.dormant = False
+
+    def is_idle(self, start_time):
+        # Nothing to play: no input, no velocity left to drain, no queued force pulse and no battery alert
+        return (self.strength == 0 and not self.mailbox.pending()
+                and (self.strength_delta == 0 or not self.vp.uses_velocity())
+                and start_time >= self.hack_pulse_force_stop_time
+                and not (self.battery_low() and self.battery_low_notif > 0))
+
+    def try_suspend(self, start_time):
+        # Goes dormant if idle. The flag is published before the final check, so an update posted
+        # concurrently is either seen here or makes set_strength() wake us up.
+        if not self.config.idle_suspend or not self.is_idle(start_time):
+            return False
+        self.dormant = True
+        if self.is_idle(start_time):
+            return True
+        self.dormant = False
+        return False
+
+    def receive(self):
+        # Folds every update posted since the last tick into strength and strength_delta
+        sample = self.mailbox.take(self.strength)
+        if sample is not None:
+            self.strength, delta, timestamp = sample
+            self.strength_delta += delta
+            if self.pending_timestamp is None:
+                self.pending_timestamp = timestamp
+
+    # start_time is the tick's time in perf_counter() seconds.
+    # patterned_strength comes from the scheduler's batch, which already received this tick's updates
+    # and computed the pattern from them. Receiving again would apply updates the pattern didn't see.
+    def tick(self, start_time, patterned_strength=None):
+        if patterned_strength is None:
+            self.receive()
+        pulse_length = 0
+
+        strength = self.calculate_strength(start_time, patterned_strength)
+        if strength > 0:
+            # So we pulse every self.interval_ms (e.g. 50) ms.  That means a
+            # self.interval_ms (50/etc) ms pulse would be 100%.
+            pulse_length = strength * self.interval_ms
+            # Don't cap strength to 1.0 as velocity calculation can easily
+            # exceed 1.  Also, some may rely on overriding the multiplier
+            # to adjust for different timescales, etc.
+
+        # Check if there's a queued force pulse
+        if start_time < self.hack_pulse_force_stop_time:
+            # Convert to milliseconds
+            # (Don't cap this so if a pulse limit is specified, the
+            #  leftover pulse carries over.)
+            force_pulse_duration = (self.hack_pulse_force_stop_time - start_time) * 1000
+            # Pick the biggest number for pulse_length
+            pulse_length = max(pulse_length, force_pulse_duration)
+
+        # If a maximum pulse length is specified...
+        if self.hack_pulse_limit_ms > 0:
+            # ...and we exceed it...
+            if pulse_length > self.hack_pulse_limit_ms:
+                if not self.hack_pulse_limit_exceeded:
+                    print(f"[VibrationManager] {round(pulse_length, 2)} ms pulse exceeds {self.interval_ms} ms limit for {self.tracker.serial}, extending next pulse [this warning won't repeat]")
+                    self.hack_pulse_limit_exceeded = True
+
+                # Carry over any excess to the next loop iteration by
+                # queuing it as a forced pulse.  Don't subtract anything as
+                # this pulse's tick interval also reduces the next pulse.
+                self.force_pulse(pulse_length)
+                # Do a max length pulse now
+                pulse_length = self.hack_pulse_limit_ms
+
+        self.output = pulse_length / self.interval_ms
+        if self.output > self.output_peak:
+            self.output_peak = self.output
+
+        # Convert to target unit of time if necessary
+        if self.hack_pulse_mult_to_ms:
+            pulse_length = pulse_length / self.hack_pulse_mult_to_ms
+
+        # Convert to integer (after all else for max precision)
+        pulse_length = int(pulse_length)
+
+        # Trigger pulse if nonzero length requested
+        if pulse_length > 0:
+            self.pulse_function(self.tracker.index, pulse_length)
+            if self.pending_timestamp is not None:
+                self.trace.record_latency(self.pending_timestamp)
+        # Updates that didn't result in a pulse are not traced
+        self.pending_timestamp = None
+
+    def battery_low(self):
+        return self.battery_level < (self.tracker_config.battery_threshold / 100)
+
+    def calculate_strength(self, start_time, patterned_strength=None):
         # Check the battery threshold
-        if self.battery_function(self.tracker.index) < (self.tracker_config.battery_threshold / 100):
+        if self.battery_low():
             if self.battery_low_notif > 0:
                 self.battery_low_notif -= 1
                 return self.battery_low_notif % .9
             return 0
         self.battery_low_notif = self.LOW_BATTERY_ALERT_COUNT
 
-        # Apply Pattern
-        patterned_strength = self.vp.apply_pattern(self.strength, self.strength_delta)
+        # Apply Pattern (unless the scheduler already did it for a whole batch)
+        if patterned_strength is None:
+            patterned_strength = self.vp.apply_pattern(self.strength, self.strength_delta)
         self.strength_delta -= patterned_strength
         if self.strength_delta < 0:
             self.strength_delta = 0
@@ -162,20 +224,80 @@ class FeedbackThread(threading.Thread):
 
         return 0
 
+    def battery_changed(self, level):
+        was_low = self.battery_low()
+        self.battery_level = level
+        is_low = self.battery_low()
+        if is_low and not was_low:
+            print(f"[VibrationManager] Battery of {self.tracker.serial} dropped below the threshold ({round(level * 100)}%)")
+            # The low battery alert needs ticks to play
+            if self.dormant:
+                self.wake()
+        elif was_low and not is_low:
+            # Re-arm the alert here too, a dormant device doesn't tick to do it
+            self.battery_low_notif = self.LOW_BATTERY_ALERT_COUNT
+
     def apply_multiplier(self, strength):
-        return (strength * self.tracker.pulse_multiplier
-                * self.config.get_tracker_config(self.tracker.serial).multiplier_override)
+        return strength * self.tracker.pulse_multiplier * self.tracker_config.multiplier_override
+
+    def state(self):
+        # (serial, strength, output, battery, multiplier, battery threshold, received, missed ticks), see app_engine.
+        # output is the peak since the previous call, so pulses between two reads aren't lost. Has a single reader:
+        # the engine's table, or the GUI's meters without an engine process.
+        output, self.output_peak = self.output_peak, 0.0
+        return (self.tracker.serial, self.strength, output, self.battery_level,
+                self.tracker_config.multiplier_override, self.tracker_config.battery_threshold,
+                self.mailbox.received, self.trace.missed_ticks)
 
     def force_pulse(self, length):
         if self.hack_pulse_limit_ms > 0:
             # Add the pulse length in milliseconds to the current time in
             # seconds, determining the new target time to stop
-            self.hack_pulse_force_stop_time = time.time() + (length / 1000)
+            self.hack_pulse_force_stop_time = time.perf_counter() + (length / 1000)
             # NOTE: This is also used by run() to handle lengths that exceed
             # the maximum.
+            if self.dormant:
+                self.wake()
         else:
             # Convert to target unit of time if necessary
             if self.hack_pulse_mult_to_ms:
                 length = length / self.hack_pulse_mult_to_ms
             # Trigger haptic pulse
             self.pulse_function(self.tracker.index, int(length * self.tracker.pulse_multiplier))
+
+
+# Legacy driver: one thread per device, each waiting for its own deadlines
+class FeedbackThread(threading.Thread):
+    def __init__(self, device: FeedbackDevice):
+        super().__init__()
+        self.device = device
+        self.device.wake_function = self.wake
+        self.wake_event = threading.Event()
+        self.running = True
+
+    def stop(self):
+        self.running = False
+        self.wake_event.set()
+
+    def wake(self, device):
+        self.wake_event.set()
+
+    def run(self):
+        print(f"[VibrationManager] Thread started for {self.device.tracker.serial}")
+        app_timing.apply_realtime(self.device.config, self.name)
+
+        clock = app_timing.TickClock(self.device.interval_s * 1e9)
+        while self.running:
+            app_timing.sleep_until(clock.deadline_ns)
+            now = time.perf_counter_ns()
+            self.device.trace.record_jitter(now - clock.deadline_ns)
+            self.device.tick(now / 1e9)
+
+            self.wake_event.clear()
+            if self.device.try_suspend(now / 1e9):
+                self.wake_event.wait()
+                self.device.resume()
+                # Tick right away, the grid starts over from here
+                clock.reset(time.perf_counter_ns())
+                continue
+            self.device.trace.record_missed(clock.advance(time.perf_counter_ns()))
@@ -0,0 +1,154 @@
+import heapq
+import itertools
+import threading
+import time
+
+import app_timing
+from app_config import AppConfig
+from app_runner import FeedbackDevice
+
+
+# Services every FeedbackDevice (or anything with the same tick interface, like a ChannelTarget) from a single thread.
+# Devices are kept in a priority queue ordered by their next deadline,
+# so the loop only wakes up when the earliest device is due.
+# Idle devices are taken out of the queue entirely until they wake up (see FeedbackDevice.try_suspend).
+class FeedbackScheduler(threading.Thread):
+    # Evaluate the patterns with NumPy once this many devices are due in the same tick.
+    # See Benchmarks/bench_pattern.py for the crossover point.
+    BATCH_THRESHOLD = 16
+    # stop() waits this long for a tick in progress, the targets are shut down right after
+    STOP_TIMEOUT_S = 2.0
+
+    def __init__(self, config: AppConfig = None):
+        super().__init__(name="FeedbackScheduler", daemon=True)
+        self.config = config
+        self.condition = threading.Condition()
+        self.queue = []  # (deadline ns, sequence, token, device)
+        self.sequence = itertools.count()
+        self.devices = {}  # device -> token of its live queue entry
+        self.clocks = {}  # device -> TickClock
+        self.suspended = set()
+        self.running = False
+
+        self.suspends = 0
+        self.wakeups = 0
+
+    def add_device(self, device: FeedbackDevice):
+        with self.condition:
+            if device in self.devices:
+                return
+            token = next(self.sequence)
+            clock = app_timing.TickClock(device.interval_s * 1e9)
+            self.devices[device] = token
+            self.clocks[device] = clock
+            device.wake_function = self.wake
+            heapq.heappush(self.queue, (clock.deadline_ns, token, token, device))
+            self.condition.notify()
+        print(f"[Scheduler] Scheduling {device.tracker.serial} every {device.interval_ms} ms")
+
+    def remove_device(self, device: FeedbackDevice):
+        # The queue entry is dropped lazily when it comes due
+        with self.condition:
+            self.devices.pop(device, None)
+            self.clocks.pop(device, None)
+            self.suspended.discard(device)
+
+    def wake(self, device: FeedbackDevice):
+        # Called from any thread. Puts a suspended device back in the queue, due right away.
+        with self.condition:
+            if device not in self.suspended:
+                return
+            self.suspended.discard(device)
+            device.resume()
+            clock = self.clocks[device]
+            clock.reset(time.perf_counter_ns())
+            heapq.heappush(self.queue, (clock.deadline_ns, next(self.sequence), self.devices[device], device))
+            self.wakeups += 1
+            self.condition.notify()
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.is_alive() and threading.current_thread() is not self:
+            self.join(self.STOP_TIMEOUT_S)
+            if self.is_alive():
+                print(f"[Scheduler][ERROR] Still ticking after {self.STOP_TIMEOUT_S} s, stopping anyway")
+
+    def run(self):
+        print("[Scheduler] Thread started")
+        app_timing.apply_realtime(self.config, self.name)
+        due = []
+        while self.running:
+            with self.condition:
+                if not self.queue:
+                    self.condition.wait()
+                    continue
+                deadline = self.queue[0][0]
+                remaining = deadline - time.perf_counter_ns()
+                if remaining > app_timing.SPIN_NS:
+                    # Sleep until shortly before the deadline, an added device may wake us up earlier
+                    self.condition.wait((remaining - app_timing.SPIN_NS) / 1e9)
+                    continue
+
+            # Spin the rest of the way without holding the lock
+            app_timing.sleep_until(deadline)
+            with self.condition:
+                now = time.perf_counter_ns()
+                due.clear()
+                while self.queue and self.queue[0][0] <= now:
+                    deadline, _, token, device = heapq.heappop(self.queue)
+                    if self.devices.get(device) == token:
+                        due.append((deadline, token, device))
+
+            start_time = now / 1e9
+            patterned = self.batch_patterns(due)
+            for i, (deadline, token, device) in enumerate(due):
+                device.trace.record_jitter(now - deadline)
+                try:
+                    device.tick(start_time, patterned[i] if patterned is not None else None)
+                except Exception as e:
+                    print(f"[Scheduler][ERROR] Tick failed for {device.tracker.serial}: {e}")
+
+            with self.condition:
+                now = time.perf_counter_ns()
+                for deadline, token, device in due:
+                    if self.devices.get(device) != token:
+                        continue
+                    if device.try_suspend(start_time):
+                        self.suspended.add(device)
+                        self.suspends += 1
+                        continue
+                    clock = self.clocks[device]
+                    device.trace.record_missed(clock.advance(now))
+                    heapq.heappush(self.queue, (clock.deadline_ns, next(self.sequence), token, device))
+
+    def stats(self):
+        with self.condition:
+            return {"devices": len(self.devices), "suspended": len(self.suspended),
+                    "suspends": self.suspends, "wakeups": self.wakeups}
+
+    def batch_patterns(self, due):
+        if len(due) < self.BATCH_THRESHOLD:
+            return None
+        # Multi channel targets tick their own channels, only plain feedback devices take part
+        indices = [i for i, (_, _, device) in enumerate(due) if isinstance(device, FeedbackDevice)]
+        if len(indices) < self.BATCH_THRESHOLD:
+            return None
+        devices = [due[i][2] for i in indices]
+        # Each device receives here, once per tick. tick() gets the patterned strength and doesn't receive again.
+        for device in devices:
+            device.receive()
+        strengths = [device.strength for device in devices]
+        deltas = [device.strength_delta for device in devices]
+        # All devices share the same pattern config
+        values = devices[0].vp.apply_pattern_batch(strengths, deltas).tolist()
+
+        result = [None] * len(due)
+        for i, value in zip(indices, values):
+            result[i] = value
+        return result
@@ -0,0 +1,74 @@
+import os
+import sys
+import threading
+import time
+
+from app_config import AppConfig
+
+# time.sleep() overshoots by up to ~1 ms (more on busy or older Windows systems),
+# so the last stretch before a deadline is spent spinning instead
+SPIN_NS = 500_000
+
+
+def sleep_until(deadline_ns, spin_ns=SPIN_NS):
+    remaining = deadline_ns - time.perf_counter_ns()
+    if remaining > spin_ns:
+        time.sleep((remaining - spin_ns) / 1e9)
+    while time.perf_counter_ns() < deadline_ns:
+        # Yield the GIL, receiver threads may be waiting for it
+        time.sleep(0)
+
+
+# A fixed grid of tick deadlines on the monotonic clock (perf_counter_ns).
+# Deadlines are absolute, so time spent ticking or oversleeping never accumulates as drift.
+class TickClock:
+    __slots__ = ("interval_ns", "deadline_ns", "missed")
+
+    def __init__(self, interval_ns, start_ns=None):
+        self.interval_ns = max(int(interval_ns), 1)
+        self.deadline_ns = time.perf_counter_ns() if start_ns is None else start_ns
+        self.missed = 0
+
+    def reset(self, now_ns):
+        self.deadline_ns = now_ns
+
+    def advance(self, now_ns):
+        # Moves to the next deadline and returns the number of ticks skipped.
+        # Catch-up rules: a tick that ran late, but within its interval, keeps the grid, so the next
+        # one simply comes sooner. Ticks that were missed entirely are dropped instead of bursting
+        # them out back-to-back, which would feel like a glitch on the actuator.
+        self.deadline_ns += self.interval_ns
+        if self.deadline_ns > now_ns:
+            return 0
+        missed = (now_ns - self.deadline_ns) // self.interval_ns + 1
+        self.deadline_ns += missed * self.interval_ns
+        self.missed += missed
+        return missed
+
+
+def apply_realtime(config: AppConfig, name):
+    # Optional (Linux only): pin the calling output thread to the configured CPUs and raise its priority.
+    # Both usually need privileges (CAP_SYS_NICE), failures are reported and otherwise ignored.
+    if config is None or not config.realtime_output:
+        return
+    if not sys.platform.startswith("linux"):
+        print(f"[Timing] Real-time mode is only supported on Linux, ignored for {name}")
+        return
+
+    # On Linux, pid 0 means the calling thread
+    if config.realtime_cpus:
+        try:
+            os.sched_setaffinity(0, config.realtime_cpus)
+            print(f"[Timing] {name} pinned to CPUs {config.realtime_cpus}")
+        except (OSError, ValueError) as e:
+            print(f"[Timing][ERROR] Can't set the CPU affinity of {name}: {e}")
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(config.realtime_priority))
+        print(f"[Timing] {name} running with SCHED_FIFO priority {config.realtime_priority}")
+    except (OSError, ValueError) as e:
+        # Fall back to the best nice level we're allowed to have
+        try:
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), -10)
+            print(f"[Timing] {name} can't use SCHED_FIFO ({e}), running with nice -10")
+        except OSError:
+            print(f"[Timing][ERROR] Can't raise the priority of {name}: {e}")
@@ -0,0 +1,108 @@
+import csv
+import json
+import time
+from array import array
+from typing import Dict
+
+# log2 histogram buckets of microseconds: bucket n counts samples in [2^(n-1), 2^n) µs
+HISTOGRAM_BUCKETS = 24
+
+
+# Fixed size ring of the most recent samples (nanoseconds) plus a log2 histogram of every sample
+class TraceBuffer:
+    __slots__ = ("samples", "size", "index", "count", "histogram")
+
+    def __init__(self, size):
+        self.samples = array('q', bytes(8 * size))
+        self.size = size
+        self.index = 0
+        self.count = 0
+        self.histogram = array('Q', bytes(8 * HISTOGRAM_BUCKETS))
+
+    def record(self, value_ns):
+        self.samples[self.index] = value_ns
+        self.index = (self.index + 1) % self.size
+        self.count += 1
+        bucket = min(max(value_ns, 0) // 1000, (1 << (HISTOGRAM_BUCKETS - 1)) - 1).bit_length()
+        self.histogram[bucket] += 1
+
+    def recent(self):
+        if self.count < self.size:
+            return self.samples[:self.count].tolist()
+        return (self.samples[self.index:] + self.samples[:self.index]).tolist()
+
+    def summary(self):
+        values = sorted(self.recent())
+        if not values:
+            return {"count": 0}
+
+        def percentile(p):
+            return round(values[min(int(len(values) * p), len(values) - 1)] / 1e6, 3)
+
+        return {
+            "count": self.count,
+            "min_ms": round(values[0] / 1e6, 3),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(values[-1] / 1e6, 3),
+        }
+
+    def histogram_dict(self):
+        return {f"<{1 << bucket}us": count for bucket, count in enumerate(self.histogram) if count}
+
+
+# Per device timing trace: packet arrival -> haptic pulse latency and tick jitter
+class DeviceTrace:
+    BUFFER_SIZE = 1024
+
+    def __init__(self, serial):
+        self.serial = serial
+        self.latency = TraceBuffer(self.BUFFER_SIZE)
+        self.jitter = TraceBuffer(self.BUFFER_SIZE)
+        self.missed_ticks = 0
+
+    def record_latency(self, arrival_ns):
+        self.latency.record(time.perf_counter_ns() - arrival_ns)
+
+    def record_jitter(self, jitter_ns):
+        self.jitter.record(jitter_ns)
+
+    def record_missed(self, count):
+        self.missed_ticks += count
+
+    def summary(self):
+        return {
+            "latency": self.latency.summary(),
+            "latency_histogram": self.latency.histogram_dict(),
+            "jitter": self.jitter.summary(),
+            "jitter_histogram": self.jitter.histogram_dict(),
+            "missed_ticks": self.missed_ticks,
+        }
+
+
+def export_json(traces: Dict[str, DeviceTrace], path):
+    with open(path, "w") as trace_file:
+        json.dump({serial: dict(trace.summary(),
+                                latency_samples_ns=trace.latency.recent(),
+                                jitter_samples_ns=trace.jitter.recent())
+                   for serial, trace in traces.items()}, fp=trace_file)
+
+
+def export_csv(traces: Dict[str, DeviceTrace], path):
+    with open(path, "w", newline="") as trace_file:
+        writer = csv.writer(trace_file)
+        writer.writerow(["serial", "kind", "sample_ns"])
+        for serial, trace in traces.items():
+            for value in trace.latency.recent():
+                writer.writerow([serial, "latency", value])
+            for value in trace.jitter.recent():
+                writer.writerow([serial, "jitter", value])
+
+
+def export(traces: Dict[str, DeviceTrace], path):
+    if path.lower().endswith(".csv"):
+        export_csv(traces, path)
+    else:
+        export_json(traces, path)
+    print(f"[Trace] Exported {len(traces)} device traces to {path}")
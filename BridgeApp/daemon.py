@@ -0,0 +1,215 @@
+# Headless entry point: runs the bridge without the GUI (and without importing FreeSimpleGUI),
+# controlled through a small JSON API on localhost.
+#
+#   GET  /status                    server status and counts
+#   GET  /trackers                  every tracker and external target with its mapping
+#   POST /trackers/refresh          query OpenVR for new trackers
+#   POST /trackers/<serial>/pulse   pulse test, body: {"length": 500}
+#   GET  /mappings                  {serial: [address, ...]}
+#   PUT  /mappings/<serial>         body: {"address_list": [...], "multiplier_override": 1.0, "battery_threshold": 20}
+#   POST /externals                 add an external target, body: {"type": "NETWORK"}
+#   POST /server/restart            restart the main bridge server with the current config
+#   GET  /sources                   every bridge server (main + extra_sources) with its rate and errors
+#   POST /sources/<name>/restart    restart one source, the others keep running
+#   GET  /stats                     source, router, address filter, config writer and per target stats
+#   POST /shutdown                  stop the daemon
+#
+# Usage: python daemon.py [--port 9080]
+import argparse
+import json
+import platform
+import signal
+import threading
+import traceback
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import unquote, urlparse
+
+from app_bridge import HapticBridge
+from app_config import AppConfig
+
+CONTROL_HOST = "127.0.0.1"
+
+
+class ControlError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Requests are handled one at a time on the main thread, so handlers never race each other
+class ControlServer(HTTPServer):
+    def __init__(self, port, bridge: HapticBridge):
+        super().__init__((CONTROL_HOST, port), ControlRequestHandler)
+        self.bridge = bridge
+        self.server_status = {"message": "", "is_error": False}
+
+    def status_update(self, message, is_error=False):
+        self.server_status = {"message": message, "is_error": is_error}
+        print(f"[Daemon] Server status: {message}")
+
+    def stop(self):
+        # shutdown() waits for serve_forever() to return, so it can't be called from the serving thread
+        threading.Thread(target=self.shutdown, daemon=True).start()
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    server: ControlServer
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def handle_request(self, method):
+        path = [unquote(part) for part in urlparse(self.path).path.strip("/").split("/") if part]
+        try:
+            body = self.read_body()
+            self.send_json(200, self.dispatch(method, path, body))
+        except ControlError as e:
+            self.send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            print(f"[Daemon][ERROR] {method} {self.path} failed: {e}\n{traceback.format_exc()}")
+            self.send_json(500, {"error": str(e)})
+
+    def dispatch(self, method, path, body):
+        bridge = self.server.bridge
+        match method, path:
+            case "GET", ["status"]:
+                return {"server_type": bridge.config.server_type,
+                        "server_address": f"{bridge.config.server_ip}:{bridge.config.server_port}",
+                        "server_status": self.server.server_status,
+                        "openvr": bridge.vr is not None and bridge.vr.is_alive(),
+                        "trackers": len(list_trackers(bridge))}
+            case "GET", ["trackers"]:
+                return list_trackers(bridge)
+            case "POST", ["trackers", "refresh"]:
+                bridge.query_trackers()
+                return list_trackers(bridge)
+            case "POST", ["trackers", serial, "pulse"]:
+                if not any(tracker["serial"] == serial for tracker in list_trackers(bridge)):
+                    raise ControlError(404, f"Unknown tracker: {serial}")
+                bridge.pulse_test(serial, int(body.get("length", 500)))
+                return {"serial": serial}
+            case "GET", ["mappings"]:
+                return {serial: tracker_config.address_list
+                        for serial, tracker_config in bridge.config.tracker_config_dict.items()}
+            case "PUT", ["mappings", serial]:
+                return update_mapping(bridge, serial, body)
+            case "POST", ["externals"]:
+                result = bridge.add_external_target(str(body.get("type", "")))
+                if result is None:
+                    raise ControlError(400, f"Unknown external target type: {body.get('type')}")
+                return {"serial": result[0], "model": result[1]}
+            case "POST", ["server", "restart"]:
+                bridge.restart_server()
+                return self.server.server_status
+            case "GET", ["sources"]:
+                return bridge.ingest.stats()
+            case "POST", ["sources", name, "restart"]:
+                if not bridge.restart_server(name):
+                    raise ControlError(404, f"Unknown source: {name}")
+                return bridge.ingest.stats()[name]
+            case "GET", ["stats"]:
+                return bridge.stats()
+            case "POST", ["shutdown"]:
+                self.server.stop()
+                return {"shutdown": True}
+        raise ControlError(404, f"No such endpoint: {method} /{'/'.join(path)}")
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        try:
+            body = json.loads(self.rfile.read(length))
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ControlError(400, f"Invalid JSON body: {e}")
+        if not isinstance(body, dict):
+            raise ControlError(400, "The JSON body must be an object")
+        return body
+
+    def send_json(self, status, content):
+        data = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        # Only errors are worth printing
+        pass
+
+
+def list_trackers(bridge: HapticBridge):
+    trackers = []
+    if bridge.vr is not None:
+        trackers.extend((device, False) for device in bridge.vr.devices)
+    trackers.extend((target.tracker, True) for target in bridge.external_targets.values())
+
+    result = []
+    for tracker, external in trackers:
+        tracker_config = bridge.config.get_tracker_config(tracker.serial)
+        result.append({"serial": tracker.serial, "model": tracker.model, "external": external,
+                       "address_list": tracker_config.address_list,
+                       "multiplier_override": tracker_config.multiplier_override,
+                       "battery_threshold": tracker_config.battery_threshold})
+    return result
+
+
+def update_mapping(bridge: HapticBridge, serial, body):
+    tracker_config = bridge.config.get_tracker_config(serial)
+    if "address_list" in body:
+        address_list = body["address_list"]
+        if isinstance(address_list, str):
+            address_list = address_list.split(';')
+        if not isinstance(address_list, list):
+            raise ControlError(400, "address_list must be a list or a ';' separated string")
+        # Goes through set_address, so the router picks up the change right away
+        tracker_config.set_address(";".join(str(address) for address in address_list))
+    tracker_config.set_vibration_multiplier(body.get("multiplier_override"))
+    tracker_config.set_battery_threshold(body.get("battery_threshold"))
+    bridge.config_writer.mark_dirty()
+    return {"serial": serial, "address_list": tracker_config.address_list,
+            "multiplier_override": tracker_config.multiplier_override,
+            "battery_threshold": tracker_config.battery_threshold}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Haptic Pancake Bridge without the GUI")
+    parser.add_argument("--port", type=int, help="Port of the control API (default: control_port of the config)")
+    args = parser.parse_args()
+
+    print(f"[Daemon] Using Python: {platform.python_version()}")
+    config = AppConfig.load()
+    if config.check_integrity():
+        config.save()
+    print("[Daemon] Config loaded")
+
+    bridge = HapticBridge(config)
+    control_server = None
+    try:
+        control_server = ControlServer(args.port or config.control_port, bridge)
+        bridge.start(control_server.status_update)
+        bridge.query_trackers()
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: control_server.stop())
+        print(f"[Daemon] Control API listening on http://{CONTROL_HOST}:{control_server.server_port}")
+        try:
+            control_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        bridge.save_config()
+    finally:
+        print("[Daemon] Halting...")
+        if control_server is not None:
+            control_server.server_close()
+        bridge.shutdown()
+
+
+if __name__ == '__main__':
+    main()
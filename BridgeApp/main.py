@@ -1,81 +1,105 @@
-from app_config import AppConfig
-from app_gui import GUIRenderer
-from server_base import ServerBase
-from server_osc import VRChatOSCReceiver
-from server_websocket import ResoniteWebSocketServer
-from target_ovr import OpenVRTracker
+import time
+
+# Start of the startup profile (--startup-profile), taken before anything else is imported
+STARTUP_TIME = time.perf_counter()
+
+import argparse
+import multiprocessing
 import traceback
 import platform
+import os
+
+# Kept light: the engine process imports this module again when it's spawned. The GUI (FreeSimpleGUI, Tk),
+# the bridge servers and the targets (openvr, pyserial) are imported in main() once it's known which are needed.
+from app_config import AppConfig
 
-bridge_server: ServerBase = None
-vr: OpenVRTracker = None
 config: AppConfig = None
-gui: GUIRenderer = None
-external_id: int = 0
+# HapticBridge, or its EngineClient stand-in when the engine runs in its own process
+bridge = None
+gui = None
+# (phase, milliseconds) of this startup, see --startup-profile
+startup_phases = []
+
+
+def startup_phase(name, phase_start):
+    now = time.perf_counter()
+    startup_phases.append((name, (now - phase_start) * 1000))
+    return now
+
+
+def print_startup_profile(bridge_phases):
+    print("[Startup] Time spent per phase:")
+    for name, ms in startup_phases:
+        print(f"[Startup]   {name:<16} {ms:8.1f} ms")
+    print(f"[Startup]   {'total':<16} {sum(ms for name, ms in startup_phases):8.1f} ms")
+    # Part of "bridge start", in the engine process if there is one (then "bridge start" includes spawning it)
+    if bridge_phases is None:
+        print("[Startup]   bridge start: no answer from the engine process")
+        return
+    for name, ms in bridge_phases.items():
+        print(f"[Startup]   bridge start: {name} {ms:.1f} ms")
 
 
-def main():
+def main(args):
+    phase_start = startup_phase("imports", STARTUP_TIME)
     print(f"[Main] Using Python: {platform.python_version()}")
     print("[Main] Starting up...")
-    # Load the config
+    # Load the config. It's only written back if something had to be fixed or migrated.
     global config
     config = AppConfig.load()
-    config.check_integrity()
-    config.save()
+    if config.check_integrity():
+        config.save()
     print("[Main] Config loaded")
+    phase_start = startup_phase("config", phase_start)
+
+    # Bridge core: config writer, routing, scheduler and targets
+    global bridge
+    if config.engine_process:
+        from app_engine import EngineClient
+        bridge = EngineClient(config)
+    else:
+        from app_bridge import HapticBridge
+        bridge = HapticBridge(config)
+    phase_start = startup_phase("bridge imports", phase_start)
 
     # Init GUI
+    from app_gui import GUIRenderer
     global gui
-    gui = GUIRenderer(config, pulse_test, restart_bridge_server, refresh_tracker_list, add_external_target)
+    gui = GUIRenderer(config, bridge.pulse_test, bridge.restart_server, refresh_tracker_list, add_external_target,
+                      bridge.config_changed, external_output, bridge.device_states)
     print("[Main] GUI initialized")
+    phase_start = startup_phase("GUI build", phase_start)
 
-    # Start the Server
-    start_bridge_server()
-
-    print("[Main] Bridge server started")
-
-    # Init OpenVR
-    global vr
-    vr = OpenVRTracker(config)
+    # Start the server, the haptic scheduler and OpenVR
+    bridge.start(gui.update_osc_status_bar)
 
-    # Add trackers to GUI
+    # Add trackers to GUI, and keep the list up to date when they come and go
+    bridge.add_device_listener(gui.devices_changed)
     refresh_tracker_list()
+    phase_start = startup_phase("bridge start", phase_start)
 
     # Add footer
     gui.add_footer()
+    gui.open_window()
+    startup_phase("GUI window", phase_start)
+
+    if args.startup_profile:
+        # Waits for the engine process to be up, if there is one
+        stats = bridge.stats()
+        print_startup_profile(stats["startup"] if stats is not None else None)
+        return
 
     # Main GUI loop here
     while gui.run():
         pass
 
 
-def start_bridge_server():
-    global bridge_server
-    if config.server_type == 1:
-        bridge_server = ResoniteWebSocketServer(config, param_received, gui.update_osc_status_bar)
-    else:
-        bridge_server = VRChatOSCReceiver(config, param_received, gui.update_osc_status_bar)
-    bridge_server.start_server()
-
-
 # Adapter functions
-def pulse_test(tracker_serial):
-    print(f"[Main] Pulse test for {tracker_serial} executed.")
-    vr.pulse_by_serial(tracker_serial, 500)
-    # param_received("TEST", 1.0)
-
-
-def restart_bridge_server():
-    if bridge_server is not None:
-        bridge_server.shutdown()
-    start_bridge_server()
-
-
 def refresh_tracker_list():
-    if vr is None or gui is None:
+    if bridge is None or gui is None:
         return
 
-    for device in vr.query_devices():
+    for device in bridge.query_trackers():
         gui.add_tracker(device.serial, device.model)
 
     # Debug tracker (Uncomment this for debug purposes)
@@ -84,39 +108,37 @@ def refresh_tracker_list():
 
 
 def add_external_target(external_type):
-    global external_id
-    external_id += 1
-    print(external_type + '; ' + str(external_id))
+    result = bridge.add_external_target(external_type)
+    if result is not None:
+        gui.add_external_device(*result)
 
-    sound_emu = "EMUSND"
-    text_emu = "EMUTXT"
-    serial_com = "SERIALCOM"
-    network = "NETWORK"
-    serial = "-"+str(external_id)
 
-    if external_type.endswith(sound_emu):
-        gui.add_external_device(sound_emu+serial, "Sound Target")
-    if external_type.endswith(text_emu):
-        gui.add_external_device(text_emu+serial, "Text Target")
-    if external_type.endswith(serial_com):
-        gui.add_external_device(serial_com+serial, "Serial Target")
-    if external_type.endswith(network):
-        gui.add_external_device(network+serial, "Network Target")
+def external_output(serial, path):
+    # The bridge knows the target types: text targets return their output, sound targets render to path
+    text = bridge.render_external_text(serial)
+    if text is not None:
+        gui.show_output(serial, text)
+    elif path:
+        bridge.render_external_sound(serial, path)
 
 
-def param_received(address, value):
-    # value is the floating value (0..1) that determines how intense the feedback should be
-    for serial, tracker_config in config.tracker_config_dict.items():
-        if  address in tracker_config.address_list:
-            vr.set_strength(serial, value)
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Print the time spent per startup phase once the window is open, then exit")
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
+    # The engine process is started with spawn, which has to work in the frozen (PyInstaller) build too
+    multiprocessing.freeze_support()
+    crashed = False
     try:
-        main()
-        if config is not None:
-            config.save()
+        main(parse_args())
+        if bridge is not None:
+            bridge.save_config()
     except Exception as e:
+        crashed = True
         print(f"[Main][ERROR] {e}\n{traceback.format_exc()}")
         with open('hpb_crashlog.txt', "w+") as crash_log:
             import json
@@ -125,5 +147,9 @@ if __name__ == '__main__':
     finally:
         # Shut down the processes
         print("[Main] Halting...")
-        if bridge_server is not None:
-            bridge_server.shutdown()
+        if crashed and bridge is not None and config.engine_process:
+            # Keep the haptics going, the engine carries on headless. Exit without waiting for it.
+            bridge.detach()
+            os._exit(1)
+        if bridge is not None:
+            bridge.shutdown()
@@ -2,10 +2,21 @@ from app_config import AppConfig
 
 
 class ServerBase:
-    def __init__(self, config: AppConfig, param_received_event, status_update):
+    def __init__(self, config: AppConfig, param_received_event, status_update, param_batch_event=None):
         self.config = config
         self.param_received_event = param_received_event
         self.status_update = status_update
+        self.param_batch_event = param_batch_event
+        # OSC receivers drop unmapped addresses before decoding them, if set (see app_routing.AddressFilter)
+        self.address_filter = None
+
+    def params_received(self, params):
+        # Delivers a list of (address, value, arrival timestamp) tuples at once, if the bridge accepts batches
+        if self.param_batch_event is not None:
+            self.param_batch_event(params)
+            return
+        for address, value, timestamp in params:
+            self.param_received_event(address, value, timestamp)
 
     def restart_server(self):
         raise NotImplementedError("Subclass must implement abstract method: restart_server")
@@ -3,6 +3,17 @@ from pythonosc import osc_server
 from server_base import ServerBase
 from app_config import AppConfig
 import threading
+import time
+
+
+# Checks the address of every datagram before python-osc parses it
+class FilteredOSCUDPServer(osc_server.OSCUDPServer):
+    def __init__(self, server_address, dispatcher, address_filter):
+        super().__init__(server_address, dispatcher)
+        self.address_filter = address_filter
+
+    def verify_request(self, request, client_address):
+        return self.address_filter.accepts_packet(request[0]) and super().verify_request(request, client_address)
 
 
 class VRChatOSCReceiver(ServerBase):
@@ -21,9 +32,10 @@ class VRChatOSCReceiver(ServerBase):
             self.print_status("Shutdown completed.")
 
     def event_received(self, address, osc_value):
+        timestamp = time.perf_counter_ns()
         try:
             float_value = float(osc_value)
-            self.param_received_event(address, float_value)
+            self.param_received_event(address, float_value, timestamp)
         except ValueError:
             pass
 
@@ -40,7 +52,10 @@ class VRChatOSCReceiver(ServerBase):
     def start_server(self):
         try:
             address = (self.config.server_ip, int(self.config.server_port))
-            self.server = osc_server.OSCUDPServer(address, self.dispatcher)
+            if self.address_filter is not None:
+                self.server = FilteredOSCUDPServer(address, self.dispatcher, self.address_filter)
+            else:
+                self.server = osc_server.OSCUDPServer(address, self.dispatcher)
         except Exception as e:
             self.print_status(f"[ERROR] Port: {self.config.server_port} occupied.\n{e}", True, True)
             return
@@ -0,0 +1,136 @@
+from pythonosc.osc_message import OscMessage, ParseError
+from server_base import ServerBase
+from app_config import AppConfig
+import asyncio
+import socket
+import struct
+import threading
+import time
+
+BUNDLE_PREFIX = b"#bundle\x00"
+# Bundle prefix + 64 bit time tag
+BUNDLE_HEADER_SIZE = 16
+ADDRESS_PREFIX = "/avatar/parameters/"
+
+
+# asyncio based alternative to VRChatOSCReceiver.
+# Every wakeup drains all datagrams waiting on the socket, unpacks bundles in a single pass
+# and hands the collected (address, value) pairs to the bridge as one batch.
+class VRChatOSCAsyncReceiver(ServerBase):
+    RECEIVE_SIZE = 65535
+    # Upper bound of datagrams handled per wakeup, so a flood can't starve shutdown
+    MAX_DRAIN = 4096
+
+    def __init__(self, config: AppConfig, param_received_event, status_update, param_batch_event=None):
+        super().__init__(config, param_received_event, status_update, param_batch_event)
+        self.thread = None
+        self.loop = None
+        self.sock = None
+        self.datagrams = 0
+        self.parse_errors = 0
+
+    def start_server(self):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind((self.config.server_ip, int(self.config.server_port)))
+            sock.setblocking(False)
+        except Exception as e:
+            sock.close()
+            self.print_status(f"[ERROR] Port: {self.config.server_port} occupied.\n{e}", True, True)
+            return
+
+        self.sock = sock
+        # The selector loop supports add_reader on every platform (the Windows default Proactor does not)
+        self.loop = asyncio.SelectorEventLoop()
+        self.thread = threading.Thread(target=self.run, name="OSCAsyncReceiver", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.add_reader(self.sock.fileno(), self.drain)
+        self.print_status(f"OSC Receiver (async) serving on {self.sock.getsockname()}", True)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.remove_reader(self.sock.fileno())
+            self.sock.close()
+            self.loop.close()
+
+    def drain(self):
+        batch = []
+        for _ in range(self.MAX_DRAIN):
+            try:
+                datagram = self.sock.recv(self.RECEIVE_SIZE)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                # e.g. ICMP port unreachable on Windows
+                break
+            self.datagrams += 1
+            self.unpack(datagram, time.perf_counter_ns(), batch)
+
+        if batch:
+            self.params_received(batch)
+
+    def unpack(self, datagram, timestamp, batch):
+        # Walks nested bundles with an explicit stack instead of building OscBundle objects
+        pending = [datagram]
+        while pending:
+            element = pending.pop()
+            if not element.startswith(BUNDLE_PREFIX):
+                self.unpack_message(element, timestamp, batch)
+                continue
+
+            index = BUNDLE_HEADER_SIZE
+            contents = []
+            while index + 4 <= len(element):
+                size = struct.unpack_from(">i", element, index)[0]
+                index += 4
+                if size <= 0 or index + size > len(element):
+                    self.parse_errors += 1
+                    break
+                contents.append(element[index:index + size])
+                index += size
+            # Keep the original order when popping from the stack
+            pending.extend(reversed(contents))
+
+    def unpack_message(self, element, timestamp, batch):
+        if self.address_filter is not None:
+            end = element.find(b"\0")
+            if end < 0 or not self.address_filter.accepts(element[:end]):
+                return
+        try:
+            message = OscMessage(element)
+        except ParseError:
+            self.parse_errors += 1
+            return
+
+        address = message.address
+        if not address.startswith(ADDRESS_PREFIX) or not message.params:
+            return
+        try:
+            batch.append((address, float(message.params[0]), timestamp))
+        except (TypeError, ValueError):
+            pass
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def shutdown(self):
+        if self.is_alive():
+            self.print_status("Shutting down...", True)
+            # Stopping the loop is immediate, there is no blocking serve_forever() to wait for
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.print_status("Shutdown completed.")
+        self.thread = None
+
+    def restart_server(self):
+        self.print_status("Restarting...", True)
+        self.shutdown()
+        self.start_server()
+
+    def print_status(self, text, update_status_bar=False, is_error=False):
+        print(f"[OSC] {text}")
+        if update_status_bar:
+            self.status_update(text, is_error)
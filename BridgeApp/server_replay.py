@@ -0,0 +1,116 @@
+from app_recorder import ParamLog
+from server_base import ServerBase
+from app_config import AppConfig
+import threading
+import time
+
+
+# Feeds a recorded parameter log (see app_recorder) back into the bridge, like a live server would.
+# config.replay_speed scales the recorded timing: 1.0 is real time, 2.0 twice as fast, 0 as fast as possible.
+# Every parameter is stamped with the time it's delivered, so latency traces stay meaningful.
+class ParamReplayServer(ServerBase):
+    # Parameters delivered per batch when replaying as fast as possible
+    CHUNK_SIZE = 256
+    # Parameters due within this window are delivered together
+    BATCH_WINDOW_NS = 500_000
+
+    def __init__(self, config: AppConfig, param_received_event, status_update, param_batch_event=None):
+        super().__init__(config, param_received_event, status_update, param_batch_event)
+        self.thread = None
+        self.log = None
+        self.running = False
+        # Set on shutdown, interrupts waiting for the next parameter
+        self.stop_event = threading.Event()
+        self.replayed = 0
+
+    def start_server(self):
+        try:
+            self.log = ParamLog(self.config.replay_file)
+        except (OSError, ValueError) as e:
+            self.print_status(f"[ERROR] Can't open replay file: {self.config.replay_file}\n{e}", True, True)
+            return
+        self.running = True
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.run, name="ParamReplay", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        speed = self.config.replay_speed
+        self.print_status(f"Replaying {len(self.log)} parameters from {self.config.replay_file}"
+                          f" at {f'{speed}x' if speed > 0 else 'full'} speed", True)
+        start_time = time.perf_counter()
+        records = iter(self.log)
+        try:
+            if speed > 0:
+                self.replay_timed(records, speed)
+            else:
+                self.replay_fast(records)
+        finally:
+            # Release the mapped records before closing the log, even if we stopped halfway
+            records.close()
+            self.log.close()
+        if self.running:
+            elapsed = time.perf_counter() - start_time
+            self.print_status(f"Replay finished: {self.replayed} parameters in {round(elapsed, 3)} s", True)
+
+    def replay_timed(self, records, speed):
+        start_ns = time.perf_counter_ns()
+        batch = []
+        batch_due = 0
+        for offset, address, value in records:
+            if not self.running:
+                return
+            due = start_ns + int(offset / speed)
+            if batch and due - batch_due > self.BATCH_WINDOW_NS:
+                self.deliver(batch, batch_due)
+                batch = []
+            if not batch:
+                batch_due = due
+            batch.append((address, value))
+        if batch and self.running:
+            self.deliver(batch, batch_due)
+
+    def deliver(self, batch, due):
+        remaining = due - time.perf_counter_ns()
+        if remaining > 0 and self.stop_event.wait(remaining / 1e9):
+            return
+        timestamp = time.perf_counter_ns()
+        self.params_received([(address, value, timestamp) for address, value in batch])
+        self.replayed += len(batch)
+
+    def replay_fast(self, records):
+        batch = []
+        for offset, address, value in records:
+            batch.append((address, value, time.perf_counter_ns()))
+            if len(batch) == self.CHUNK_SIZE:
+                if not self.running:
+                    return
+                self.params_received(batch)
+                self.replayed += len(batch)
+                batch = []
+        if batch and self.running:
+            self.params_received(batch)
+            self.replayed += len(batch)
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def shutdown(self):
+        if self.thread is None:
+            return
+        self.print_status("Shutting down...", True)
+        self.running = False
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+        self.print_status("Shutdown completed.")
+
+    def restart_server(self):
+        self.print_status("Restarting...", True)
+        self.shutdown()
+        self.start_server()
+
+    def print_status(self, text, update_status_bar=False, is_error=False):
+        print(f"[Replay] {text}")
+        if update_status_bar:
+            self.status_update(text, is_error)
@@ -1,26 +1,78 @@
 from server_base import ServerBase
 from app_config import AppConfig
 import json
+import struct
 import websockets.sync.server
 import threading
+import time
+
+# Text frame a client sends to switch to binary frames: {"$register": ["address", ...]}
+# The server answers with {"$ids": {"address": id, ...}}. Every following binary frame is a
+# packed array of (uint16 id, float32 value) records, little-endian.
+KEY_REGISTER = "$register"
+KEY_IDS = "$ids"
+# Answer to a text frame that isn't a JSON object, or a $register that isn't a list of strings
+KEY_ERROR = "$error"
+BINARY_RECORD = struct.Struct("<Hf")
 
 
 class ResoniteWebSocketServer(ServerBase):
-    def __init__(self, config: AppConfig, param_received_event, status_update):
-        super().__init__(config, param_received_event, status_update)
+    def __init__(self, config: AppConfig, param_received_event, status_update, param_batch_event=None):
+        super().__init__(config, param_received_event, status_update, param_batch_event)
         self.thread = None
         self.server = None
         self.close = False
 
     def message_received(self, websocket):
+        # Addresses registered by this connection, indexed by their binary id, and the id of each address
+        addresses = []
+        address_ids = {}
         for message in websocket:
             # self.print_status(f"Message received: {message}")
+            timestamp = time.perf_counter_ns()
+            if isinstance(message, bytes):
+                self.binary_received(message, addresses, timestamp)
+                continue
             try:
                 message_dict = json.loads(message)
-                for key, value in message_dict.items():
-                    self.param_received_event(key, value)
             except json.decoder.JSONDecodeError:
-                pass
+                continue
+            if not isinstance(message_dict, dict):
+                websocket.send(json.dumps({KEY_ERROR: "Expected a JSON object of address: value pairs"}))
+                continue
+            if KEY_REGISTER in message_dict:
+                new_addresses = message_dict[KEY_REGISTER]
+                if not isinstance(new_addresses, list) or not all(isinstance(address, str)
+                                                                  for address in new_addresses):
+                    websocket.send(json.dumps({KEY_ERROR: f"{KEY_REGISTER} expects a list of address strings"}))
+                    continue
+                websocket.send(json.dumps({KEY_IDS: self.register(new_addresses, addresses, address_ids)}))
+                continue
+            for key, value in message_dict.items():
+                self.param_received_event(key, value, timestamp)
+
+    @staticmethod
+    def register(new_addresses, addresses, address_ids):
+        result = {}
+        for address in new_addresses:
+            address_id = address_ids.get(address)
+            if address_id is None:
+                if len(addresses) > 0xFFFF:
+                    continue
+                address_id = address_ids[address] = len(addresses)
+                addresses.append(address)
+            result[address] = address_id
+        return result
+
+    def binary_received(self, message, addresses, timestamp):
+        if len(message) % BINARY_RECORD.size != 0:
+            return
+        count = len(addresses)
+        # iter_unpack reads straight from the frame buffer without copying it
+        params = [(addresses[address_id], value, timestamp)
+                  for address_id, value in BINARY_RECORD.iter_unpack(message) if address_id < count]
+        if params:
+            self.params_received(params)
 
     def thread_main(self):
         self.print_status(f"WebSocket server running at {self.config.server_ip}:{self.config.server_port}", True)
@@ -37,6 +89,9 @@ class ResoniteWebSocketServer(ServerBase):
         self.thread = threading.Thread(target=self.thread_main)
         self.thread.start()
 
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
     def shutdown(self):
         self.print_status("Shutting down...", True)
         if self.server is not None:
@@ -0,0 +1,110 @@
+from typing import List
+
+from app_channels import ChannelStore
+from app_config import AppConfig, VRTracker
+from app_scheduler import FeedbackScheduler
+from app_trace import DeviceTrace
+
+
+# Base class of external targets that drive several haptic channels with one frame per tick.
+# The feedback state of the channels lives in a ChannelStore, which computes the intensity (0..1 of the tick)
+# of every channel at once. send_frame() gets them once per tick.
+# The target registers itself with the scheduler and ticks its channels, so they stay in lockstep.
+class ChannelTarget:
+    MODEL = "External Target"
+    INTERVAL_MS = 20
+    # Channels a frame can carry, None if the protocol has no limit
+    MAX_CHANNELS = None
+
+    def __init__(self, config: AppConfig, scheduler: FeedbackScheduler, name, interval_ms=INTERVAL_MS):
+        self.config = config
+        self.scheduler = scheduler
+        self.tracker = VRTracker(0, self.MODEL, name)
+        # Tick jitter and arrival -> pulse latency of all channels
+        self.trace = DeviceTrace(name)
+        self.interval_ms = interval_ms
+        self.interval_s = interval_ms / 1000
+        self.store = ChannelStore(config, interval_ms, self.trace)
+        self.intensities: List[float] = []
+        self.frames = 0
+        # Set by the scheduler. While dormant the target isn't ticked, anything that may
+        # make a channel vibrate again calls wake_function(self).
+        self.dormant = False
+        self.wake_function = None
+
+    @property
+    def name(self):
+        return self.tracker.serial
+
+    def add_channel(self, serial):
+        if serial in self.store.ids:
+            return True
+        if self.MAX_CHANNELS is not None and self.store.count >= self.MAX_CHANNELS:
+            print(f"[{type(self).__name__}][ERROR] Can't add {serial}, {self.name} is full ({self.MAX_CHANNELS} channels)")
+            return False
+        channel = self.store.add(VRTracker(self.store.count, self.MODEL, serial))
+        self.intensities.append(0.0)
+        if channel == 0:
+            self.scheduler.add_device(self)
+        return True
+
+    def tick(self, start_time, patterned_strength=None):
+        self.intensities = self.store.tick(start_time).tolist()
+        self.frames += 1
+        self.send_frame(self.intensities)
+
+    def wake(self):
+        if self.wake_function is not None:
+            self.wake_function(self)
+
+    def try_suspend(self, start_time):
+        # Only after a frame of zeros went out, so the hardware doesn't hold the last intensity.
+        # The flag is published before the final check, see FeedbackDevice.try_suspend.
+        if not self.config.idle_suspend or any(self.intensities) or not self.store.is_idle(start_time):
+            return False
+        self.dormant = True
+        if self.store.is_idle(start_time):
+            return True
+        self.dormant = False
+        return False
+
+    def resume(self):
+        self.dormant = False
+
+    def send_frame(self, intensities: List[float]):
+        raise NotImplementedError("Subclass must implement abstract method: send_frame")
+
+    def set_strength(self, serial, strength, timestamp=None):
+        channel = self.store.ids.get(serial)
+        if channel is None:
+            return
+        try:
+            strength = float(strength)
+        except ValueError:
+            strength = 0.0
+        self.store.post(channel, strength, timestamp)
+        if self.dormant:
+            self.wake()
+
+    def pulse_by_serial(self, serial, pulse_length: int = 200):
+        channel = self.store.ids.get(serial)
+        if channel is not None:
+            self.store.force_pulse(channel, pulse_length)
+            if self.dormant:
+                self.wake()
+
+    def shutdown(self):
+        self.scheduler.remove_device(self)
+
+    def stats(self):
+        # Not from states(), reading those resets the output peaks the GUI meters show
+        result = {tracker.serial: {"received": self.store.channel_received(channel)}
+                  for channel, tracker in enumerate(self.store.trackers)}
+        result[self.name] = dict(result.get(self.name, {}), channels=self.store.stats(), trace=self.trace.summary())
+        return result
+
+    def traces(self):
+        return {self.name: self.trace}
+
+    def channel_states(self):
+        return self.store.states()
@@ -0,0 +1,176 @@
+import math
+import struct
+import threading
+import time
+import wave
+from array import array
+
+import numpy as np
+
+from app_config import AppConfig, VRTracker
+from app_runner import FeedbackDevice
+from app_scheduler import FeedbackScheduler
+
+TRACE_MAGIC = b"HPTR"
+TRACE_VERSION = 1
+# magic, version, interval in µs, pulse count, first pulse timestamp in ns
+TRACE_HEADER = struct.Struct("<4sHIIq")
+
+TEXT_LEVELS = " ▁▂▃▄▅▆▇█"
+
+
+# Fixed size ring buffer of (timestamp ns, pulse length) pairs, stored in two typed arrays.
+# Recorded from the scheduler thread, read from the GUI thread, so both go through the lock.
+class PulseRecorder:
+    def __init__(self, capacity=65536):
+        self.lock = threading.Lock()
+        self.capacity = capacity
+        self.timestamps = array('q', bytes(8 * capacity))
+        self.lengths = array('I', bytes(4 * capacity))
+        self.index = 0
+        self.count = 0
+
+    def record(self, timestamp, length):
+        with self.lock:
+            self.timestamps[self.index] = timestamp
+            self.lengths[self.index] = length
+            self.index = (self.index + 1) % self.capacity
+            self.count += 1
+
+    def pulses(self):
+        # A copy of the ring, oldest first. Taken under the lock so timestamps and lengths belong together.
+        with self.lock:
+            if self.count < self.capacity:
+                return self.timestamps[:self.count], self.lengths[:self.count]
+            return (self.timestamps[self.index:] + self.timestamps[:self.index],
+                    self.lengths[self.index:] + self.lengths[:self.index])
+
+    def clear(self):
+        with self.lock:
+            self.index = 0
+            self.count = 0
+
+
+# A haptic target without hardware. It receives exactly the pulse stream a tracker would,
+# records it, and can render it as a text strip, a sound envelope (.wav) or save it as a binary trace.
+class EmulatedTarget:
+    MODEL = "Emulated Target"
+    # Carrier frequency of the rendered sound, close to a typical LRA resonance
+    SOUND_FREQUENCY = 170
+    SOUND_SAMPLE_RATE = 8000
+    # Only the pulses of the last few minutes are rendered, the ring may span hours
+    SOUND_MAX_S = 300
+
+    def __init__(self, config: AppConfig, scheduler: FeedbackScheduler, serial, model=MODEL):
+        self.config = config
+        self.scheduler = scheduler
+        self.serial = serial
+        self.recorder = PulseRecorder()
+        self.tracker = VRTracker(0, model, serial)
+        self.device = FeedbackDevice(config, self.tracker, self.__pulse, lambda index: 1.0)
+        self.scheduler.add_device(self.device)
+
+    def __pulse(self, index, pulse_length: int):
+        self.recorder.record(time.perf_counter_ns(), pulse_length)
+
+    def set_strength(self, serial, strength, timestamp=None):
+        self.device.set_strength(strength, timestamp)
+
+    def pulse_by_serial(self, serial, pulse_length: int = 200):
+        self.device.force_pulse(pulse_length)
+
+    def shutdown(self):
+        self.scheduler.remove_device(self.device)
+
+    def stats(self):
+        return {self.serial: {"mailbox": self.device.mailbox.stats(), "trace": self.device.trace.summary(),
+                              "pulses": self.recorder.count}}
+
+    def traces(self):
+        return {self.serial: self.device.trace}
+
+    def channel_states(self):
+        return [self.device.state()]
+
+    def render_text(self, width=80):
+        # One character per tick, scaled by how much of the tick the pulse filled
+        timestamps, lengths = self.recorder.pulses()
+        if len(timestamps) == 0:
+            return ""
+        interval_ns = self.device.interval_s * 1e9
+        end = timestamps[-1]
+        strip = [0.0] * width
+        for timestamp, length in zip(timestamps, lengths):
+            slot = width - 1 - int((end - timestamp) / interval_ns)
+            if slot >= 0:
+                strip[slot] = max(strip[slot], min(length / self.device.interval_ms, 1.0))
+        return "".join(TEXT_LEVELS[round(level * (len(TEXT_LEVELS) - 1))] for level in strip)
+
+    def render_wav(self, path):
+        # The pulses gate a sine carrier, so the result sounds like the actuator would feel.
+        # Written pulse by pulse, the silence in between in chunks, so memory doesn't grow with the duration.
+        timestamps, lengths = self.recorder.pulses()
+        if len(timestamps) == 0:
+            return False
+        timestamps = np.frombuffer(timestamps, dtype=np.int64)
+        lengths = np.frombuffer(lengths, dtype=np.uint32)
+        recent = timestamps >= timestamps[-1] - self.SOUND_MAX_S * 1e9
+        timestamps, lengths = timestamps[recent], lengths[recent]
+
+        rate = self.SOUND_SAMPLE_RATE
+        starts = ((timestamps - timestamps[0]) / 1e9 * rate).astype(np.int64)
+        ends = starts + (self.pulse_ms(lengths.astype(np.float64)) / 1000 * rate).astype(np.int64)
+        total = int(((timestamps[-1] - timestamps[0]) / 1e9 + self.device.interval_s) * rate)
+        step = 2 * math.pi * self.SOUND_FREQUENCY / rate
+        silence = np.zeros(rate, dtype=np.int16)
+
+        with wave.open(path, "wb") as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(rate)
+            position = 0
+            for first, last in zip(starts.tolist(), np.minimum(ends, total).tolist()):
+                while position < first:
+                    gap = min(first - position, rate)
+                    wav_file.writeframes(silence[:gap].tobytes())
+                    position += gap
+                # Pulses that overlap the previous one continue it
+                if last > position:
+                    wav_file.writeframes((np.sin(np.arange(position, last) * step) * 24000).astype(np.int16).tobytes())
+                    position = last
+            while position < total:
+                gap = min(total - position, rate)
+                wav_file.writeframes(silence[:gap].tobytes())
+                position += gap
+        print(f"[EmulatedTarget] Rendered {len(timestamps)} pulses of {self.serial} to {path}")
+        return True
+
+    def pulse_ms(self, length):
+        # Pulse lengths are recorded in the device time unit, like triggerHapticPulse() receives them
+        if self.device.hack_pulse_mult_to_ms:
+            return length * self.device.hack_pulse_mult_to_ms
+        return length
+
+    def save_trace(self, path):
+        timestamps, lengths = self.recorder.pulses()
+        first = timestamps[0] if len(timestamps) else 0
+        with open(path, "wb") as trace_file:
+            trace_file.write(TRACE_HEADER.pack(TRACE_MAGIC, TRACE_VERSION, int(self.device.interval_ms * 1000),
+                                               len(timestamps), first))
+            # Timestamps are stored relative to the first pulse
+            array('q', (timestamp - first for timestamp in timestamps)).tofile(trace_file)
+            lengths.tofile(trace_file)
+        print(f"[EmulatedTarget] Saved {len(timestamps)} pulses of {self.serial} to {path}")
+
+    @staticmethod
+    def load_trace(path):
+        # Returns (interval_ms, timestamps, lengths) with timestamps in ns relative to the first pulse
+        with open(path, "rb") as trace_file:
+            magic, version, interval_us, count, first = TRACE_HEADER.unpack(trace_file.read(TRACE_HEADER.size))
+            if magic != TRACE_MAGIC or version != TRACE_VERSION:
+                raise ValueError(f"{path} is not a haptic pulse trace")
+            timestamps = array('q')
+            timestamps.fromfile(trace_file, count)
+            lengths = array('I')
+            lengths.fromfile(trace_file, count)
+        return interval_us / 1000, timestamps, lengths
@@ -0,0 +1,239 @@
+import socket
+import struct
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from app_config import AppConfig
+from app_scheduler import FeedbackScheduler
+from target_base import ChannelTarget
+
+# Datagram sent to a node once per tick:
+#   magic "HP" | version (u8) | flags (u8) | sequence (u32) | first channel (u8) | channel count (u8) |
+#   intensity (u8) per channel
+# The intensities are for the node's channels first .. first + count - 1, so several targets can share a node.
+# Each first channel has a sequence of its own: nodes should drop any frame whose sequence isn't newer than
+# the last one they applied with the same first channel, a late frame of one target mustn't hide another's.
+# If FLAG_ACK is set, the node answers with: magic "HA" | first channel (u8) | sequence (u32)
+FRAME_HEADER = struct.Struct("<2sBBIBB")
+FRAME_MAGIC = b"HP"
+FRAME_VERSION = 2
+FLAG_ACK = 0x01
+ACK = struct.Struct("<2sBI")
+ACK_MAGIC = b"HA"
+DEFAULT_NODE_PORT = 7777
+
+
+def encode_datagram(sequence, intensities: List[float], flags=0, first_channel=0):
+    header = FRAME_HEADER.pack(FRAME_MAGIC, FRAME_VERSION, flags, sequence & 0xFFFFFFFF, first_channel,
+                               len(intensities))
+    return header + bytes(min(max(int(intensity * 255 + 0.5), 0), 255) for intensity in intensities)
+
+
+def decode_datagram(datagram: bytes):
+    # Returns (sequence, flags, first channel, [intensity, ...]) or None if it's not a valid frame
+    if len(datagram) < FRAME_HEADER.size:
+        return None
+    magic, version, flags, sequence, first_channel, count = FRAME_HEADER.unpack_from(datagram)
+    if magic != FRAME_MAGIC or version != FRAME_VERSION or len(datagram) != FRAME_HEADER.size + count:
+        return None
+    return sequence, flags, first_channel, [value / 255 for value in datagram[FRAME_HEADER.size:]]
+
+
+def parse_node_address(value: str):
+    # "host[:port][#first channel]", returns (host, port, first channel)
+    address, _, channel = value.strip().partition('#')
+    host, _, port = address.partition(':')
+    try:
+        port = int(port) if port else DEFAULT_NODE_PORT
+    except ValueError:
+        port = DEFAULT_NODE_PORT
+    try:
+        channel = min(max(int(channel), 0), 255) if channel else 0
+    except ValueError:
+        channel = 0
+    return host, port, channel
+
+
+# One non-blocking UDP socket per node, shared by every target sending to it.
+# Acks are drained opportunistically on each send, so there's no receive thread.
+class NodeLink:
+    RATE_WINDOW_S = 1.0
+
+    def __init__(self, address: Tuple[str, int]):
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+        # Last sequence sent per first channel
+        self.sequences: Dict[int, int] = {}
+        # Targets using this link, see get_link() and release_link()
+        self.users = 0
+        # Sends of the targets sharing the node come from the scheduler thread, but acks are matched per link
+        self.lock = threading.Lock()
+
+        self.sent = 0
+        self.send_errors = 0
+        self.acks_requested = 0
+        self.acks = 0
+        self.total_rtt_ns = 0
+        # (first channel, sequence) -> send time of the frames waiting for an ack
+        self.send_times: Dict[Tuple[int, int], int] = {}
+        self.rate = 0.0
+        self.rate_count = 0
+        self.rate_start = time.perf_counter()
+
+    def send(self, intensities: List[float], request_ack: bool, first_channel=0):
+        with self.lock:
+            self.__send(intensities, request_ack, first_channel)
+
+    def __send(self, intensities: List[float], request_ack: bool, first_channel):
+        sequence = self.sequences[first_channel] = (self.sequences.get(first_channel, 0) + 1) & 0xFFFFFFFF
+        datagram = encode_datagram(sequence, intensities, FLAG_ACK if request_ack else 0, first_channel)
+        try:
+            self.sock.sendto(datagram, self.address)
+        except OSError:
+            # Includes BlockingIOError when the send buffer is full, and a link closed while sending
+            self.send_errors += 1
+            return
+
+        self.sent += 1
+        if request_ack:
+            self.acks_requested += 1
+            self.send_times[(first_channel, sequence)] = time.perf_counter_ns()
+            # Forget acks that never arrived
+            if len(self.send_times) > 256:
+                self.send_times.pop(next(iter(self.send_times)))
+        self.update_rate()
+        self.receive_acks()
+
+    def update_rate(self):
+        self.rate_count += 1
+        now = time.perf_counter()
+        if now - self.rate_start >= self.RATE_WINDOW_S:
+            self.rate = self.rate_count / (now - self.rate_start)
+            self.rate_count = 0
+            self.rate_start = now
+
+    def receive_acks(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(64)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                # e.g. ICMP port unreachable on Windows while the node is offline
+                return
+            if len(data) != ACK.size:
+                continue
+            magic, first_channel, sequence = ACK.unpack(data)
+            send_time = self.send_times.pop((first_channel, sequence), None)
+            if magic == ACK_MAGIC and send_time is not None:
+                self.acks += 1
+                self.total_rtt_ns += time.perf_counter_ns() - send_time
+
+    def close(self):
+        self.sock.close()
+
+    def stats(self):
+        # Acks still in flight are not counted as lost
+        answered = self.acks_requested - len(self.send_times)
+        return {
+            "node": f"{self.address[0]}:{self.address[1]}",
+            "sent": self.sent,
+            "send_errors": self.send_errors,
+            "rate_per_s": round(self.rate, 1),
+            "acks": self.acks,
+            "loss": round(1 - self.acks / answered, 4) if answered > 0 else None,
+            "avg_rtt_ms": round(self.total_rtt_ns / self.acks / 1e6, 3) if self.acks else None,
+        }
+
+
+links: Dict[Tuple[str, int], NodeLink] = {}
+links_lock = threading.Lock()
+
+
+# Every get_link() is paired with a release_link(), the socket is closed once no target uses the node anymore
+def get_link(address: Tuple[str, int]):
+    with links_lock:
+        link = links.get(address)
+        if link is None:
+            link = links[address] = NodeLink(address)
+        link.users += 1
+        return link
+
+
+def release_link(link: NodeLink):
+    with links_lock:
+        link.users -= 1
+        if link.users > 0:
+            return
+        if links.get(link.address) is link:
+            del links[link.address]
+    link.close()
+
+
+# Drives Wi-Fi haptic nodes (e.g. ESP32) with one UDP datagram per tick holding every channel of the target.
+# The node address ("ip", "ip:port", optionally followed by "#first channel") comes from the TrackerConfig
+# and can be changed live. Targets sharing a node use different first channels, so the node can tell them apart.
+class NetworkTarget(ChannelTarget):
+    MODEL = "Network Target"
+    # The channel count is a single byte
+    MAX_CHANNELS = 255
+
+    def __init__(self, config: AppConfig, scheduler: FeedbackScheduler, name,
+                 interval_ms=ChannelTarget.INTERVAL_MS, request_acks=True):
+        super().__init__(config, scheduler, name, interval_ms)
+        self.request_acks = request_acks
+        self.lock = threading.Lock()
+        self.link = None
+        self.link_host = None
+        self.first_channel = 0
+
+    def send_frame(self, intensities: List[float]):
+        host = self.config.get_tracker_config(self.name).target_host
+        if host != self.link_host:
+            self.connect(host)
+        link = self.link
+        if link is not None:
+            link.send(intensities, self.request_acks, self.first_channel)
+
+    def connect(self, host):
+        # The address is resolved on a thread of its own, a slow DNS lookup mustn't hold up the scheduler.
+        # Nothing is sent until it's done.
+        with self.lock:
+            self.link_host = host
+            self.replace_link(None)
+        if host:
+            threading.Thread(target=self.resolve, args=(host,), name=f"Resolve-{self.name}", daemon=True).start()
+
+    def resolve(self, host):
+        name, port, first_channel = parse_node_address(host)
+        try:
+            address = (socket.gethostbyname(name), port)
+        except OSError as e:
+            print(f"[NetworkTarget][ERROR] Can't resolve {name}: {e}")
+            return
+        with self.lock:
+            # The address changed again (or the target shut down) while this one was resolved
+            if host != self.link_host:
+                return
+            self.first_channel = first_channel
+            self.replace_link(get_link(address))
+        print(f"[NetworkTarget] Sending {self.name} to {address[0]}:{address[1]} from channel {first_channel}")
+
+    def replace_link(self, link):
+        old_link, self.link = self.link, link
+        if old_link is not None:
+            release_link(old_link)
+
+    def shutdown(self):
+        super().shutdown()
+        with self.lock:
+            self.link_host = None
+            self.replace_link(None)
+
+    def stats(self):
+        result = super().stats()
+        if self.link is not None:
+            result[self.name] = dict(result.get(self.name, {}), network=self.link.stats())
+        return result
@@ -1,15 +1,33 @@
+import threading
+
 import openvr
-from app_runner import FeedbackThread
+from app_battery import BatteryMonitor
+from app_runner import FeedbackDevice, FeedbackThread
+from app_scheduler import FeedbackScheduler
 from app_config import VRTracker, AppConfig
 from typing import List, Dict
 
 
 class OpenVRTracker:
-    def __init__(self, config: AppConfig):
+    # How often the watcher thread checks for device events
+    EVENT_POLL_S = 0.25
+    DEVICE_EVENTS = (openvr.VREvent_TrackedDeviceActivated, openvr.VREvent_TrackedDeviceDeactivated,
+                     openvr.VREvent_TrackedDeviceUpdated, openvr.VREvent_TrackedDeviceRoleChanged)
+
+    def __init__(self, config: AppConfig, scheduler: FeedbackScheduler):
         self.devices: List[VRTracker] = []
-        self.vibration_managers: Dict[str, FeedbackThread] = {}
+        self.device_indices: Dict[int, VRTracker] = {}
+        self.device_listeners = []
+        self.lock = threading.RLock()
+        self.stopped = threading.Event()
+        self.watcher = None
+        self.vibration_managers: Dict[str, FeedbackDevice] = {}
+        self.feedback_threads: Dict[str, FeedbackThread] = {}
         self.vr = None
         self.config = config
+        self.scheduler = scheduler
+        self.battery = BatteryMonitor(config, self.get_battery_level)
+        self.battery.add_listener(self.__battery_changed)
 
     def try_init_openvr(self):
         if self.vr is not None:
@@ -17,34 +35,118 @@ class OpenVRTracker:
         try:
             self.vr = openvr.init(openvr.VRApplication_Background)
             self.devices: [VRTracker] = []
+            self.battery.start()
             print("[OpenVRTracker] Successfully initialized.")
-            return True
         except:
             print("[OpenVRTracker] Failed to initialize OpenVR.")
             return False
 
+        # One full scan, from then on only the devices named by OpenVR events are looked at
+        with self.lock:
+            for index in range(openvr.k_unMaxTrackedDeviceCount):
+                self.update_device(index)
+        self.watcher = threading.Thread(target=self.__watch_devices, name="OpenVRDeviceWatcher", daemon=True)
+        self.watcher.start()
+        return True
+
     def query_devices(self):
         if not self.try_init_openvr():
             return self.devices
+        # Picks up anything the watcher didn't get to yet
+        self.poll_events()
+        return list(self.devices)
+
+    def add_device_listener(self, listener):
+        # The listener receives (added, removed) lists of VRTracker whenever trackers come or go.
+        # It's called from the watcher thread.
+        self.device_listeners.append(listener)
+
+    def __watch_devices(self):
+        print("[OpenVRTracker] Watching device events")
+        while self.vr is not None and not self.stopped.wait(self.EVENT_POLL_S):
+            try:
+                self.poll_events()
+            except Exception as e:
+                print(f"[OpenVRTracker][ERROR] Failed to poll events: {e}")
+
+    def poll_events(self):
+        with self.lock:
+            # Only the last event of each device matters
+            changed = {}
+            event = openvr.VREvent_t()
+            while self.vr.pollNextEvent(event):
+                if event.eventType in self.DEVICE_EVENTS:
+                    changed[event.trackedDeviceIndex] = event.eventType
+            added = []
+            removed = []
+            for index, event_type in changed.items():
+                if event_type == openvr.VREvent_TrackedDeviceDeactivated:
+                    removed.extend(self.remove_device(index))
+                else:
+                    device_added, device_removed = self.update_device(index)
+                    added.extend(device_added)
+                    removed.extend(device_removed)
+
+        if added or removed:
+            for listener in self.device_listeners:
+                listener(added, removed)
 
-        poses = self.vr.getDeviceToAbsoluteTrackingPose(openvr.TrackingUniverseStanding, 0,
-                                                        openvr.k_unMaxTrackedDeviceCount)
+    def update_device(self, index):
+        # Queries a single index and starts/stops feeding it. Returns (added, removed).
+        if not (0 <= index < openvr.k_unMaxTrackedDeviceCount):
+            return [], []
+        if (self.vr.getTrackedDeviceClass(index) != openvr.TrackedDeviceClass_GenericTracker
+                or not self.vr.isTrackedDeviceConnected(index)):
+            return [], self.remove_device(index)
 
-        # Add every visible device to the list
-        self.devices.clear()
-        for i in range(openvr.k_unMaxTrackedDeviceCount):
-            if poses[i].bPoseIsValid and self.vr.getTrackedDeviceClass(i) == openvr.TrackedDeviceClass_GenericTracker:
-                self.devices.append(VRTracker(i, self.get_model(i), self.get_serial(i)))
+        serial = self.get_serial(index)
+        current = self.device_indices.get(index)
+        if current is not None and current.serial == serial:
+            return [], []
+        # Another tracker took over the index, or this one moved to a new index
+        removed = self.remove_device(index)
+        for other_index, other in list(self.device_indices.items()):
+            if other.serial == serial:
+                removed.extend(self.remove_device(other_index))
 
-        # Start a new thread for each device
-        for device in self.devices:
-            if device.serial not in self.vibration_managers:
-                thread = FeedbackThread(self.config, device, self.__pulse, self.get_battery_level)
-                thread.daemon = True
-                thread.start()
-                self.vibration_managers[device.serial] = thread
+        device = VRTracker(index, self.get_model(index), serial)
+        self.device_indices[index] = device
+        self.devices.append(device)
+        self.__start_feedback(device)
+        print(f"[OpenVRTracker] Found {device.serial} ({device.model}) at index {index}")
+        return [device], removed
 
-        return self.devices
+    def remove_device(self, index):
+        device = self.device_indices.pop(index, None)
+        if device is None:
+            return []
+        self.devices.remove(device)
+        self.__stop_feedback(device)
+        print(f"[OpenVRTracker] Lost {device.serial} at index {index}")
+        return [device]
+
+    def __start_feedback(self, device: VRTracker):
+        self.battery.watch(device.index)
+        if device.serial in self.vibration_managers:
+            return
+        feedback_device = FeedbackDevice(self.config, device, self.__pulse, self.battery.get_level)
+        if self.config.legacy_feedback_threads:
+            thread = FeedbackThread(feedback_device)
+            thread.daemon = True
+            thread.start()
+            self.feedback_threads[device.serial] = thread
+        else:
+            self.scheduler.add_device(feedback_device)
+        self.vibration_managers[device.serial] = feedback_device
+
+    def __stop_feedback(self, device: VRTracker):
+        self.battery.unwatch(device.index)
+        feedback_device = self.vibration_managers.pop(device.serial, None)
+        if feedback_device is not None:
+            self.scheduler.remove_device(feedback_device)
+        thread = self.feedback_threads.pop(device.serial, None)
+        if thread is not None:
+            thread.stop()
 
     def get_serial(self, index):
         return self.vr.getStringTrackedDeviceProperty(index, openvr.Prop_SerialNumber_String)
@@ -65,17 +167,52 @@ class OpenVRTracker:
             # assume 100% battery.
             return 1
 
-    def set_strength(self, serial, strength):
-        if serial in self.vibration_managers:
-            self.vibration_managers[serial].set_strength(strength)
+    def add_battery_listener(self, listener):
+        # The listener receives (index, level) whenever a tracker's battery level changes
+        self.battery.add_listener(listener)
+
+    def __battery_changed(self, index, level):
+        for feedback_device in list(self.vibration_managers.values()):
+            if feedback_device.tracker.index == index:
+                feedback_device.battery_changed(level)
+
+    def set_strength(self, serial, strength, timestamp=None):
+        # Devices may vanish on the watcher thread at any time
+        feedback_device = self.vibration_managers.get(serial)
+        if feedback_device is not None:
+            feedback_device.set_strength(strength, timestamp)
+
+    def stats(self):
+        return {serial: {"mailbox": device.mailbox.stats(), "trace": device.trace.summary()}
+                for serial, device in list(self.vibration_managers.items())}
+
+    def traces(self):
+        return {serial: device.trace for serial, device in list(self.vibration_managers.items())}
+
+    def channel_states(self):
+        return [device.state() for device in list(self.vibration_managers.values())]
 
     def pulse_by_serial(self, serial, pulse_length: int = 200):
-        if serial in self.vibration_managers:
-            self.vibration_managers[serial].force_pulse(pulse_length)
+        feedback_device = self.vibration_managers.get(serial)
+        if feedback_device is not None:
+            feedback_device.force_pulse(pulse_length)
 
     def is_alive(self):
         return self.vr is not None
 
+    def shutdown(self):
+        # Stops watching and feeding every device
+        self.stopped.set()
+        if self.watcher is not None:
+            self.watcher.join()
+        for serial, feedback_device in self.vibration_managers.items():
+            self.scheduler.remove_device(feedback_device)
+            if serial in self.feedback_threads:
+                self.feedback_threads[serial].stop()
+        self.vibration_managers.clear()
+        self.feedback_threads.clear()
+        self.battery.stop()
+
     def __pulse(self, index, pulse_length: int = 200):
         if self.is_alive():
             self.vr.triggerHapticPulse(index, 0, pulse_length)
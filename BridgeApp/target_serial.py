@@ -1,19 +1,190 @@
-import serial
+import collections
+import threading
 import time
+from typing import List
+
+import serial
+
+from app_config import AppConfig
+from app_scheduler import FeedbackScheduler
+from target_base import ChannelTarget
+
+# Frame sent once per tick, carrying the intensity of every channel:
+#   0xA5 0x5A | sequence (u8) | channel count (u8) | intensity (u8, 0..255) per channel | checksum (u8)
+# The checksum is the XOR of every byte between the sync bytes and the checksum.
+FRAME_SYNC = b"\xA5\x5A"
+# The channel count is a single byte
+MAX_FRAME_CHANNELS = 255
+
+
+def encode_frame(sequence, intensities: List[float]):
+    if len(intensities) > MAX_FRAME_CHANNELS:
+        raise ValueError(f"A frame carries at most {MAX_FRAME_CHANNELS} channels, got {len(intensities)}")
+    body = bytearray((sequence & 0xFF, len(intensities)))
+    body.extend(min(max(int(intensity * 255 + 0.5), 0), 255) for intensity in intensities)
+    checksum = 0
+    for byte in body:
+        checksum ^= byte
+    return FRAME_SYNC + bytes(body) + bytes((checksum,))
+
+
+# Splits a byte stream into frames. Returns ([(sequence, [intensity, ...]), ...], unconsumed bytes).
+def decode_frames(buffer: bytes):
+    frames = []
+    index = 0
+    while True:
+        start = buffer.find(FRAME_SYNC, index)
+        if start < 0:
+            # Keep a trailing first sync byte, the second one may still be on its way
+            return frames, buffer[-1:] if buffer[index:].endswith(FRAME_SYNC[:1]) else b""
+        if start + 4 > len(buffer):
+            return frames, buffer[start:]
+        count = buffer[start + 3]
+        end = start + 4 + count + 1
+        if end > len(buffer):
+            return frames, buffer[start:]
+        checksum = 0
+        for byte in buffer[start + 2:end - 1]:
+            checksum ^= byte
+        if checksum == buffer[end - 1]:
+            frames.append((buffer[start + 2], [value / 255 for value in buffer[start + 4:end - 1]]))
+            index = end
+        else:
+            # Not a real frame start, resync on the next sync bytes
+            index = start + 1
+
+
+# Writes frames on its own thread, so the scheduler never waits for the port.
+# The queue is short and drops the oldest frame when full: a late frame is worth nothing to a haptic motor.
+class SerialWriter(threading.Thread):
+    QUEUE_SIZE = 4
+    RECONNECT_DELAY_S = 2.0
+    WRITE_TIMEOUT_S = 0.1
+
+    def __init__(self, name, port_function, baud_rate_function):
+        super().__init__(name=f"SerialWriter-{name}", daemon=True)
+        self.port_function = port_function
+        self.baud_rate_function = baud_rate_function
+        self.frames = collections.deque(maxlen=self.QUEUE_SIZE)
+        self.frame_event = threading.Event()
+        self.connection = None
+        self.connection_settings = None
+        self.next_connect_time = 0
+        self.running = False
+
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.reconnects = 0
+
+    def push(self, frame):
+        if len(self.frames) == self.QUEUE_SIZE:
+            self.dropped += 1
+        self.frames.append(frame)
+        self.frame_event.set()
+
+    def start(self):
+        self.running = True
+        super().start()
+
+    def stop(self):
+        self.running = False
+        self.frame_event.set()
+
+    def run(self):
+        while self.running:
+            # While disconnected, wake up on our own to retry, even if the scheduler stopped sending frames
+            self.frame_event.wait(None if self.connection is not None else self.RECONNECT_DELAY_S)
+            self.frame_event.clear()
+            if not self.ensure_connection():
+                # Nobody to talk to, frames are stale by the time we reconnect
+                self.dropped += len(self.frames)
+                self.frames.clear()
+                continue
+
+            while self.frames:
+                try:
+                    frame = self.frames.popleft()
+                except IndexError:
+                    break
+                try:
+                    self.connection.write(frame)
+                    self.written += 1
+                except serial.SerialTimeoutException:
+                    self.dropped += 1
+                except (serial.SerialException, OSError) as e:
+                    self.errors += 1
+                    print(f"[SerialTarget][ERROR] Write to {self.connection_settings[0]} failed: {e}")
+                    self.disconnect()
+                    break
+        self.disconnect()
+
+    def ensure_connection(self):
+        settings = (self.port_function(), self.baud_rate_function())
+        if self.connection is not None and settings == self.connection_settings:
+            return True
+        # Port or baud rate changed in the meantime
+        self.disconnect()
+
+        if not settings[0] or time.time() < self.next_connect_time:
+            return False
+        try:
+            self.connection = serial.Serial(settings[0], settings[1], timeout=0,
+                                            write_timeout=self.WRITE_TIMEOUT_S)
+            self.connection_settings = settings
+            self.reconnects += 1
+            print(f"[SerialTarget] Connected to {settings[0]} at {settings[1]} baud")
+            return True
+        except (serial.SerialException, OSError, ValueError) as e:
+            self.errors += 1
+            self.next_connect_time = time.time() + self.RECONNECT_DELAY_S
+            print(f"[SerialTarget][ERROR] Failed to open {settings[0]}: {e}")
+            return False
+
+    def disconnect(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except (serial.SerialException, OSError):
+                pass
+        self.connection = None
+
+    def stats(self):
+        return {
+            "written": self.written,
+            "dropped": self.dropped,
+            "errors": self.errors,
+            "connects": self.reconnects,
+        }
+
+
+# Drives microcontroller based haptic devices over a serial (COM/tty) port.
+# The port and baud rate come from the TrackerConfig of the first channel and can be changed live.
+class SerialTarget(ChannelTarget):
+    MODEL = "Serial Target"
+    MAX_CHANNELS = MAX_FRAME_CHANNELS
+
+    def __init__(self, config: AppConfig, scheduler: FeedbackScheduler, name, interval_ms=ChannelTarget.INTERVAL_MS):
+        super().__init__(config, scheduler, name, interval_ms)
+        self.sequence = 0
+        self.writer = SerialWriter(name, self.get_port, self.get_baud_rate)
+        self.writer.start()
 
-# Define the serial port and baud rate
-try:
-    ser = serial.Serial('COM1', 9600)  # Update 'COM1' with the appropriate port for your device
-    # Wait for the serial port to open
-    time.sleep(2)
+    def get_port(self):
+        return self.config.get_tracker_config(self.name).target_port
 
-    # Send a command
-    command = b'Hello, Serial!'
-    ser.write(command)
+    def get_baud_rate(self):
+        return self.config.get_tracker_config(self.name).target_baud_rate
 
-    # Close the serial port
-    ser.close()
+    def send_frame(self, intensities: List[float]):
+        self.writer.push(encode_frame(self.sequence, intensities))
+        self.sequence = (self.sequence + 1) & 0xFF
 
-except FileNotFoundError:
-    print("COM1 Does not exists")
+    def shutdown(self):
+        super().shutdown()
+        self.writer.stop()
 
+    def stats(self):
+        result = super().stats()
+        result[self.name] = dict(result.get(self.name, {}), serial=self.writer.stats())
+        return result